@@ -0,0 +1,244 @@
+# Import required libraries for the offline benchmark suite
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import importlib.util
+import logging
+import platform
+import statistics
+import subprocess
+import tempfile
+import cv2
+from benchmarks.synthetic import SAMPLE_LINES, make_page as make_synthetic_page, write_pages
+from benchmarks.stubs import StubModels, StubWorkerSetup
+from manga_translator.config import FONT_PATH, MODEL_PATH
+from manga_translator.image_utils import PREPROCESS_OPS, PREPROCESS_PROFILES, CropPreprocessor
+from manga_translator.ocr import validate_ocr_result
+from manga_translator.text_utils import manga_style_formatting, MangaFormatter
+from manga_translator.overlay import insert_translation, check_and_fix_truncated_text
+from manga_translator.pipeline import make_page, build_stages, group_sentences, run_sequential, run_pipelined
+from manga_translator.models import LazyModels
+from manga_translator.parallel import WorkerSetup, run_processes
+
+# Relative slowdown reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+
+def time_call(func, repeat=20, warmup=3):
+    """
+    Time ``func()`` after a few warm-up calls.
+
+    Returns:
+        dict: Median, minimum and maximum milliseconds per call
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': statistics.median(samples), 'min_ms': min(samples), 'max_ms': max(samples), 'calls': repeat}
+
+def preprocess_benchmarks(crops, repeat):
+    """
+    Time every crop preprocessing profile on ``crops``, and each operation of the profile
+    separately on its real inputs, so profiles can be compared operation by operation.
+    """
+    results = {}
+    for profile in PREPROCESS_PROFILES:
+        preprocessor = CropPreprocessor(profile)
+        results[f'preprocess.{profile}'] = time_call(lambda: preprocessor(crops), repeat)
+        values = {'crop': crops}
+        for op in preprocessor.plan:
+            source, func = PREPROCESS_OPS[op]
+            inputs = values[source]
+            results[f'preprocess.{profile}.{op}'] = time_call(lambda: [func(crop, preprocessor) for crop in inputs],
+                                                              repeat)
+            values[op] = [func(crop, preprocessor) for crop in inputs]
+    return results
+
+def micro_benchmarks(repeat):
+    """
+    Time the hot functions of each stage on one synthetic page.
+    """
+    page, boxes, lines = make_synthetic_page(0)
+    crops = [page[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+    region_translations = {
+        i: {'original': line, 'translation': f"Line {i}: what are you doing here at this hour?!", 'coords': box}
+        for i, (box, line) in enumerate(zip(boxes, lines))
+    }
+    # A chapter's worth of OCR text with many near-duplicate lines, as dedup sees it
+    text_regions = [
+        {'text': SAMPLE_LINES[i % len(SAMPLE_LINES)] + ('！' * (i % 3)), 'coords': boxes[i % len(boxes)]}
+        for i in range(400)
+    ]
+    # A per-series glossary with thousands of character names
+    formatter = MangaFormatter(names={f'キャラクター{i:04d}': f'Character {i}' for i in range(5000)})
+    translations = [data['translation'] for data in region_translations.values()]
+    x1, y1, x2, y2 = boxes[0]
+    return dict(preprocess_benchmarks(crops, repeat), **{
+        'validate_ocr_result': time_call(lambda: [validate_ocr_result(line, crop) for line, crop in zip(lines, crops)], repeat),
+        'group_sentences': time_call(lambda: group_sentences(text_regions), repeat),
+        'manga_style_formatting': time_call(
+            lambda: [manga_style_formatting(data['translation']) for data in region_translations.values()], repeat
+        ),
+        'format_batch_5000_names': time_call(lambda: formatter.format_batch(translations), repeat),
+        'insert_translation': time_call(
+            lambda: insert_translation(page.copy(), (x1, y1, x2, y2), region_translations[0]['translation'], FONT_PATH),
+            repeat
+        ),
+        'check_and_fix_truncated_text': time_call(lambda: check_and_fix_truncated_text(page, region_translations), repeat),
+    })
+
+def real_models_available():
+    """
+    Check whether the real detector weights and the OCR and detection libraries are installed,
+    so ``--real`` can run without downloading anything but the manga-ocr weights on first use.
+    """
+    return (os.path.exists(MODEL_PATH) and importlib.util.find_spec('ultralytics') is not None
+            and importlib.util.find_spec('manga_ocr') is not None)
+
+def end_to_end(page_count, mode, ocr_seconds, translate_seconds, workers=2, real=False):
+    """
+    Run the full stage list on synthetic pages and report pages per second.
+    With ``real`` the YOLO detector and manga-ocr run instead of the stubs (translation stays
+    on the offline placeholder translator); the models are loaded before timing starts,
+    except in processes mode, where loading is part of each worker's startup either way.
+    """
+    work_dir = tempfile.mkdtemp(prefix='mangaflow-bench-')
+    try:
+        paths = write_pages(os.path.join(work_dir, 'pages'), page_count)
+        output_dir = os.path.join(work_dir, 'out')
+        if real:
+            models = LazyModels(model_path=MODEL_PATH)
+            if mode != 'processes':
+                models.warm_up()
+            worker_setup = WorkerSetup({'model_path': MODEL_PATH}, output_dir=output_dir)
+        else:
+            models = StubModels(SAMPLE_LINES, ocr_seconds, translate_seconds)
+            worker_setup = StubWorkerSetup(SAMPLE_LINES, output_dir, ocr_seconds, translate_seconds)
+        stages = build_stages(models, translate_workers=2 if mode == 'pipelined' else 1, output_dir=output_dir)
+        pages = [make_page(i, path) for i, path in enumerate(paths)]
+        start = time.perf_counter()
+        if mode == 'processes':
+            finished = run_processes(pages, worker_setup, workers=workers)
+        elif mode == 'pipelined':
+            finished = run_pipelined(pages, stages)
+        else:
+            finished = run_sequential(pages, stages)
+        seconds = time.perf_counter() - start
+        models.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    result = {
+        'pages': len(finished),
+        'seconds': seconds,
+        'pages_per_second': len(finished) / seconds if seconds else 0.0,
+    }
+    if mode == 'processes':
+        result['workers'] = workers
+    elif not real:
+        result['translation_requests'] = models.translator.requests
+    return result
+
+def environment():
+    """
+    Describe where the numbers came from so results from different machines are not confused.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+    }
+
+def compare(previous, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Print the change of every timing against an earlier result file.
+
+    Returns:
+        list: Names of benchmarks that got slower by more than ``threshold``
+    """
+    regressions = []
+    for name, result in current['micro'].items():
+        before = previous.get('micro', {}).get(name)
+        if not before:
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1
+        print(f"{name:32s} {before['median_ms']:10.3f} -> {result['median_ms']:10.3f} ms  ({change:+.1%})")
+        if change > threshold:
+            regressions.append(name)
+    for mode, result in current['end_to_end'].items():
+        before = previous.get('end_to_end', {}).get(mode)
+        if not before:
+            continue
+        change = result['pages_per_second'] / before['pages_per_second'] - 1
+        print(f"{'end_to_end.' + mode:32s} {before['pages_per_second']:10.2f} -> "
+              f"{result['pages_per_second']:10.2f} pages/s ({change:+.1%})")
+        if change < -threshold:
+            regressions.append(f"end_to_end.{mode}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark MangaFlow offline on synthetic pages with stub models "
+                                                 "(and optionally the real models).")
+    parser.add_argument('--pages', type=int, default=16, help="Synthetic pages in the end-to-end run")
+    parser.add_argument('--repeat', type=int, default=20, help="Timed calls per microbenchmark")
+    parser.add_argument('--modes', nargs='+', choices=['sequential', 'pipelined', 'processes'],
+                        default=['sequential', 'pipelined'], help="Pipeline modes measured end to end")
+    parser.add_argument('--workers', type=int, default=2, help="Worker processes in processes mode")
+    parser.add_argument('--ocr-latency', type=float, default=0.0, help="Simulated OCR seconds per crop")
+    parser.add_argument('--translate-latency', type=float, default=0.0,
+                        help="Simulated translator seconds per request")
+    parser.add_argument('--real', action='store_true',
+                        help=f"Also run the end-to-end modes with the real YOLO ({MODEL_PATH}) and manga-ocr models")
+    parser.add_argument('--skip-micro', action='store_true', help="Only run the end-to-end benchmark")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', help="Earlier results file to compare against; exits 1 on a regression")
+    args = parser.parse_args(argv)
+    if args.real and not real_models_available():
+        parser.error(f"--real needs {MODEL_PATH}, ultralytics and manga-ocr to be installed")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    results = {'environment': environment(), 'micro': {}, 'end_to_end': {}}
+    if not args.skip_micro:
+        results['micro'] = micro_benchmarks(args.repeat)
+        for name, result in results['micro'].items():
+            print(f"{name:32s} {result['median_ms']:10.3f} ms (min {result['min_ms']:.3f}, max {result['max_ms']:.3f})")
+    # Stub runs are keyed by mode, real-model runs by mode + '.real'
+    runs = [(mode, False) for mode in args.modes] + [(mode, True) for mode in args.modes if args.real]
+    for mode, real in runs:
+        name = f"{mode}.real" if real else mode
+        result = end_to_end(args.pages, mode, args.ocr_latency, args.translate_latency, args.workers, real=real)
+        results['end_to_end'][name] = result
+        print(f"{'end_to_end.' + name:32s} {result['pages_per_second']:10.2f} pages/s "
+              f"({result['pages']} pages in {result['seconds']:.2f}s)")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        regressions = compare(previous, results)
+        if regressions:
+            print(f"Regressions over {REGRESSION_THRESHOLD:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
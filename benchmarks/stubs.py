@@ -0,0 +1,120 @@
+# Import required libraries for offline stand-ins of the detector, OCR and translator
+import time
+import zlib
+import cv2
+import numpy as np
+
+class _Array:
+    """
+    Mimics the tensor interface ``detect_text_regions_batch`` reads (``.cpu().numpy()``).
+    """
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+class _Boxes:
+    def __init__(self, xyxy, cls):
+        self.xyxy = _Array(xyxy)
+        self.cls = _Array(cls)
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+class StubDetector:
+    """
+    Deterministic detector for synthetic pages: every large pure-white connected component
+    is reported as a class 3 text region, in the same result shape as ultralytics.
+
+    Args:
+        min_area (int): Smallest component area reported as a region
+        class_id (int): Class id assigned to every region
+    """
+    def __init__(self, min_area=2000, class_id=3):
+        self.min_area = min_area
+        self.class_id = class_id
+
+    def __call__(self, images, imgsz=640, verbose=False):
+        results = []
+        for image in images:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            _, _, stats, _ = cv2.connectedComponentsWithStats((gray > 250).astype(np.uint8))
+            boxes = [[x, y, x + w, y + h] for x, y, w, h, area in stats[1:] if area >= self.min_area]
+            xyxy = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+            results.append(_Result(_Boxes(xyxy, np.full(len(boxes), self.class_id, dtype=np.float32))))
+        return results
+
+class StubOcrEngine:
+    """
+    Deterministic OCR engine: each crop is mapped to one of ``lines`` by a checksum of its
+    pixels, so identical bubbles always read the same and the same page always gives the same text.
+
+    Args:
+        lines (list): Candidate Japanese lines
+        seconds_per_crop (float): Simulated inference time per crop
+    """
+    def __init__(self, lines, seconds_per_crop=0.0):
+        self.lines = lines
+        self.seconds_per_crop = seconds_per_crop
+
+    def __call__(self, crops):
+        if self.seconds_per_crop:
+            time.sleep(self.seconds_per_crop * len(crops))
+        return [self.lines[zlib.crc32(np.ascontiguousarray(crop).tobytes()) % len(self.lines)] for crop in crops]
+
+class StubTranslator:
+    """
+    Transport accepted by ``translate_batch`` that answers with a fixed pseudo-translation
+    after a simulated round trip, without touching the network.
+
+    Args:
+        seconds_per_request (float): Simulated latency per request
+    """
+    backend_name = 'stub'
+
+    def __init__(self, seconds_per_request=0.0):
+        self.seconds_per_request = seconds_per_request
+        self.requests = 0
+
+    def translate_texts(self, texts, source_lang, target_lang):
+        self.requests += 1
+        if self.seconds_per_request:
+            time.sleep(self.seconds_per_request)
+        return [f"TRANSLATED LINE NUMBER {zlib.crc32(text.encode('utf-8')) % 1000} OF THE PAGE" for text in texts]
+
+class StubModels:
+    """
+    Drop-in replacement for ``LazyModels`` built from the stubs above.
+    """
+    def __init__(self, lines, ocr_seconds_per_crop=0.0, translate_seconds_per_request=0.0):
+        self.detector = StubDetector()
+        self.ocr_engine = StubOcrEngine(lines, ocr_seconds_per_crop)
+        self.translator = StubTranslator(translate_seconds_per_request)
+        self.translator_backend = StubTranslator.backend_name
+        self.load_times = {}
+
+    def warm_up(self):
+        pass
+
+    def close(self):
+        pass
+
+class StubWorkerSetup:
+    """
+    Picklable worker setup for ``run_processes`` that builds the stub models in each worker.
+    """
+    def __init__(self, lines, output_dir, ocr_seconds_per_crop=0.0, translate_seconds_per_request=0.0):
+        self.lines = lines
+        self.output_dir = output_dir
+        self.ocr_seconds_per_crop = ocr_seconds_per_crop
+        self.translate_seconds_per_request = translate_seconds_per_request
+
+    def __call__(self):
+        from manga_translator.pipeline import build_stages
+        models = StubModels(self.lines, self.ocr_seconds_per_crop, self.translate_seconds_per_request)
+        return build_stages(models, output_dir=self.output_dir), models.close
@@ -0,0 +1,85 @@
+# Import required libraries for synthetic page generation
+import os
+import random
+import cv2
+import numpy as np
+
+# Lines drawn into the synthetic bubbles; repeats are intentional so dedup has work to do
+SAMPLE_LINES = [
+    'なにをしている！',
+    'お前はだれだ？',
+    'ちくしょう…',
+    'やった！',
+    'うるさい！',
+    'ドドドドド',
+    'バキバキ',
+    'やれやれだぜ。',
+    'カイドウはどこだ？',
+    '海賊王に俺はなる！',
+    'はい、わかりました。',
+    'いいえ、ちがいます。',
+]
+
+def draw_glyph(image, char, x, y, size):
+    """
+    Draw a pseudo-glyph for ``char``: a few brush strokes chosen from the character code,
+    so equal characters look equal and the ink density is close to real lettering.
+    (The bundled font has no kana glyphs, so real text would render as empty boxes.)
+    """
+    rng = random.Random(ord(char))
+    for _ in range(rng.randint(3, 6)):
+        start = (x + rng.randint(2, size - 2), y + rng.randint(2, size - 2))
+        end = (x + rng.randint(2, size - 2), y + rng.randint(2, size - 2))
+        cv2.line(image, start, end, (0, 0, 0), 3, cv2.LINE_AA)
+
+def make_page(seed, width=1200, height=1700, bubbles=12, glyph_size=34, column_length=6):
+    """
+    Draw a deterministic synthetic manga page: blurred grey screentone with white speech
+    bubbles holding vertical lines of pseudo-glyphs, read right to left.
+
+    Args:
+        seed (int): Random seed; the same seed always gives the same page
+        width (int): Page width in pixels
+        height (int): Page height in pixels
+        bubbles (int): Number of speech bubbles
+        glyph_size (int): Size of one character cell in pixels
+        column_length (int): Characters per vertical column
+
+    Returns:
+        tuple: (BGR page as numpy.ndarray, list of (x1, y1, x2, y2) bubble boxes, list of bubble lines)
+    """
+    rng = random.Random(seed)
+    noise = np.random.default_rng(seed).integers(60, 200, size=(height, width), dtype=np.uint8)
+    page = cv2.cvtColor(cv2.GaussianBlur(noise, (0, 0), 3), cv2.COLOR_GRAY2BGR)
+    boxes, lines = [], []
+    columns = 4
+    cell_width, cell_height = width // columns, height // ((bubbles + columns - 1) // columns)
+    margin = glyph_size // 2
+    for i in range(bubbles):
+        line = rng.choice(SAMPLE_LINES)
+        text_columns = (len(line) + column_length - 1) // column_length
+        bubble_width = min(text_columns * glyph_size + 2 * margin, cell_width - 10)
+        bubble_height = min(min(len(line), column_length) * glyph_size + 2 * margin, cell_height - 10)
+        x1 = (i % columns) * cell_width + rng.randint(5, cell_width - bubble_width - 5)
+        y1 = (i // columns) * cell_height + rng.randint(5, cell_height - bubble_height - 5)
+        x2, y2 = x1 + bubble_width, y1 + bubble_height
+        cv2.rectangle(page, (x1, y1), (x2, y2), (255, 255, 255), -1)
+        for n, char in enumerate(line):
+            column, row = divmod(n, column_length)
+            draw_glyph(page, char, x2 - margin - (column + 1) * glyph_size, y1 + margin + row * glyph_size, glyph_size)
+        boxes.append((x1, y1, x2, y2))
+        lines.append(line)
+    return page, boxes, lines
+
+def write_pages(directory, count, seed=0, **kwargs):
+    """
+    Write ``count`` synthetic pages as PNG files and return their paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        page, _, _ = make_page(seed + i, **kwargs)
+        path = os.path.join(directory, f"page_{i:03d}.png")
+        cv2.imwrite(path, page)
+        paths.append(path)
+    return paths
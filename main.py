@@ -1,16 +1,41 @@
+import time
+_IMPORT_START = time.perf_counter()
+
 import os
-import cv2
+import sys
+import argparse
+import contextlib
 import logging
-import matplotlib.pyplot as plt
-import re
 from dotenv import load_dotenv
-from manga_translator.config import IMAGE_DIR, MODEL_PATH, FONT_PATH, TRANSLATED_DIR
-from manga_translator.image_utils import reload_and_save_images, preprocess_image, enhance_text_region
-from manga_translator.detection import load_yolo_model, detect_text_regions, sort_bubbles
-from manga_translator.ocr import mocr, validate_ocr_result, verify_japanese_text
-from manga_translator.text_utils import clean_ocr_text, split_japanese_sentences, is_similar
-from manga_translator.translation import get_translator_deepl, clean_and_translate_text, post_process_translation
-from manga_translator.overlay import insert_translation, check_and_fix_truncated_text
+from manga_translator.config import (
+    IMAGE_DIR, MODEL_PATH, FONT_PATH, MANIFEST_PATH, TRANSLATED_DIR, COMPARISON_SCALE,
+    PIPELINE_MODE, PIPELINE_QUEUE_SIZE, TRANSLATE_WORKERS, PROCESS_WORKERS,
+    DETECTION_BATCH_SIZE, DETECTION_IMAGE_SIZE, OCR_MAX_BATCH_SIZE, SOURCE_LANG, TARGET_LANG,
+    DETECTION_BACKEND, DETECTION_TILING, OCR_BACKEND, OCR_PREPROCESS_PROFILE, OCR_SCREENING_MARGIN,
+    DETECTION_TILE_SIZE, DETECTION_TILE_OVERLAP, DETECTION_TILE_MAX_ASPECT, DETECTION_TILE_MAX_SIDE,
+    OCR_CACHE_PATH, OCR_CACHE_MAX_ENTRIES, OCR_CACHE_MAX_DISTANCE, OCR_CACHE_SIZE_TOLERANCE,
+    ONNX_DIR, ONNX_QUANTIZED, ONNX_THREADS, ARTIFACT_STORE_PATH,
+    TRANSLATION_CACHE_PATH, TRANSLATION_CACHE_MEMORY_SIZE, TRANSLATION_CACHE_MAX_ENTRIES,
+    TRANSLATION_CACHE_TTL_DAYS, TRANSLATION_PAGE_WINDOW, TRANSLATION_MAX_IN_FLIGHT,
+    SERVER_HOST, SERVER_PORT, SERVER_MAX_BATCH_SIZE, SERVER_MAX_WAIT_MS
+)
+from manga_translator.models import LazyModels
+from manga_translator.metrics import metrics
+from manga_translator.translation_cache import TranslationCache
+from manga_translator.artifacts import ArtifactStore, stage_versions
+from manga_translator.ocr_cache import OcrCache
+from manga_translator.comparison import ComparisonWriter
+from manga_translator.manifest import RunManifest, file_digest, run_fingerprint
+from manga_translator.pipeline import make_page, build_stages, run_sequential, run_pipelined
+from manga_translator.parallel import WorkerSetup, run_processes, threads_per_worker
+from manga_translator.server import TranslationService, serve
+from manga_translator.image_utils import PREPROCESS_PROFILES
+from manga_translator.archive import (
+    PAGE_EXTENSIONS, ArchiveWriter, close_archives, list_archive_pages, natural_sort_key
+)
+
+# Heavy libraries (torch, ultralytics, manga_ocr, deepl) are imported when a model is first used
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
 
 # Load environment variables from .env
 load_dotenv()
@@ -18,150 +43,304 @@ load_dotenv()
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def main():
-    # 1. Reload and clean images
-    reload_and_save_images(IMAGE_DIR)
+def parse_args(argv=None):
+    """
+    Parse command line options for a translation run.
+    """
+    parser = argparse.ArgumentParser(description="Translate manga pages in a folder.")
+    parser.add_argument('--mode', choices=['sequential', 'pipelined', 'processes'], default=PIPELINE_MODE,
+                        help="Process pages one after another, overlap stages across pages, "
+                             "or shard pages across worker processes")
+    parser.add_argument('--queue-size', type=int, default=PIPELINE_QUEUE_SIZE,
+                        help="Pages allowed to wait between two stages in pipelined mode")
+    parser.add_argument('--translate-workers', type=int, default=TRANSLATE_WORKERS,
+                        help="Threads used for the translation stage in pipelined mode")
+    parser.add_argument('--workers', type=int, default=PROCESS_WORKERS,
+                        help="Worker processes in processes mode; each loads its own models")
+    parser.add_argument('--threads-per-worker', type=int,
+                        help="Torch/OpenCV threads per worker process (default: cores divided by workers)")
+    parser.add_argument('--detect-batch-size', type=int, default=DETECTION_BATCH_SIZE,
+                        help="Pages sent to the detector in one forward pass")
+    parser.add_argument('--detect-imgsz', type=int, default=DETECTION_IMAGE_SIZE,
+                        help="Inference size pages are letterboxed to for detection")
+    parser.add_argument('--tiling', choices=['auto', 'always', 'off'], default=DETECTION_TILING,
+                        help="Detect tall webtoon strips and huge scans in overlapping tiles "
+                             "('auto' tiles only pages that need it)")
+    parser.add_argument('--ocr-batch-size', type=int, default=OCR_MAX_BATCH_SIZE,
+                        help="Maximum crops decoded in one OCR forward pass")
+    parser.add_argument('--preprocess', choices=list(PREPROCESS_PROFILES), default=OCR_PREPROCESS_PROFILE,
+                        help="Crop preprocessing before OCR; per-operation times are in the exported metrics")
+    parser.add_argument('--detection-backend', choices=['torch', 'onnx'], default=DETECTION_BACKEND,
+                        help="Run the detector with ultralytics/torch or the exported ONNX model")
+    parser.add_argument('--ocr-backend', choices=['torch', 'onnx'], default=OCR_BACKEND,
+                        help="Run OCR with manga-ocr/torch or the exported ONNX encoder/decoder")
+    parser.add_argument('--onnx-dir', default=ONNX_DIR, help="Directory holding the exported ONNX models")
+    parser.add_argument('--onnx-quantized', action='store_true', default=ONNX_QUANTIZED,
+                        help="Use the INT8-quantized ONNX models")
+    parser.add_argument('--onnx-threads', type=int, default=ONNX_THREADS,
+                        help="Intra-op threads per ONNX session (0 uses every core)")
+    parser.add_argument('--translation-window', type=int, default=TRANSLATION_PAGE_WINDOW,
+                        help="Pages whose sentences are sent to the translator together")
+    parser.add_argument('--async-translation', action='store_true',
+                        help="Send translation requests concurrently from a shared async client")
+    parser.add_argument('--max-in-flight', type=int, default=TRANSLATION_MAX_IN_FLIGHT,
+                        help="Concurrent translation requests in async mode")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Always call the translator instead of using the translation cache")
+    parser.add_argument('--cache-path', default=TRANSLATION_CACHE_PATH,
+                        help="SQLite file holding cached translations")
+    parser.add_argument('--glossary',
+                        help="JSON or tab-separated file of known translations used to pre-warm the cache")
+    parser.add_argument('--no-ocr-cache', action='store_true',
+                        help="Run OCR on every crop instead of reusing results for recurring crops")
+    parser.add_argument('--ocr-cache-path', default=OCR_CACHE_PATH,
+                        help="SQLite file holding OCR results keyed by the crops' perceptual hashes")
+    parser.add_argument('--no-artifacts', action='store_true',
+                        help="Run detection, OCR and translation on every page instead of reusing stored results")
+    parser.add_argument('--artifact-path', default=ARTIFACT_STORE_PATH,
+                        help="SQLite file holding per-page detection, OCR and translation results")
+    parser.add_argument('--formatting-glossary',
+                        help="JSON or tab-separated file of character names, phrases and honorifics "
+                             "applied when formatting translations")
+    parser.add_argument('--comparison', action='store_true',
+                        help="Also write a side-by-side original/translated image per page")
+    parser.add_argument('--comparison-scale', type=float, default=COMPARISON_SCALE,
+                        help="Downscale factor for comparison images (1.0 keeps the source resolution)")
+    parser.add_argument('--warmup', action='store_true',
+                        help="Load all models and run a dummy inference before processing pages")
+    parser.add_argument('--metrics-dir',
+                        help="Record per-stage timings and counters and export them to this directory")
+    parser.add_argument('--force', action='store_true',
+                        help="Reprocess every page even if its output is up to date")
+    parser.add_argument('--archive',
+                        help="Translate the pages of this CBZ/ZIP archive instead of the images folder")
+    parser.add_argument('--output-archive',
+                        help="CBZ the translated archive pages are written to "
+                             "(default: <output folder>/<archive name>_translated.cbz)")
+    parser.add_argument('--serve', action='store_true',
+                        help="Keep the models warm and translate pages posted to a local HTTP endpoint")
+    parser.add_argument('--host', default=SERVER_HOST, help="Interface the server binds to")
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help="Port the server listens on")
+    parser.add_argument('--max-batch-size', type=int, default=SERVER_MAX_BATCH_SIZE,
+                        help="Pages from concurrent requests batched per detection/OCR/translation call")
+    parser.add_argument('--max-wait-ms', type=float, default=SERVER_MAX_WAIT_MS,
+                        help="Longest a page waits for other requests to join its batch")
+    args = parser.parse_args(argv)
+    if args.archive and args.mode == 'processes':
+        parser.error("--archive cannot be combined with --mode processes")
+    return args
 
-    # 2. Load YOLO model
-    model = load_yolo_model(MODEL_PATH)
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics_dir or args.serve:
+        metrics.enable()
 
-    # 3. Initialize DeepL translator using API key from environment
-    deepl_api_key = os.environ.get('DEEPL_API_KEY')
-    translator_deepl = get_translator_deepl(deepl_api_key)
+    # 1. Set up the detector, OCR engine and translator; each loads on first use
+    model_options = {
+        'model_path': MODEL_PATH,
+        'ocr_batch_size': args.ocr_batch_size,
+        'api_key': os.environ.get('DEEPL_API_KEY'),
+        'server_url': os.environ.get('DEEPL_SERVER_URL'),
+        'async_translation': args.async_translation,
+        'max_in_flight': args.max_in_flight,
+        'detection_backend': args.detection_backend,
+        'ocr_backend': args.ocr_backend,
+        'onnx_dir': args.onnx_dir,
+        'onnx_quantized': args.onnx_quantized,
+        'onnx_threads': args.onnx_threads,
+    }
+    models = LazyModels(**model_options)
+    # In processes mode every worker loads and warms up its own models instead
+    if args.warmup and args.mode != 'processes':
+        models.warm_up()
 
-    # 4. Process each image in the directory
-    for image_file in os.listdir(IMAGE_DIR):
-        if not image_file.lower().endswith(('.jpg', '.jpeg', '.png')):
-            continue
-        image_path = os.path.join(IMAGE_DIR, image_file)
-        image = cv2.imread(image_path)
-        if image is None:
-            logging.warning(f"Could not read image: {image_path}")
-            continue
+    # 2. Open the translation cache
+    translation_cache = None
+    cache_options = None
+    if not args.no_cache:
+        cache_options = {
+            'db_path': args.cache_path,
+            'memory_size': TRANSLATION_CACHE_MEMORY_SIZE,
+            'max_entries': TRANSLATION_CACHE_MAX_ENTRIES,
+            'ttl_seconds': TRANSLATION_CACHE_TTL_DAYS * 24 * 3600,
+        }
+        translation_cache = TranslationCache(**cache_options)
+        if args.glossary:
+            translation_cache.load_glossary(args.glossary, SOURCE_LANG, TARGET_LANG, models.translator_backend)
 
-        # 5. Detect text regions
-        results = detect_text_regions(model, image_path)
-        sorted_boxes = sort_bubbles(results[0].boxes.xyxy)
+    # Open the OCR cache; entries are kept apart per OCR backend, model and preprocessing profile
+    ocr_cache = None
+    ocr_cache_options = None
+    if not args.no_ocr_cache:
+        ocr_cache_options = {
+            'db_path': args.ocr_cache_path,
+            'namespace': f"{args.ocr_backend}:{'int8' if args.onnx_quantized and args.ocr_backend == 'onnx' else 'fp'}"
+                         f":{args.preprocess}",
+            'max_entries': OCR_CACHE_MAX_ENTRIES,
+            'max_distance': OCR_CACHE_MAX_DISTANCE,
+            'size_tolerance': OCR_CACHE_SIZE_TOLERANCE,
+        }
+        # Worker processes open their own
+        if args.mode != 'processes' or args.serve:
+            ocr_cache = OcrCache(**ocr_cache_options)
 
-        # 6. Process and OCR text regions (class 3 only)
-        text_regions = []
-        for i, (box, cls_id) in enumerate(zip(results[0].boxes.xyxy, results[0].boxes.cls)):
-            cls_id = int(cls_id)
-            if cls_id != 3:
-                continue
-            x1, y1, x2, y2 = map(int, box)
-            cropped = image[y1:y2, x1:x2]
-            enhanced_crop = enhance_text_region(cropped)
-            pil_crop = cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)
-            pil_crop = cv2.cvtColor(pil_crop, cv2.COLOR_BGR2RGB)
-            pil_crop = cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)
-            from PIL import Image
-            pil_crop = Image.fromarray(pil_crop)
-            text = mocr(pil_crop)
-            is_valid = validate_ocr_result(text, cropped) and verify_japanese_text(text)
-            if not is_valid:
-                continue
-            text_regions.append({'text': text, 'coords': (x1, y1, x2, y2), 'class': cls_id})
+    if args.serve:
+        models.warm_up()
+        service = TranslationService(models, translation_cache, max_batch_size=args.max_batch_size,
+                                     max_wait=args.max_wait_ms / 1000, detect_imgsz=args.detect_imgsz,
+                                     detect_tiling=args.tiling, ocr_preprocess=args.preprocess,
+                                     formatting_glossary=args.formatting_glossary, ocr_cache=ocr_cache)
+        serve(service, args.host, args.port)
+        if translation_cache is not None:
+            translation_cache.close()
+        if ocr_cache is not None:
+            ocr_cache.close()
+        models.close()
+        return 0
 
-        # 7. Clean, split, deduplicate text
-        cleaned_text_regions = []
-        for i, region in enumerate(text_regions):
-            cleaned_text = clean_ocr_text(region['text'])
-            formatted_text = split_japanese_sentences(cleaned_text)
-            if formatted_text.strip():
-                cleaned_text_regions.append({'id': i, 'text': formatted_text, 'coords': region['coords']})
-        region_to_sentences = {}
-        for region in cleaned_text_regions:
-            sentences = region['text'].split('\n')
-            valid_sentences = [s for s in sentences if s.strip()]
-            if valid_sentences:
-                region_to_sentences[region['id']] = {'sentences': valid_sentences, 'coords': region['coords']}
-        all_sentences = []
-        for region_id, region_data in region_to_sentences.items():
-            for sentence in region_data['sentences']:
-                all_sentences.append((region_id, sentence))
-        unique_sentences = []
-        for i, (region_id, sentence) in enumerate(all_sentences):
-            is_duplicate = False
-            for _, existing_sentence in unique_sentences:
-                if is_similar(sentence, existing_sentence):
-                    is_duplicate = True
-                    break
-            if not is_duplicate:
-                unique_sentences.append((region_id, sentence))
+    # 3. Collect the pages in the directory, skipping pages whose output is up to date
+    manifest = RunManifest(MANIFEST_PATH)
+    fingerprint = run_fingerprint(MODEL_PATH, FONT_PATH, {
+        'detect_imgsz': args.detect_imgsz,
+        'detect_tiling': args.tiling,
+        'ocr_preprocess': args.preprocess,
+        'source_lang': SOURCE_LANG,
+        'target_lang': TARGET_LANG,
+        'translator': models.translator_backend,
+        'detection_backend': args.detection_backend,
+        'ocr_backend': args.ocr_backend,
+        'onnx_quantized': args.onnx_quantized,
+        'glossary': file_digest(args.glossary) if args.glossary else '',
+        'formatting_glossary': file_digest(args.formatting_glossary) if args.formatting_glossary else '',
+    })
+    # Results of detection, OCR and translation are reused while the settings and code
+    # they depend on are unchanged, so e.g. a font change only re-renders the pages
+    artifact_store = None
+    artifact_options = None
+    if not args.no_artifacts:
+        artifact_options = {
+            'db_path': args.artifact_path,
+            'versions': stage_versions({
+                'detect': {
+                    'backend': args.detection_backend,
+                    'model': file_digest(MODEL_PATH) if args.detection_backend == 'torch' else '',
+                    'onnx_quantized': args.onnx_quantized if args.detection_backend == 'onnx' else False,
+                    'imgsz': args.detect_imgsz,
+                    'tiling': args.tiling,
+                    'tiles': [DETECTION_TILE_SIZE, DETECTION_TILE_OVERLAP, DETECTION_TILE_MAX_ASPECT,
+                              DETECTION_TILE_MAX_SIDE],
+                },
+                'ocr': {
+                    'backend': args.ocr_backend,
+                    'onnx_quantized': args.onnx_quantized if args.ocr_backend == 'onnx' else False,
+                    'preprocess': args.preprocess,
+                    'screening_margin': OCR_SCREENING_MARGIN,
+                },
+                'translate': {
+                    'source_lang': SOURCE_LANG,
+                    'target_lang': TARGET_LANG,
+                    'translator': models.translator_backend,
+                    'glossary': file_digest(args.glossary) if args.glossary else '',
+                    'formatting_glossary': file_digest(args.formatting_glossary) if args.formatting_glossary else '',
+                },
+            }),
+        }
+        artifact_store = ArtifactStore(**artifact_options)
 
-        # 8. Translate text
-        translation_map = {}
-        for _, sentence in unique_sentences:
-            is_sfx = bool(re.search(r'[ドゴバキガ]{2,}', sentence))
-            translation = clean_and_translate_text(sentence, translator_deepl)
-            if translation:
-                processed_translation = post_process_translation(translation, "sfx" if is_sfx else None)
-                translation_map[sentence] = processed_translation
+    archive_writer = None
+    if args.archive:
+        # Archive pages are read from memory and streamed into the output CBZ, which is
+        # rewritten as a whole, so the per-file manifest does not apply
+        members = list_archive_pages(args.archive)
+        pages = [
+            make_page(i, os.path.join(args.archive, member), archive=args.archive, member=member)
+            for i, member in enumerate(members)
+        ]
+        name = os.path.splitext(os.path.basename(args.archive))[0]
+        archive_writer = ArchiveWriter(args.output_archive or os.path.join(TRANSLATED_DIR, f"{name}_translated.cbz"))
+        manifest = None
+        logging.info(f"{len(pages)} pages in {args.archive}")
+    else:
+        image_files = sorted((f for f in os.listdir(IMAGE_DIR) if f.lower().endswith(PAGE_EXTENSIONS)),
+                             key=natural_sort_key)
+        pages = [
+            make_page(i, os.path.join(IMAGE_DIR, f), fingerprint=fingerprint)
+            for i, f in enumerate(image_files)
+            if args.force or not manifest.is_up_to_date(os.path.join(IMAGE_DIR, f), fingerprint)
+        ]
+        logging.info(f"{len(pages)} of {len(image_files)} pages need processing")
 
-        # 9. Map translations back to regions
-        region_translations = {}
-        for region_id, region_data in region_to_sentences.items():
-            sentences = region_data['sentences']
-            translations = []
-            for sentence in sentences:
-                if not sentence.strip():
-                    continue
-                is_sfx = bool(re.search(r'[ドゴバキガ]{2,}', sentence))
-                if not is_sfx and sentence.strip() in ['！', '。', '、', '．．．']:
-                    continue
-                if sentence in translation_map:
-                    translations.append(translation_map[sentence])
+    # 4. Decode, detect, OCR, translate, render and save every page
+    # Detection sees chunks of --detect-batch-size decoded pages at a time
+    stage_options = {
+        'detect_batch_size': args.detect_batch_size,
+        'detect_imgsz': args.detect_imgsz,
+        'detect_tiling': args.tiling,
+        'ocr_preprocess': args.preprocess,
+        'formatting_glossary': args.formatting_glossary,
+        'translation_window': args.translation_window,
+    }
+    comparison_writer = None
+    if args.mode == 'processes':
+        if not model_options['onnx_threads']:
+            # ONNX sessions ignore OMP_NUM_THREADS, so give them their share of the cores explicitly
+            model_options['onnx_threads'] = args.threads_per_worker or threads_per_worker(args.workers)
+        setup = WorkerSetup(model_options, stage_options, cache_options,
+                            comparison_scale=args.comparison_scale if args.comparison else None,
+                            artifact_options=artifact_options, ocr_cache_options=ocr_cache_options)
+        startup_seconds = time.perf_counter() - _IMPORT_START
+        finished = run_processes(pages, setup, workers=args.workers, manifest=manifest, threads=args.threads_per_worker)
+    else:
+        comparison_writer = ComparisonWriter(TRANSLATED_DIR, scale=args.comparison_scale) if args.comparison else None
+        stages = build_stages(models, translate_workers=args.translate_workers, translation_cache=translation_cache,
+                              manifest=manifest, comparison_writer=comparison_writer, archive_writer=archive_writer,
+                              artifact_store=artifact_store, ocr_cache=ocr_cache,
+                              **stage_options)
+        startup_seconds = time.perf_counter() - _IMPORT_START
+        # The output archive is moved into place only if the run finishes; otherwise it is discarded
+        try:
+            with archive_writer if archive_writer is not None else contextlib.nullcontext():
+                if args.mode == 'pipelined':
+                    finished = run_pipelined(pages, stages, queue_size=args.queue_size)
                 else:
-                    best_match = None
-                    best_score = 0
-                    for original in translation_map.keys():
-                        score = is_similar(sentence, original)
-                        if score > best_score and score > 0.8:
-                            best_score = score
-                            best_match = original
-                    if best_match:
-                        translations.append(translation_map[best_match])
-            if translations:
-                combined_translation = ' '.join(translations)
-                is_sfx_region = any(bool(re.search(r'[ドゴバキガ]{2,}', s)) for s in sentences)
-                final_translation = post_process_translation(combined_translation, "sfx" if is_sfx_region else None)
-                region_translations[region_id] = {
-                    'original': "\n".join(sentences),
-                    'translation': final_translation,
-                    'coords': region_data['coords']
-                }
+                    finished = run_sequential(pages, stages)
+        finally:
+            close_archives()
+    # Pages with failed translation requests were written but not recorded as finished
+    failed_pages = [os.path.basename(page['path']) for page in finished if page.get('translation_failures')]
+    screened_out = sum(page.get('screened_out', 0) for page in finished)
+    logging.info(f"Screening skipped {screened_out} OCR calls on regions that could not pass validation")
+    if ocr_cache_options is not None:
+        cache_hits = sum(page.get('ocr_cache_hits', 0) for page in finished)
+        logging.info(f"OCR cache answered {cache_hits} crops without running the OCR model")
 
-        # 10. Overlay translations and save results
-        translated_image = image.copy()
-        os.makedirs(TRANSLATED_DIR, exist_ok=True)
-        for region_id, data in region_translations.items():
-            if not data['translation'].strip():
-                continue
-            box_coords = data['coords']
-            translated_image = insert_translation(
-                translated_image,
-                box_coords,
-                data['translation'],
-                font_path=FONT_PATH
-            )
-        translated_image = check_and_fix_truncated_text(translated_image, region_translations)
-        output_path = os.path.join(TRANSLATED_DIR, f"translated_{os.path.basename(image_path)}")
-        cv2.imwrite(output_path, translated_image)
-        logging.info(f"Saved translated image to: {output_path}")
-        # Optionally, display results
-        plt.figure(figsize=(20, 10))
-        plt.subplot(1, 2, 1)
-        plt.imshow(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        plt.title("Original Image", fontsize=16)
-        plt.axis('off')
-        plt.subplot(1, 2, 2)
-        plt.imshow(cv2.cvtColor(translated_image, cv2.COLOR_BGR2RGB))
-        plt.title("Translated Image", fontsize=16)
-        plt.axis('off')
-        plt.tight_layout()
-        plt.savefig(os.path.join(TRANSLATED_DIR, f"comparison_{os.path.basename(image_path)}.png"), dpi=300)
-        plt.close()
+    if comparison_writer is not None:
+        comparison_writer.close()
+    if translation_cache is not None:
+        logging.info(f"Translation cache: {translation_cache.stats()}")
+        translation_cache.close()
+    if ocr_cache is not None:
+        logging.info(f"OCR cache: {ocr_cache.stats()}")
+        ocr_cache.close()
+    if artifact_store is not None:
+        restored = {}
+        for page in finished:
+            if page.get('restored'):
+                restored[page['restored']] = restored.get(page['restored'], 0) + 1
+        logging.info(f"Pages restored from stored artifacts, by latest reused stage: {restored or 'none'}")
+        artifact_store.close()
+    models.close()
+    if args.metrics_dir:
+        metrics.export_all(args.metrics_dir)
+        logging.info(f"Wrote metrics.json, metrics.prom and trace.json to {args.metrics_dir}")
+    load_report = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in models.load_times.items()) or 'none'
+    logging.info(f"Startup: imports {IMPORT_SECONDS:.2f}s, ready after {startup_seconds:.2f}s; "
+                 f"model loads: {load_report}")
+    if failed_pages:
+        logging.error(f"{len(failed_pages)} pages were saved with untranslated text and will be retried "
+                      f"on the next run: {', '.join(failed_pages)}")
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# Import required libraries for reading and writing CBZ/ZIP chapter archives
+import os
+import re
+import logging
+import zipfile
+import threading
+
+# File extensions treated as pages, in archives and in the input directory
+PAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+def natural_sort_key(name):
+    """
+    Sort key that orders embedded numbers by value, so 'page2.jpg' comes before 'page10.jpg'.
+    """
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+def is_archive(path):
+    return path.lower().endswith(('.cbz', '.zip'))
+
+def list_archive_pages(archive_path):
+    """
+    List the page images stored in a CBZ/ZIP archive in natural reading order.
+    Directories and macOS resource forks (``__MACOSX/``, ``._*``) are skipped.
+
+    Args:
+        archive_path (str): Path to the archive
+
+    Returns:
+        list: Member names of the pages
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        names = [
+            info.filename for info in archive.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(PAGE_EXTENSIONS)
+            and not info.filename.startswith('__MACOSX/')
+            and not os.path.basename(info.filename).startswith('._')
+        ]
+    return sorted(names, key=natural_sort_key)
+
+# Archives opened by the current thread, by path (ZipFile handles are not shared between threads)
+_open_archives = threading.local()
+
+# Every handle opened by any thread, so close_archives can close them all
+_handles = []
+_handles_lock = threading.Lock()
+
+def read_archive_member(archive_path, member):
+    """
+    Read one member of an archive into memory; nothing is extracted to disk.
+    Each reader thread keeps its own handle on the archive, so the central directory is
+    parsed once per thread instead of once per page.
+    """
+    archives = getattr(_open_archives, 'archives', None)
+    if archives is None:
+        archives = _open_archives.archives = {}
+    archive = archives.get(archive_path)
+    # A handle closed by close_archives is reopened if the thread reads again
+    if archive is None or archive.fp is None:
+        archive = archives[archive_path] = zipfile.ZipFile(archive_path)
+        with _handles_lock:
+            _handles.append(archive)
+    return archive.read(member)
+
+def close_archives():
+    """
+    Close the archive handles ``read_archive_member`` opened in every thread.
+    Call it once a run has finished reading its pages.
+    """
+    with _handles_lock:
+        handles = list(_handles)
+        _handles.clear()
+    for archive in handles:
+        archive.close()
+
+class ArchiveWriter:
+    """
+    Streams translated pages into a CBZ archive as they finish. Each page is encoded and
+    written straight into the archive, so only the pages currently in the pipeline are held
+    in memory. The archive is written under a temporary name and moved into place on close,
+    so an interrupted run never leaves a truncated CBZ behind.
+
+    Pages are stored without compression (they are already compressed images) under their
+    original member names, in page-index order: pages that finish early (e.g. with several
+    translation workers) are held back until every page before them was added or skipped.
+    Used as a context manager, the archive is closed when the block succeeds and discarded,
+    temporary file included, when it raises.
+
+    Args:
+        path (str): Location of the output archive
+        first_index (int): Index of the first page that will be added
+    """
+    def __init__(self, path, first_index=0):
+        self.path = path
+        self._tmp_path = path + '.tmp'
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Opened on the first write, so a writer that is never used leaves no file behind
+        self._archive = None
+        self._lock = threading.Lock()
+        self._next_index = first_index
+        self._pending = {}
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def add(self, member, data, index=None):
+        """
+        Write one encoded page into the archive.
+
+        Args:
+            member (str): Member name inside the archive
+            data (bytes): Encoded image
+            index (int): Page index; pages with an index are written in index order
+        """
+        with self._lock:
+            if index is None:
+                self._write(member, data)
+                return
+            self._pending[index] = (member, data)
+            self._flush()
+
+    def skip(self, index):
+        """
+        Mark a page that will never be added (e.g. unreadable), so the pages after it are not held back.
+        """
+        with self._lock:
+            self._pending[index] = None
+            self._flush()
+
+    def _open(self):
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self._tmp_path, 'w', compression=zipfile.ZIP_STORED)
+        return self._archive
+
+    def _write(self, member, data):
+        self._open().writestr(member, data)
+        self.count += 1
+
+    def _flush(self):
+        while self._next_index in self._pending:
+            item = self._pending.pop(self._next_index)
+            if item is not None:
+                self._write(*item)
+            self._next_index += 1
+
+    def close(self):
+        """
+        Finish the archive and move it into place.
+        """
+        with self._lock:
+            # Pages after one that never arrived are still written, in index order
+            for index in sorted(self._pending):
+                if self._pending[index] is not None:
+                    self._write(*self._pending[index])
+            self._pending.clear()
+            self._open().close()
+            os.replace(self._tmp_path, self.path)
+        logging.info(f"Wrote {self.count} pages to {self.path}")
+
+    def abort(self):
+        """
+        Discard the unfinished archive; an existing archive at ``path`` is left untouched.
+        """
+        with self._lock:
+            self._pending.clear()
+            if self._archive is not None:
+                self._archive.close()
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+        logging.warning(f"Discarded unfinished archive {self.path}")
@@ -0,0 +1,153 @@
+# Import required libraries for persistent per-stage page artifacts
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from manga_translator.config import VERSION
+from manga_translator.manifest import file_digest
+from manga_translator.detection import sort_bubbles
+from manga_translator.metrics import metrics
+
+# Stages whose results are stored, in pipeline order, with the package modules their results depend on
+ARTIFACT_STAGES = {
+    'detect': ('detection.py', 'onnx_models.py', 'models.py', 'pipeline.py'),
+    'ocr': ('ocr.py', 'ocr_cache.py', 'screening.py', 'image_utils.py', 'onnx_models.py', 'models.py', 'pipeline.py'),
+    'translate': ('translation.py', 'text_utils.py', 'pipeline.py'),
+}
+
+def stage_versions(settings):
+    """
+    Compute the version of every artifact stage. A stage's version covers its own settings,
+    the sources of the modules it runs and the version of the stage before it, so changing
+    anything upstream also invalidates everything downstream, while changes that only affect
+    later stages (fonts, rendering code) leave the stored artifacts valid.
+
+    Args:
+        settings (dict): Stage name -> JSON-serializable settings that influence its result
+
+    Returns:
+        dict: Stage name -> version string
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    versions = {}
+    previous = VERSION
+    for stage, modules in ARTIFACT_STAGES.items():
+        parts = {
+            'previous': previous,
+            'settings': settings.get(stage, {}),
+            'code': {module: file_digest(os.path.join(package_dir, module)) for module in modules},
+        }
+        previous = versions[stage] = hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+    return versions
+
+def _encode(stage, page):
+    # JSON-friendly copy of what a stage added to the page
+    if stage == 'detect':
+        return {'boxes': np.asarray(page['boxes'], dtype=float).tolist(),
+                'classes': np.asarray(page['classes'], dtype=int).tolist()}
+    if stage == 'ocr':
+        return {'text_regions': page['text_regions'], 'screened_out': page.get('screened_out', 0)}
+    return {'region_translations': sorted(page['region_translations'].items())}
+
+def _decode(stage, data, page):
+    # Put a stored artifact back onto the page with the types the stages produce
+    if stage == 'detect':
+        page['boxes'] = np.array(data['boxes'], dtype=np.float32).reshape(-1, 4)
+        page['classes'] = np.array(data['classes'], dtype=int)
+        page['sorted_boxes'] = sort_bubbles(page['boxes'])
+    elif stage == 'ocr':
+        page['text_regions'] = [dict(region, coords=tuple(region['coords'])) for region in data['text_regions']]
+        page['screened_out'] = data['screened_out']
+    else:
+        page['region_translations'] = {
+            int(region_id): dict(region, coords=tuple(region['coords']))
+            for region_id, region in data['region_translations']
+        }
+
+class ArtifactStore:
+    """
+    SQLite store of per-page stage results: detected boxes and classes, accepted OCR text
+    and the regions' translations. Each artifact is keyed by the page's input hash and the
+    version of the stage that produced it, so a rerun restores the latest stage whose
+    version still matches and starts the pipeline after it. Re-rendering with another font
+    skips detection, OCR and translation; changing a translation setting only reruns
+    translation. Only the newest artifact per page and stage is kept.
+
+    Args:
+        db_path (str): Path of the SQLite database file, or ':memory:'
+        versions (dict): Stage name -> version of this run, as built by ``stage_versions``
+    """
+    def __init__(self, db_path, versions):
+        self.db_path = db_path
+        self.versions = versions
+        self._lock = threading.Lock()
+        if db_path != ':memory:' and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Shared by the pipeline's threads, guarded by the lock; worker processes open their own
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS artifacts (
+                   input_hash TEXT NOT NULL,
+                   stage TEXT NOT NULL,
+                   version TEXT NOT NULL,
+                   data TEXT NOT NULL,
+                   created_at REAL NOT NULL,
+                   PRIMARY KEY (input_hash, stage)
+               )"""
+        )
+        self._conn.commit()
+
+    def restore(self, page):
+        """
+        Load the artifact of the latest stage whose stored version matches this run onto the page.
+        Earlier stages' results are not loaded, because the stages after it do not need them.
+
+        Returns:
+            str: Name of the restored stage (kept in ``page['restored']``), or None if every stage must run
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, version, data FROM artifacts WHERE input_hash = ?", (page['input_hash'],)
+            ).fetchall()
+        current = {stage: data for stage, version, data in rows if version == self.versions.get(stage)}
+        for stage in reversed(list(ARTIFACT_STAGES)):
+            if stage in current:
+                _decode(stage, json.loads(current[stage]), page)
+                page['restored'] = stage
+                metrics.count(f'artifacts.restored.{stage}')
+                return stage
+        metrics.count('artifacts.misses')
+        return None
+
+    def needs(self, page, stage):
+        """
+        Check whether ``stage`` still has to run on a page, i.e. it was not restored at or past it.
+        """
+        restored = page.get('restored')
+        stages = list(ARTIFACT_STAGES)
+        return restored is None or stages.index(restored) < stages.index(stage)
+
+    def save(self, stage, pages):
+        """
+        Store the result of ``stage`` for each page in one transaction.
+        """
+        now = time.time()
+        rows = [
+            (page['input_hash'], stage, self.versions[stage], json.dumps(_encode(stage, page), ensure_ascii=False), now)
+            for page in pages
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def close(self):
+        """
+        Close the underlying SQLite connection.
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,178 @@
+# Import required libraries for asynchronous translation
+import asyncio
+import threading
+from manga_translator.config import DEEPL_MAX_TEXTS_PER_REQUEST
+from manga_translator.translation import TransientTranslationError, deepl_translate_url
+
+class HttpxDeepLBackend:
+    """
+    Async DeepL backend built on a pooled ``httpx.AsyncClient``.
+
+    Args:
+        api_key (str): DeepL authentication key
+        server_url (str): Base URL of the API; defaults to the free or pro endpoint based on the key
+        max_connections (int): Size of the connection pool
+        timeout (float): Timeout per request in seconds
+    """
+    backend_name = 'deepl'
+
+    def __init__(self, api_key, server_url=None, max_connections=8, timeout=30):
+        # httpx is only needed for the async backend, so import it on demand
+        import httpx
+        self._httpx = httpx
+        self.url = deepl_translate_url(api_key, server_url)
+        self._client = httpx.AsyncClient(
+            headers={'Authorization': f'DeepL-Auth-Key {api_key}'},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout
+        )
+
+    async def translate_texts(self, texts, source_lang, target_lang):
+        data = {'text': list(texts), 'source_lang': source_lang, 'target_lang': target_lang,
+                'preserve_formatting': '1'}
+        try:
+            response = await self._client.post(self.url, data=data)
+        except self._httpx.TransportError as e:
+            raise TransientTranslationError(f"DeepL request failed: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get('Retry-After')
+            raise TransientTranslationError(
+                f"DeepL returned HTTP {response.status_code}", status=response.status_code,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+        response.raise_for_status()
+        return [item['text'] for item in response.json()['translations']]
+
+    async def aclose(self):
+        await self._client.aclose()
+
+class FakeAsyncBackend:
+    """
+    Offline async backend for tests and runs without an API key.
+    Produces the same marker text as the placeholder translator and records every request.
+
+    Args:
+        delay (float): Simulated round-trip time in seconds
+    """
+    backend_name = 'placeholder'
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []
+
+    async def translate_texts(self, texts, source_lang, target_lang):
+        self.requests.append(list(texts))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return [f"[TRANSLATION: {text}]" for text in texts]
+
+    async def aclose(self):
+        pass
+
+class CoalescingTranslator:
+    """
+    Async translator that limits in-flight requests and coalesces identical sentences.
+    A sentence already being translated for one page is not sent again for another page;
+    the second caller awaits the same future.
+
+    Args:
+        backend: Async backend with ``translate_texts`` (e.g. HttpxDeepLBackend, FakeAsyncBackend)
+        max_in_flight (int): Maximum number of concurrent backend requests
+        max_texts_per_request (int): Maximum sentences per backend request
+    """
+    def __init__(self, backend, max_in_flight=4, max_texts_per_request=DEEPL_MAX_TEXTS_PER_REQUEST):
+        self.backend = backend
+        self.backend_name = backend.backend_name
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_texts_per_request = max(1, int(max_texts_per_request))
+        self.coalesced = 0
+        self._semaphore = None
+        self._in_flight = {}
+
+    async def _send(self, texts, source_lang, target_lang):
+        keys = [(text, source_lang, target_lang) for text in texts]
+        try:
+            async with self._semaphore:
+                translations = await self.backend.translate_texts(texts, source_lang, target_lang)
+            if len(translations) != len(texts):
+                # Never guess which sentence a translation belongs to; fail the whole request
+                raise ValueError(f"Backend returned {len(translations)} translations for {len(texts)} texts")
+            for key, translation in zip(keys, translations):
+                self._in_flight[key].set_result(translation)
+        except Exception as e:
+            for key in keys:
+                if not self._in_flight[key].done():
+                    self._in_flight[key].set_exception(e)
+        finally:
+            for key in keys:
+                self._in_flight.pop(key, None)
+
+    async def translate_texts(self, texts, source_lang, target_lang):
+        """
+        Translate a list of sentences.
+
+        Returns:
+            list: Raw translations in input order
+
+        Raises:
+            Exception: The first backend error affecting any of the sentences
+        """
+        # Create the semaphore inside the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        loop = asyncio.get_running_loop()
+        futures = []
+        new_texts = []
+        for text in texts:
+            key = (text, source_lang, target_lang)
+            future = self._in_flight.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._in_flight[key] = future
+                new_texts.append(text)
+            else:
+                self.coalesced += 1
+            futures.append(future)
+        for start in range(0, len(new_texts), self.max_texts_per_request):
+            chunk = new_texts[start:start + self.max_texts_per_request]
+            loop.create_task(self._send(chunk, source_lang, target_lang))
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+class BackgroundTranslator:
+    """
+    Synchronous transport facade over an async translator.
+    The async translator runs on a private event loop thread, so the pipeline's translation
+    worker threads can all submit to it and share its coalescing and concurrency limit.
+    It can be passed anywhere a transport is accepted, e.g. ``translate_batch``.
+
+    Args:
+        translator (CoalescingTranslator): The async translator to drive
+    """
+    def __init__(self, translator):
+        self.translator = translator
+        self.backend_name = translator.backend_name
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='translation-loop', daemon=True)
+        self._thread.start()
+
+    def translate_texts(self, texts, source_lang, target_lang):
+        future = asyncio.run_coroutine_threadsafe(
+            self.translator.translate_texts(list(texts), source_lang, target_lang), self._loop
+        )
+        return future.result()
+
+    def close(self):
+        """
+        Close the backend's connections and stop the event loop thread.
+        """
+        asyncio.run_coroutine_threadsafe(self.translator.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
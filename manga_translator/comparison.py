@@ -0,0 +1,100 @@
+# Import required libraries for side-by-side comparison images
+import os
+import re
+import queue
+import logging
+import threading
+import cv2
+import numpy as np
+
+def build_comparison(original, translated, scale=1.0, title_height=48):
+    """
+    Build a side-by-side comparison of the original and translated page with numpy/OpenCV.
+    The images are placed at source resolution (or downscaled by ``scale``) under a title bar.
+
+    Args:
+        original (numpy.ndarray): Original BGR page
+        translated (numpy.ndarray): Translated BGR page
+        scale (float): Downscale factor applied to both pages (1.0 keeps the source resolution)
+        title_height (int): Height of the title bar in pixels at scale 1.0
+
+    Returns:
+        numpy.ndarray: The comparison image (BGR)
+    """
+    if scale != 1.0:
+        size = (max(1, int(original.shape[1] * scale)), max(1, int(original.shape[0] * scale)))
+        original = cv2.resize(original, size, interpolation=cv2.INTER_AREA)
+        translated = cv2.resize(translated, size, interpolation=cv2.INTER_AREA)
+    height, width = original.shape[:2]
+    bar = max(16, int(title_height * scale))
+    gap = max(4, int(16 * scale))
+    canvas = np.full((height + bar, width * 2 + gap, 3), 255, dtype=np.uint8)
+    canvas[bar:, :width] = original
+    canvas[bar:, width + gap:] = translated
+    font_scale = bar / 48
+    thickness = max(1, int(round(2 * font_scale)))
+    for title, x0 in (("Original Image", 0), ("Translated Image", width + gap)):
+        (text_width, text_height), _ = cv2.getTextSize(title, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+        origin = (x0 + (width - text_width) // 2, (bar + text_height) // 2)
+        cv2.putText(canvas, title, origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), thickness, cv2.LINE_AA)
+    return canvas
+
+def comparison_file_name(name):
+    """
+    File name of the comparison image for a page, given its path relative to its folder or
+    archive (e.g. 'ch1/001.png'). Path separators become '__', so pages of different
+    chapter folders in one archive don't overwrite each other and nothing is written
+    outside the output directory.
+    """
+    safe_name = re.sub(r'[\\/]+', '__', name.strip('/\\'))
+    return f"comparison_{safe_name}.png"
+
+class ComparisonWriter:
+    """
+    Builds and encodes comparison images on a background thread so the page writer
+    never waits for PNG encoding. The queue is bounded, so at most ``max_pending``
+    page pairs are held in memory.
+
+    Args:
+        output_dir (str): Directory the comparison images are written to
+        scale (float): Downscale factor passed to ``build_comparison``
+        max_pending (int): Maximum number of queued page pairs
+    """
+    def __init__(self, output_dir, scale=1.0, max_pending=2):
+        self.output_dir = output_dir
+        self.scale = scale
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._thread = threading.Thread(target=self._run, name='comparison-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, page_path, original, translated, name=None):
+        """
+        Queue a comparison for the given page; blocks while the queue is full.
+
+        Args:
+            page_path (str): Path of the page, used in error messages
+            original (numpy.ndarray): Original BGR page
+            translated (numpy.ndarray): Translated BGR page
+            name (str): Path of the page inside its archive (defaults to the file name of page_path)
+        """
+        self._queue.put((page_path, original, translated, name or os.path.basename(page_path)))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            page_path, original, translated, name = item
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                output_path = os.path.join(self.output_dir, comparison_file_name(name))
+                cv2.imwrite(output_path, build_comparison(original, translated, self.scale))
+            except Exception as e:
+                logging.error(f"Failed to write comparison for {page_path}: {e}")
+
+    def close(self):
+        """
+        Wait for all queued comparisons to be written and stop the thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
@@ -6,4 +6,64 @@ RELEASE_DATE = '2025-05-12'
 IMAGE_DIR = 'images'
 MODEL_PATH = 'best.pt'
 FONT_PATH = 'font/CC Wild Words Roman.ttf'
-TRANSLATED_DIR = 'translated_images' 
\ No newline at end of file
+TRANSLATED_DIR = 'translated_images'
+MANIFEST_PATH = 'translated_images/manifest.json'
+NORMALIZED_CACHE_DIR = '.cache/normalized'  # Decodable copies of malformed input pages
+COMPARISON_SCALE = 1.0        # Downscale factor for optional side-by-side comparison images
+
+# Pipeline configurations
+PIPELINE_MODE = 'sequential'  # 'sequential', 'pipelined' or 'processes'
+PIPELINE_QUEUE_SIZE = 4       # Pages allowed to wait between two stages
+TRANSLATE_WORKERS = 2         # Threads for the network-bound translation stage
+PROCESS_WORKERS = 4           # Worker processes in 'processes' mode, each holding its own models
+
+# Detection configurations
+DETECTION_BATCH_SIZE = 4      # Pages per YOLO forward pass
+DETECTION_IMAGE_SIZE = 640    # Inference size pages are letterboxed to
+DETECTION_BACKEND = 'torch'   # 'torch' (ultralytics) or 'onnx' (exported model on onnxruntime)
+DETECTION_TILING = 'auto'     # 'auto' tiles tall strips and huge scans, 'always' every large page, 'off' never
+DETECTION_TILE_SIZE = 1024    # Tile edge in page pixels
+DETECTION_TILE_OVERLAP = 256  # Overlap between neighbouring tiles; should exceed the tallest bubble
+DETECTION_TILE_MAX_ASPECT = 2.5   # In 'auto' mode, pages longer than this times their width are tiled
+DETECTION_TILE_MAX_SIDE = 4096    # In 'auto' mode, pages with a longer side than this are tiled
+
+# OCR configurations
+OCR_MAX_BATCH_SIZE = 16       # Crops decoded in one manga-ocr forward pass
+OCR_MAX_LENGTH = 300          # Maximum tokens generated per crop (manga-ocr's own limit)
+OCR_BACKEND = 'torch'         # 'torch' (manga-ocr) or 'onnx' (exported encoder/decoder on onnxruntime)
+OCR_PREPROCESS_PROFILE = 'none'  # Crop preprocessing before OCR: 'none', 'fast' or 'quality'
+OCR_CACHE_PATH = '.cache/ocr.sqlite3'  # Perceptual-hash cache of OCR results
+OCR_CACHE_MAX_ENTRIES = 50000  # Cached crops kept before LRU eviction (a few KB each on disk)
+OCR_CACHE_MAX_DISTANCE = 10   # Bits two 256-bit crop hashes may differ by and still be compared pixel by pixel
+OCR_CACHE_SIZE_TOLERANCE = 2  # Pixels the width and height of matching crops may differ by
+OCR_CACHE_THUMBNAIL_SIZE = 192  # Longest side of the stored thumbnail hash matches are confirmed against
+OCR_CACHE_MAX_PIXEL_DIFF = 45   # Largest local grey-level difference from the thumbnail still counted as a match
+OCR_SCREENING_MARGIN = 0.9    # Crops below this share of the sharpness threshold get an exact check before OCR
+
+# Rendering configurations
+PAGE_BAND_HEIGHT = 2048       # Tall pages are screened before OCR and composited in bands of about this height
+
+# ONNX Runtime configurations
+ONNX_DIR = 'models/onnx'      # Where exported models are written and loaded from
+ONNX_QUANTIZED = False        # Use the INT8-quantized copies of the exported models
+ONNX_THREADS = 0              # Intra-op threads per session (0 uses every core)
+
+# Translation configurations
+SOURCE_LANG = 'JA'
+TARGET_LANG = 'EN-US'
+TRANSLATION_CACHE_PATH = '.cache/translations.sqlite3'
+ARTIFACT_STORE_PATH = '.cache/artifacts.sqlite3'  # Per-page detection, OCR and translation results
+TRANSLATION_CACHE_MEMORY_SIZE = 4096      # Entries kept in the in-memory LRU
+TRANSLATION_CACHE_MAX_ENTRIES = 200000    # Entries kept on disk before LRU eviction
+TRANSLATION_CACHE_TTL_DAYS = 90           # Cached translations older than this are refetched
+TRANSLATION_PAGE_WINDOW = 4               # Pages whose sentences are translated together
+DEEPL_MAX_TEXTS_PER_REQUEST = 50          # DeepL limit on texts per request
+DEEPL_MAX_REQUEST_BYTES = 128 * 1024      # DeepL limit on request body size
+TRANSLATION_MAX_IN_FLIGHT = 4             # Concurrent requests in async translation mode
+
+# Server configurations
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8080
+SERVER_MAX_BATCH_SIZE = 8                 # Pages from concurrent requests batched per stage call
+SERVER_MAX_WAIT_MS = 20                   # Longest a page waits for others to join its batch
+SERVER_MAX_UPLOAD_BYTES = 50 * 1024 * 1024
@@ -1,6 +1,11 @@
-# Import required libraries for YOLO model and image processing
-from ultralytics import YOLO
+# Import required libraries for image processing; ultralytics is imported when the model is loaded
 import cv2
+import numpy as np
+from manga_translator.config import (
+    DETECTION_TILING, DETECTION_TILE_SIZE, DETECTION_TILE_OVERLAP, DETECTION_TILE_MAX_ASPECT,
+    DETECTION_TILE_MAX_SIDE
+)
+from manga_translator.metrics import metrics
 
 def load_yolo_model(model_path):
     """
@@ -13,6 +18,7 @@ def load_yolo_model(model_path):
     Returns:
         YOLO: Initialized YOLO model ready for inference
     """
+    from ultralytics import YOLO
     return YOLO(model_path)
 
 def detect_text_regions(model, image_path):
@@ -29,6 +35,169 @@ def detect_text_regions(model, image_path):
     """
     return model(image_path)
 
+def detect_text_regions_batch(model, images, batch_size=4, imgsz=640):
+    """
+    Run YOLO inference on already-decoded pages, several pages per forward pass.
+    Passing arrays instead of paths avoids decoding every page a second time.
+    
+    Args:
+        model (YOLO): The loaded YOLO model, or an OnnxDetector
+        images (list): Decoded BGR pages as numpy arrays
+        batch_size (int): Maximum number of pages sent to the model at once
+        imgsz (int): Inference image size the pages are letterboxed to
+        
+    Returns:
+        list: One (boxes, classes) tuple per page, where boxes is an (N, 4) float array
+              of xyxy coordinates and classes is an (N,) int array of class ids
+    """
+    detections = []
+    for start in range(0, len(images), batch_size):
+        batch = list(images[start:start + batch_size])
+        with metrics.stage('detect.inference', batch=len(batch)):
+            results = model(batch, imgsz=imgsz, verbose=False)
+        for result in results:
+            if isinstance(result, tuple):
+                # ONNX detectors already return (boxes, classes) arrays
+                boxes, classes = result
+            else:
+                boxes = result.boxes.xyxy.cpu().numpy()
+                classes = result.boxes.cls.cpu().numpy().astype(int)
+            detections.append((boxes, classes))
+            metrics.count('detect.boxes', len(boxes))
+        metrics.count('detect.pages', len(batch))
+    return detections
+
+def needs_tiling(shape, tiling=DETECTION_TILING, tile_size=DETECTION_TILE_SIZE,
+                 max_aspect=DETECTION_TILE_MAX_ASPECT, max_side=DETECTION_TILE_MAX_SIDE):
+    """
+    Decide whether a page is detected in tiles instead of as a whole.
+    
+    Args:
+        shape (tuple): Page shape (height, width, ...)
+        tiling (str): 'auto' tiles tall strips and huge scans, 'always' any page larger than a tile, 'off' none
+        tile_size (int): Tile edge in page pixels
+        max_aspect (float): In 'auto' mode, pages whose long side exceeds this times the short side are tiled
+        max_side (int): In 'auto' mode, pages whose long side exceeds this are tiled
+        
+    Returns:
+        bool: True if the page should be tiled
+    """
+    long_side, short_side = max(shape[:2]), min(shape[:2])
+    if tiling == 'off' or long_side <= tile_size:
+        return False
+    if tiling == 'always':
+        return True
+    return long_side > max_side or long_side > max_aspect * short_side
+
+def tile_starts(length, tile_size, overlap):
+    """
+    Start offsets of overlapping tiles covering ``length`` pixels; the last tile is
+    aligned with the end, so every tile has the full size.
+    """
+    if length <= tile_size:
+        return [0]
+    stride = max(1, tile_size - overlap)
+    return list(range(0, length - tile_size, stride)) + [length - tile_size]
+
+def make_tiles(image, tile_size=DETECTION_TILE_SIZE, overlap=DETECTION_TILE_OVERLAP):
+    """
+    Slice a page into overlapping tiles. A tall strip no wider than a tile becomes a single
+    column of full-width tiles. Tiles are views into the page, so no pixels are copied.
+    
+    Returns:
+        list: (x offset, y offset, tile array) tuples
+    """
+    height, width = image.shape[:2]
+    return [
+        (x, y, image[y:y + tile_size, x:x + tile_size])
+        for y in tile_starts(height, tile_size, overlap)
+        for x in tile_starts(width, tile_size, overlap)
+    ]
+
+def merge_tile_boxes(boxes, classes, iou_threshold=0.5, containment_threshold=0.7):
+    """
+    Merge duplicate boxes found in overlapping tiles with class-aware NMS. Boxes are kept
+    largest first, and a box is dropped when it overlaps a kept box of the same class by
+    more than ``iou_threshold`` IoU, or when most of it lies inside that box. A bubble cut by
+    a tile edge is therefore replaced by the complete box from the neighbouring tile.
+    
+    Args:
+        boxes (numpy.ndarray): (N, 4) xyxy page coordinates
+        classes (numpy.ndarray): (N,) class ids
+        iou_threshold (float): IoU above which two boxes are duplicates
+        containment_threshold (float): Share of the smaller box inside the larger above which it is a duplicate
+        
+    Returns:
+        tuple: (boxes, classes) that were kept
+    """
+    if len(boxes) == 0:
+        return boxes, classes
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    for i in np.argsort(-areas, kind='stable'):
+        if keep:
+            kept = np.array(keep)
+            top_left = np.maximum(boxes[kept, :2], boxes[i, :2])
+            bottom_right = np.minimum(boxes[kept, 2:], boxes[i, 2:])
+            intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+            iou = intersection / np.maximum(areas[kept] + areas[i] - intersection, 1e-9)
+            contained = intersection / max(areas[i], 1e-9)
+            duplicate = (classes[kept] == classes[i]) & ((iou > iou_threshold) | (contained > containment_threshold))
+            if duplicate.any():
+                continue
+        keep.append(i)
+    keep = np.array(sorted(keep))
+    return boxes[keep], classes[keep]
+
+def detect_text_regions_tiled(model, images, batch_size=4, imgsz=640, tiling=DETECTION_TILING,
+                              tile_size=DETECTION_TILE_SIZE, overlap=DETECTION_TILE_OVERLAP):
+    """
+    Like ``detect_text_regions_batch``, but tall strips and huge scans are cut into
+    overlapping tiles first. All tiles and whole pages go through the detector together
+    in batches, boxes are shifted back to page coordinates, and duplicates along the tile
+    seams are merged. Every tile is letterboxed to ``imgsz`` like a normal page, so the cost
+    per tile does not depend on how long the strip is.
+    
+    Args:
+        model (YOLO): The loaded YOLO model, or an OnnxDetector
+        images (list): Decoded BGR pages as numpy arrays
+        batch_size (int): Maximum number of pages or tiles sent to the model at once
+        imgsz (int): Inference image size pages and tiles are letterboxed to
+        tiling (str): 'auto', 'always' or 'off' (see ``needs_tiling``)
+        tile_size (int): Tile edge in page pixels
+        overlap (int): Overlap between neighbouring tiles in pixels
+        
+    Returns:
+        list: One (boxes, classes) tuple per page, as from ``detect_text_regions_batch``
+    """
+    tiled = [needs_tiling(image.shape, tiling, tile_size) for image in images]
+    if not any(tiled):
+        return detect_text_regions_batch(model, images, batch_size=batch_size, imgsz=imgsz)
+
+    # Whole pages and tiles share batches; remember which page and offset each input belongs to
+    inputs, owners = [], []
+    for page_index, image in enumerate(images):
+        if tiled[page_index]:
+            tiles = make_tiles(image, tile_size, overlap)
+            inputs.extend(tile for _, _, tile in tiles)
+            owners.extend((page_index, x, y) for x, y, _ in tiles)
+            metrics.count('detect.tiles', len(tiles))
+        else:
+            inputs.append(image)
+            owners.append((page_index, 0, 0))
+    page_boxes = [[] for _ in images]
+    page_classes = [[] for _ in images]
+    for (page_index, x, y), (boxes, classes) in zip(owners, detect_text_regions_batch(model, inputs, batch_size, imgsz)):
+        page_boxes[page_index].append(boxes + np.array([x, y, x, y], dtype=np.float32))
+        page_classes[page_index].append(classes)
+
+    detections = []
+    for page_index in range(len(images)):
+        boxes = np.concatenate(page_boxes[page_index]).astype(np.float32).reshape(-1, 4)
+        classes = np.concatenate(page_classes[page_index]).astype(int)
+        detections.append(merge_tile_boxes(boxes, classes) if tiled[page_index] else (boxes, classes))
+    return detections
+
 def sort_bubbles(boxes):
     """
     Sorts text bubbles in reading order (top-to-bottom, right-to-left).
@@ -1,71 +1,192 @@
 # Import required libraries for image processing
+import io
 import os
+import hashlib
+import logging
+import threading
 import cv2
 import numpy as np
 from PIL import Image, ImageFile
+from manga_translator.config import PAGE_BAND_HEIGHT
+from manga_translator.metrics import metrics
 
 # Enable loading of truncated images to handle corrupted files
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
-def reload_and_save_images(folder_path):
+def _is_truncated(data):
     """
-    Reloads and resaves all images in a folder to ensure they are properly formatted.
-    This function helps prevent issues with corrupted or improperly formatted images.
+    Cheap structural check for files cut off mid-write: JPEGs must end with the EOI
+    marker and PNGs with the IEND chunk.
+    """
+    if data[:2] == b'\xff\xd8':
+        return not data.rstrip(b'\x00').endswith(b'\xff\xd9')
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return b'IEND' not in data[-16:]
+    return False
+
+def load_page(image_path, cache_dir=None):
+    """
+    Read and decode a page exactly once, replacing the old reload-and-resave pass.
+    Well-formed files are decoded directly from the bytes in memory. Truncated or otherwise
+    malformed files are decoded through PIL with ``LOAD_TRUNCATED_IMAGES`` tolerance, and a
+    normalized PNG copy is written to ``cache_dir``; the input file itself is never rewritten.
     
     Args:
-        folder_path (str): Path to the folder containing images to process
+        image_path (str): Path to the page image
+        cache_dir (str): Directory for normalized copies of malformed pages (None disables)
+        
+    Returns:
+        tuple: (BGR numpy.ndarray or None if undecodable, SHA-256 hex digest of the file bytes)
     """
-    # Process each image file in the specified folder
-    for filename in os.listdir(folder_path):
-        # Only process image files with common extensions
-        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-            path = os.path.join(folder_path, filename)
-            try:
-                # Open image and convert to RGB format
-                img = Image.open(path)
-                img = img.convert("RGB")
-                # Save the processed image back to the same location
-                img.save(path)
-            except Exception as e:
-                print(f"Skipping {filename}: {e}")
-
-def preprocess_image(image_path):
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    return decode_page_bytes(data, image_path, cache_dir)
+
+def decode_page_bytes(data, name, cache_dir=None):
     """
-    Preprocesses an image for better text detection and OCR.
-    Applies grayscale conversion, blur, and adaptive thresholding.
+    Decode page bytes that are already in memory (read from a file, an archive member or
+    an upload), with the same truncated-file fallback as ``load_page``.
     
     Args:
-        image_path (str): Path to the image file to preprocess
+        data (bytes): Encoded image
+        name (str): Name used in log messages
+        cache_dir (str): Directory for normalized copies of malformed pages (None disables)
         
     Returns:
-        numpy.ndarray: Preprocessed image ready for text detection
+        tuple: (BGR numpy.ndarray or None if undecodable, SHA-256 hex digest of the bytes)
     """
-    # Read image in grayscale mode
-    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    # Apply median blur to reduce noise
-    image = cv2.medianBlur(image, 3)
-    # Apply adaptive thresholding to enhance text regions
-    image = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-    return image
-
-def enhance_text_region(image_region):
+    input_hash = hashlib.sha256(data).hexdigest()
+    image = None
+    if not _is_truncated(data):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is not None:
+        return image, input_hash
+
+    # Fall back to PIL, which tolerates truncated data, and keep a normalized copy
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            image = cv2.cvtColor(np.array(img.convert("RGB")), cv2.COLOR_RGB2BGR)
+    except Exception as e:
+        logging.warning(f"Skipping {name}: {e}")
+        return None, input_hash
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        normalized_path = os.path.join(cache_dir, f"{input_hash}.png")
+        if not os.path.exists(normalized_path):
+            cv2.imwrite(normalized_path, image)
+            logging.info(f"Malformed page {name}; normalized copy written to {normalized_path}")
+    return image, input_hash
+
+def bands(spans, band_height=PAGE_BAND_HEIGHT):
     """
-    Enhance text clarity in an image region before OCR.
-    Applies multiple image processing techniques to improve text readability.
+    Group vertical spans (boxes' top and bottom) into horizontal bands at least
+    ``band_height`` tall, so work over a tall page can be done one band at a time. A band
+    only ends where the next span starts below every span already in it, so spans in
+    different bands never overlap.
+
+    Args:
+        spans (list): (y1, y2) pairs
+        band_height (int): Minimum height of a band before it may end
+
+    Returns:
+        list: Lists of indices into ``spans``, each in top-to-bottom order
+    """
+    order = sorted(range(len(spans)), key=lambda i: spans[i][0])
+    groups, current, top, bottom = [], [], 0, 0
+    for i in order:
+        y1, y2 = spans[i]
+        if current and y1 >= bottom and bottom - top >= band_height:
+            groups.append(current)
+            current = []
+        if not current:
+            top, bottom = y1, y2
+        current.append(i)
+        bottom = max(bottom, y2)
+    if current:
+        groups.append(current)
+    return groups
+
+def _to_gray(image, preprocessor):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+
+def _denoise(image, preprocessor):
+    return cv2.fastNlMeansDenoising(image, None, 10, 7, 21)
+
+def _equalize(image, preprocessor):
+    return preprocessor.clahe().apply(image)
+
+# Crop preprocessing operations: name -> (input operation, function); 'crop' is the raw BGR crop
+PREPROCESS_OPS = {
+    'gray': ('crop', _to_gray),
+    'denoise': ('gray', _denoise),
+    'clahe': ('gray', _equalize),
+    'denoise_clahe': ('denoise', _equalize),
+}
+
+# Preprocessing profiles: name -> operation whose output is sent to OCR
+PREPROCESS_PROFILES = {
+    'none': 'crop',             # Raw crop; the OCR engine converts it to grayscale itself
+    'fast': 'clahe',            # Grayscale and CLAHE contrast equalization
+    'quality': 'denoise_clahe', # Grayscale, non-local means denoising, then CLAHE
+}
+
+def preprocess_plan(output):
+    """
+    Resolve the operations needed to produce ``output``, in execution order.
+    Operations of the graph that do not feed ``output`` are left out.
     
     Args:
-        image_region (numpy.ndarray): The image region containing text
+        output (str): Name of an operation in PREPROCESS_OPS, or 'crop'
         
     Returns:
-        numpy.ndarray: Enhanced image region with improved text clarity
+        list: Operation names, inputs first
+    """
+    plan = []
+    while output != 'crop':
+        plan.append(output)
+        output = PREPROCESS_OPS[output][0]
+    return plan[::-1]
+
+class CropPreprocessor:
     """
-    # Convert to grayscale if the image is in color
-    gray = cv2.cvtColor(image_region, cv2.COLOR_BGR2GRAY) if len(image_region.shape) == 3 else image_region
-    # Apply adaptive thresholding to create binary image
-    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-    # Apply denoising to remove noise
-    denoised = cv2.fastNlMeansDenoising(binary, None, 10, 7, 21)
-    # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization) to enhance contrast
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    enhanced = clahe.apply(gray)
-    return enhanced 
\ No newline at end of file
+    Applies a named preprocessing profile to OCR crops.
+    Only the operations the profile's output depends on run, each one over the whole batch
+    of crops under its own ``ocr.preprocess.<op>`` metrics stage, so the cost of every
+    operation shows up in the exported metrics. The CLAHE object is created once per
+    thread instead of once per crop.
+    
+    Args:
+        profile (str): Name of a profile in PREPROCESS_PROFILES
+        
+    Raises:
+        ValueError: If the profile is unknown
+    """
+    def __init__(self, profile='none'):
+        if profile not in PREPROCESS_PROFILES:
+            raise ValueError(f"Unknown preprocessing profile '{profile}' (choose from {', '.join(PREPROCESS_PROFILES)})")
+        self.profile = profile
+        self.plan = preprocess_plan(PREPROCESS_PROFILES[profile])
+        # CLAHE objects keep internal buffers, so each thread gets its own
+        self._local = threading.local()
+
+    def clahe(self):
+        clahe = getattr(self._local, 'clahe', None)
+        if clahe is None:
+            clahe = self._local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        return clahe
+
+    def __call__(self, crops):
+        """
+        Preprocess a list of crops.
+        
+        Args:
+            crops (list): BGR numpy arrays
+            
+        Returns:
+            list: Preprocessed crops, in input order
+        """
+        for op in self.plan:
+            func = PREPROCESS_OPS[op][1]
+            with metrics.stage(f'ocr.preprocess.{op}', batch=len(crops)):
+                crops = [func(crop, self) for crop in crops]
+        return crops
@@ -0,0 +1,175 @@
+# Import required libraries for measured text layout
+import logging
+from functools import lru_cache
+from PIL import ImageFont
+
+# Smallest font size the layout engine will shrink text to
+MIN_FONT_SIZE = 8
+
+# Extra pixels between lines, matching PIL's multiline default
+LINE_SPACING = 4
+
+# Characters whose advance width is kept per (font path, size); later ones are measured each time
+MAX_CACHED_ADVANCES = 4096
+
+@lru_cache(maxsize=256)
+def get_font(font_path, size):
+    """
+    Load a TrueType font once per (path, size) and reuse it afterwards.
+    Falls back to PIL's default font if the file cannot be loaded.
+
+    Args:
+        font_path (str): Path to the .ttf file
+        size (int): Font size in pixels
+
+    Returns:
+        ImageFont.FreeTypeFont: The loaded font
+    """
+    try:
+        return ImageFont.truetype(font_path, size)
+    except IOError:
+        logging.warning(f"Font {font_path} not found, using default font")
+        return ImageFont.load_default()
+
+@lru_cache(maxsize=256)
+def _advances(font_path, size):
+    # Glyph advance widths for one font size, filled lazily as characters are seen; like the
+    # fonts, only the most recently used sizes are kept
+    return {}
+
+def text_width(text, font_path, size):
+    """
+    Measure the pixel width of a single line as the sum of cached glyph advances.
+    """
+    font = get_font(font_path, size)
+    advances = _advances(font_path, size)
+    width = 0.0
+    for char in text:
+        advance = advances.get(char)
+        if advance is None:
+            advance = font.getlength(char)
+            if len(advances) < MAX_CACHED_ADVANCES:
+                advances[char] = advance
+        width += advance
+    return width
+
+def line_height(font_path, size):
+    """
+    Height of one line of text (ascent plus descent) for the font at this size.
+    """
+    font = get_font(font_path, size)
+    if hasattr(font, 'getmetrics'):
+        ascent, descent = font.getmetrics()
+        return ascent + descent
+    return size
+
+def _split_word(word, font_path, size, max_width):
+    # Break a word wider than the box into hyphenated pieces that each fit
+    pieces = []
+    current = ''
+    for char in word:
+        if current and text_width(current + char + '-', font_path, size) > max_width:
+            pieces.append(current + '-')
+            current = char
+        else:
+            current += char
+    if current:
+        pieces.append(current)
+    return pieces
+
+def wrap_text(text, font_path, size, max_width):
+    """
+    Greedily wrap text into lines no wider than ``max_width`` pixels.
+    Words that are wider than the box on their own are split with hyphens.
+
+    Returns:
+        list: Wrapped lines
+    """
+    space = text_width(' ', font_path, size)
+    lines = []
+    current, current_width = '', 0.0
+    for word in text.split():
+        word_width = text_width(word, font_path, size)
+        if word_width > max_width:
+            pieces = _split_word(word, font_path, size, max_width)
+        else:
+            pieces = [word]
+        for piece in pieces:
+            piece_width = text_width(piece, font_path, size)
+            if current and current_width + space + piece_width <= max_width:
+                current += ' ' + piece
+                current_width += space + piece_width
+            else:
+                if current:
+                    lines.append(current)
+                current, current_width = piece, piece_width
+    if current:
+        lines.append(current)
+    return lines
+
+class TextLayout:
+    """
+    Result of fitting text into a box: the chosen size, the wrapped lines and the block size.
+    """
+    def __init__(self, font_path, size, lines):
+        self.font_path = font_path
+        self.size = size
+        self.lines = lines
+        self.font = get_font(font_path, size)
+        self.line_widths = [text_width(line, font_path, size) for line in lines]
+        self.line_height = line_height(font_path, size)
+        self.width = max(self.line_widths) if lines else 0
+        self.height = len(lines) * self.line_height + max(0, len(lines) - 1) * LINE_SPACING
+
+    def fits(self, max_width, max_height):
+        return self.width <= max_width and self.height <= max_height
+
+def fit_text(text, font_path, max_width, max_height, max_size, min_size=MIN_FONT_SIZE):
+    """
+    Binary-search the largest font size whose wrapped text block fits the box.
+    Wrapping uses measured glyph widths, so the block that fits is exactly the block drawn.
+
+    Args:
+        text (str): Text to lay out
+        font_path (str): Path to the .ttf file
+        max_width (int): Available width in pixels
+        max_height (int): Available height in pixels
+        max_size (int): Largest font size to consider
+        min_size (int): Smallest font size to consider; used even if it still overflows
+
+    Returns:
+        TextLayout: Layout at the chosen size
+    """
+    max_size = max(min_size, int(max_size))
+    best = None
+    low, high = min_size, max_size
+    while low <= high:
+        size = (low + high) // 2
+        layout = TextLayout(font_path, size, wrap_text(text, font_path, size, max_width))
+        if layout.fits(max_width, max_height):
+            best = layout
+            low = size + 1
+        else:
+            high = size - 1
+    if best is None:
+        best = TextLayout(font_path, min_size, wrap_text(text, font_path, min_size, max_width))
+    return best
+
+def draw_layout(draw, layout, box_width, box_height, offset=(0, 0), fill=(0, 0, 0)):
+    """
+    Draw a TextLayout centered inside a box, one centered line at a time.
+
+    Args:
+        draw (ImageDraw.ImageDraw): Target drawing context
+        layout (TextLayout): Layout returned by ``fit_text``
+        box_width (int): Width of the box the text is centered in
+        box_height (int): Height of the box the text is centered in
+        offset (tuple): Top-left corner of the box on the drawing surface
+        fill: Text color
+    """
+    x0, y0 = offset
+    y = y0 + (box_height - layout.height) // 2
+    for line, width in zip(layout.lines, layout.line_widths):
+        x = x0 + int((box_width - width) // 2)
+        draw.text((x, y), line, font=layout.font, fill=fill)
+        y += layout.line_height + LINE_SPACING
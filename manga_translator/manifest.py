@@ -0,0 +1,112 @@
+# Import required libraries for incremental processing
+import os
+import json
+import hashlib
+import threading
+from manga_translator.config import VERSION
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Compute the SHA-256 digest of a file without loading it into memory at once.
+
+    Args:
+        path (str): Path of the file to hash
+
+    Returns:
+        str: Hex digest, or '' if the file does not exist
+    """
+    if not os.path.exists(path):
+        return ''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def code_version():
+    """
+    Identify the code that produces outputs: the release version plus a digest of the package sources.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256(VERSION.encode('utf-8'))
+    for filename in sorted(os.listdir(package_dir)):
+        if filename.endswith('.py'):
+            digest.update(filename.encode('utf-8'))
+            digest.update(file_digest(os.path.join(package_dir, filename)).encode('ascii'))
+    return f"{VERSION}+{digest.hexdigest()[:12]}"
+
+def run_fingerprint(model_path, font_path, settings):
+    """
+    Fingerprint everything besides the page itself that affects a translated page.
+
+    Args:
+        model_path (str): Path of the detection model weights
+        font_path (str): Path of the overlay font
+        settings (dict): JSON-serializable settings that influence the output
+
+    Returns:
+        str: Hex digest combining model weights, font, settings and code version
+    """
+    parts = {
+        'model': file_digest(model_path),
+        'font': file_digest(font_path),
+        'settings': settings,
+        'code': code_version(),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+class RunManifest:
+    """
+    JSON manifest recording, per input page, the content hash and run fingerprint it was
+    last translated with and where the output went. It is rewritten after every finished
+    page, so an interrupted run resumes with the pages it had not finished yet.
+
+    Args:
+        path (str): Location of the manifest file
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f).get('pages', {})
+
+    def is_up_to_date(self, page_path, fingerprint):
+        """
+        Check whether a page was already translated from the same input with the same fingerprint
+        and its output still exists. The file is only hashed when its size or modification
+        time differ from the recorded ones, so unchanged pages are not read at all.
+        """
+        entry = self.entries.get(os.path.basename(page_path))
+        if entry is None or entry['fingerprint'] != fingerprint or not os.path.exists(entry['output_path']):
+            return False
+        stat = os.stat(page_path)
+        if stat.st_size == entry.get('size') and stat.st_mtime_ns == entry.get('mtime_ns'):
+            return True
+        return file_digest(page_path) == entry['input_hash']
+
+    def record(self, page_path, input_hash, fingerprint, output_path):
+        """
+        Record a finished page and persist the manifest.
+        """
+        stat = os.stat(page_path)
+        with self._lock:
+            self.entries[os.path.basename(page_path)] = {
+                'input_hash': input_hash,
+                'fingerprint': fingerprint,
+                'output_path': output_path,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+            }
+            self._save()
+
+    def _save(self):
+        # Write to a temporary file first so a crash never leaves a truncated manifest behind
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pages': self.entries}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,213 @@
+# Import required libraries for pipeline instrumentation
+import os
+import json
+import time
+import threading
+from collections import defaultdict
+
+# Upper bound on recorded trace events so very long runs cannot grow memory without limit
+MAX_TRACE_EVENTS = 200000
+
+class _NullSpan:
+    """
+    Context manager used when instrumentation is disabled; entering and leaving it does nothing.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    """
+    Times one stage invocation and reports it to its Metrics object on exit.
+    """
+    def __init__(self, metrics, name, pages, args):
+        self.metrics = metrics
+        self.name = name
+        self.pages = pages
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics._record(self.name, self.start, time.perf_counter(), self.pages, self.args)
+        return False
+
+class Metrics:
+    """
+    Collects wall time per stage, item counters and per-page totals for a translation run,
+    and exports them as a JSON summary, a Prometheus text file and a Chrome trace.
+    When disabled, ``stage`` returns a shared no-op context manager and ``count`` returns
+    immediately, so instrumented code pays almost nothing.
+
+    Args:
+        enabled (bool): Whether to record anything
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Drop everything recorded so far.
+        """
+        with self._lock:
+            self._origin = time.perf_counter()
+            self.stage_seconds = defaultdict(float)
+            self.stage_calls = defaultdict(int)
+            self.counters = defaultdict(float)
+            self.page_seconds = defaultdict(lambda: defaultdict(float))
+            self.events = []
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name, pages=None, **args):
+        """
+        Time a block of work as stage ``name``.
+
+        Args:
+            name (str): Stage name, e.g. 'detect' or 'ocr.generate'
+            pages (list): Page labels the work belongs to; the time is split evenly between them
+            **args: Extra values shown on the trace event
+
+        Returns:
+            A context manager
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, pages, args)
+
+    def count(self, name, value=1):
+        """
+        Add ``value`` to counter ``name`` (boxes, crops, sentences, characters sent, cache hits, ...).
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += value
+
+    def _record(self, name, start, end, pages, args):
+        duration = end - start
+        with self._lock:
+            self.stage_seconds[name] += duration
+            self.stage_calls[name] += 1
+            if pages:
+                share = duration / len(pages)
+                for page in pages:
+                    self.page_seconds[page][name] += share
+            if len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append({
+                    'name': name,
+                    'cat': name.split('.')[0],
+                    'ph': 'X',
+                    'ts': (start - self._origin) * 1e6,
+                    'dur': duration * 1e6,
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                    'args': dict(args, pages=pages) if pages else args,
+                })
+
+    def summary(self):
+        """
+        Build a JSON-serializable summary of the run.
+
+        Returns:
+            dict: Per-stage seconds and calls, counters and per-page totals
+        """
+        with self._lock:
+            return {
+                'stages': {
+                    name: {'seconds': self.stage_seconds[name], 'calls': self.stage_calls[name]}
+                    for name in sorted(self.stage_seconds)
+                },
+                'counters': dict(sorted(self.counters.items())),
+                'pages': {
+                    page: dict(stages, total=sum(stages.values()))
+                    for page, stages in sorted(self.page_seconds.items())
+                },
+            }
+
+    def merge(self, summary):
+        """
+        Add a summary recorded by another process (the output of its ``summary``) to this one.
+        Trace events are not part of a summary, so only the totals are merged.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, stage in summary['stages'].items():
+                self.stage_seconds[name] += stage['seconds']
+                self.stage_calls[name] += stage['calls']
+            for name, value in summary['counters'].items():
+                self.counters[name] += value
+            for page, stages in summary['pages'].items():
+                for name, seconds in stages.items():
+                    if name != 'total':
+                        self.page_seconds[page][name] += seconds
+
+    def export_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+    def prometheus_text(self, prefix='mangaflow'):
+        """
+        Render the stage timings and counters in the Prometheus text exposition format.
+        """
+        summary = self.summary()
+        lines = [
+            f'# HELP {prefix}_stage_seconds_total Wall time spent per stage.',
+            f'# TYPE {prefix}_stage_seconds_total counter',
+        ]
+        for name, stage in summary['stages'].items():
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{name}"}} {stage["seconds"]:.6f}')
+        lines += [
+            f'# HELP {prefix}_stage_calls_total Number of stage invocations.',
+            f'# TYPE {prefix}_stage_calls_total counter',
+        ]
+        for name, stage in summary['stages'].items():
+            lines.append(f'{prefix}_stage_calls_total{{stage="{name}"}} {stage["calls"]}')
+        lines += [
+            f'# HELP {prefix}_items_total Items processed, by counter.',
+            f'# TYPE {prefix}_items_total counter',
+        ]
+        for name, value in summary['counters'].items():
+            lines.append(f'{prefix}_items_total{{counter="{name}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def export_prometheus(self, path, prefix='mangaflow'):
+        """
+        Write ``prometheus_text`` to a file.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text(prefix))
+
+    def export_chrome_trace(self, path):
+        """
+        Write recorded spans as Chrome trace events, viewable in chrome://tracing or Perfetto.
+        """
+        with self._lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def export_all(self, directory):
+        """
+        Write metrics.json, metrics.prom and trace.json into ``directory``.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.export_json(os.path.join(directory, 'metrics.json'))
+        self.export_prometheus(os.path.join(directory, 'metrics.prom'))
+        self.export_chrome_trace(os.path.join(directory, 'trace.json'))
+
+# Process-wide instance used by the instrumented modules; disabled until a run enables it
+metrics = Metrics()
@@ -0,0 +1,145 @@
+# Import required libraries for lazy model management
+import time
+import logging
+import threading
+import numpy as np
+from manga_translator.config import (
+    MODEL_PATH, OCR_MAX_BATCH_SIZE, TRANSLATION_MAX_IN_FLIGHT, DETECTION_BACKEND, OCR_BACKEND,
+    ONNX_DIR, ONNX_QUANTIZED, ONNX_THREADS
+)
+from manga_translator.detection import load_yolo_model, detect_text_regions_batch
+from manga_translator.ocr import OcrEngine, load_manga_ocr
+from manga_translator.translation import get_translator_deepl, translator_backend_name, DeepLHttpTransport
+
+def make_translator(api_key, server_url=None, async_translation=False, max_in_flight=TRANSLATION_MAX_IN_FLIGHT):
+    """
+    Create the translator selected by the run options.
+
+    Args:
+        api_key (str): DeepL API key, or None for the placeholder translator
+        server_url (str): Alternative DeepL-compatible endpoint (e.g. a local stub server)
+        async_translation (bool): Use the coalescing async client instead of a synchronous one
+        max_in_flight (int): Concurrent requests in async mode
+
+    Returns:
+        A translator or transport accepted by ``translate_batch``
+    """
+    if async_translation:
+        from manga_translator.async_translation import (
+            HttpxDeepLBackend, FakeAsyncBackend, CoalescingTranslator, BackgroundTranslator
+        )
+        if api_key:
+            backend = HttpxDeepLBackend(api_key, server_url, max_connections=max_in_flight)
+        else:
+            logging.warning("No DeepL API key provided. Using placeholder translator.")
+            backend = FakeAsyncBackend()
+        return BackgroundTranslator(CoalescingTranslator(backend, max_in_flight=max_in_flight))
+    if api_key and server_url:
+        # Talk to the REST API directly, e.g. a local stub server during testing
+        return DeepLHttpTransport(api_key, server_url)
+    return get_translator_deepl(api_key)
+
+class LazyModels:
+    """
+    Holds the detector, OCR engine and translator, loading each one on first use and
+    reusing it afterwards. Runs where every page is up to date never load the detector or
+    the OCR model; only the translator client is created, to name its backend in the run
+    fingerprint. Load times are recorded for the startup report.
+
+    Args:
+        model_path (str): Path to the YOLO weights
+        ocr_batch_size (int): Maximum crops per OCR forward pass
+        api_key (str): DeepL API key, or None for the placeholder translator
+        server_url (str): Alternative DeepL-compatible endpoint
+        async_translation (bool): Use the coalescing async translator
+        max_in_flight (int): Concurrent requests in async mode
+        detection_backend (str): 'torch' for ultralytics, 'onnx' for the exported detector
+        ocr_backend (str): 'torch' for manga-ocr, 'onnx' for the exported encoder/decoder
+        onnx_dir (str): Directory holding the exported ONNX models
+        onnx_quantized (bool): Load the INT8-quantized ONNX models
+        onnx_threads (int): Intra-op threads per ONNX session (0 uses every core)
+    """
+    def __init__(self, model_path=MODEL_PATH, ocr_batch_size=OCR_MAX_BATCH_SIZE, api_key=None, server_url=None,
+                 async_translation=False, max_in_flight=TRANSLATION_MAX_IN_FLIGHT,
+                 detection_backend=DETECTION_BACKEND, ocr_backend=OCR_BACKEND, onnx_dir=ONNX_DIR,
+                 onnx_quantized=ONNX_QUANTIZED, onnx_threads=ONNX_THREADS):
+        self.model_path = model_path
+        self.ocr_batch_size = ocr_batch_size
+        self.api_key = api_key
+        self.server_url = server_url
+        self.async_translation = async_translation
+        self.max_in_flight = max_in_flight
+        self.detection_backend = detection_backend
+        self.ocr_backend = ocr_backend
+        self.onnx_dir = onnx_dir
+        self.onnx_quantized = onnx_quantized
+        self.onnx_threads = onnx_threads
+        self.load_times = {}
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name, loader):
+        # Double-checked so concurrent stage workers load a model only once
+        model = self._loaded.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._loaded:
+                start = time.perf_counter()
+                self._loaded[name] = loader()
+                self.load_times[name] = time.perf_counter() - start
+                logging.info(f"Loaded {name} in {self.load_times[name]:.2f}s")
+            return self._loaded[name]
+
+    def _load_detector(self):
+        if self.detection_backend == 'onnx':
+            from manga_translator.onnx_models import load_onnx_detector
+            return load_onnx_detector(self.onnx_dir, self.onnx_quantized, self.onnx_threads)
+        return load_yolo_model(self.model_path)
+
+    def _load_ocr_engine(self):
+        if self.ocr_backend == 'onnx':
+            from manga_translator.onnx_models import load_onnx_ocr
+            return load_onnx_ocr(self.onnx_dir, self.onnx_quantized, self.onnx_threads, self.ocr_batch_size)
+        return OcrEngine(load_manga_ocr(), max_batch_size=self.ocr_batch_size)
+
+    @property
+    def detector(self):
+        return self._get('detector', self._load_detector)
+
+    @property
+    def ocr_engine(self):
+        return self._get('ocr', self._load_ocr_engine)
+
+    @property
+    def translator(self):
+        return self._get('translator', lambda: make_translator(
+            self.api_key, self.server_url, self.async_translation, self.max_in_flight
+        ))
+
+    @property
+    def translator_backend(self):
+        """
+        Backend name of the translator actually in use, loading it if needed. A DeepL key whose
+        client failed to initialise reports the placeholder translator it fell back to, so its
+        output is never cached or fingerprinted as DeepL's.
+        """
+        return translator_backend_name(self.translator)
+
+    def warm_up(self):
+        """
+        Load every model up front and run one tiny inference through the detector and OCR,
+        so the first real page does not pay for lazy initialization.
+        """
+        blank = np.full((64, 64, 3), 255, dtype=np.uint8)
+        detect_text_regions_batch(self.detector, [blank], batch_size=1)
+        self.ocr_engine([blank])
+        self.translator
+
+    def close(self):
+        """
+        Release resources held by loaded models (e.g. the async translator's event loop).
+        """
+        translator = self._loaded.get('translator')
+        if translator is not None and hasattr(translator, 'close'):
+            translator.close()
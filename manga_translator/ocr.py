@@ -2,7 +2,13 @@
 import re
 import cv2
 import numpy as np
-from manga_ocr import MangaOcr
+from manga_translator.config import OCR_MAX_LENGTH
+from manga_translator.metrics import metrics
+
+# Image checks shared by validate_ocr_result and the pre-OCR screening
+MIN_LAPLACIAN_VARIANCE = 50   # Lower variance indicates a blurry region
+MIN_CONTRAST = 30             # Lower contrast may indicate poor text visibility
+MIN_TEXT_DENSITY = 0.05       # A lower share of dark pixels may indicate no text
 
 def validate_ocr_result(text, image_region):
     """
@@ -29,18 +35,18 @@ def validate_ocr_result(text, image_region):
     
     # Check image sharpness using Laplacian variance
     laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-    if laplacian_var < 50:  # Low variance indicates blurry image
+    if laplacian_var < MIN_LAPLACIAN_VARIANCE:  # Low variance indicates blurry image
         return False
     
     # Check image contrast
     min_val, max_val, _, _ = cv2.minMaxLoc(gray)
     contrast = max_val - min_val
-    if contrast < 30:  # Low contrast may indicate poor text visibility
+    if contrast < MIN_CONTRAST:  # Low contrast may indicate poor text visibility
         return False
     
     # Check text density (ratio of dark pixels)
     text_density = np.count_nonzero(gray < 128) / gray.size
-    if text_density < 0.05:  # Too few dark pixels may indicate no text
+    if text_density < MIN_TEXT_DENSITY:  # Too few dark pixels may indicate no text
         return False
     
     return True
@@ -72,5 +78,60 @@ def verify_japanese_text(text):
     
     return True
 
-# Initialize the Manga OCR model
-mocr = MangaOcr() 
\ No newline at end of file
+class OcrEngine:
+    """
+    Batched wrapper around a MangaOcr instance.
+    Instead of one encoder/decoder pass per crop, crops are preprocessed together into a
+    single tensor batch and decoded with one ``generate`` call per batch.
+    
+    Args:
+        mocr (MangaOcr): The loaded Manga OCR model
+        max_batch_size (int): Maximum number of crops decoded in one forward pass
+    """
+    def __init__(self, mocr, max_batch_size=16):
+        from manga_ocr.ocr import post_process
+        self.mocr = mocr
+        self.max_batch_size = max(1, int(max_batch_size))
+        self._post_process = post_process
+
+    def _prepare(self, crop):
+        # Match MangaOcr's own preprocessing: grayscale, then back to 3 channels
+        if isinstance(crop, np.ndarray):
+            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if len(crop.shape) == 3 else crop
+            return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
+        return np.array(crop.convert('L').convert('RGB'))
+
+    def __call__(self, crops):
+        """
+        Run OCR on a list of crops.
+        
+        Args:
+            crops (list): BGR numpy arrays or PIL images
+            
+        Returns:
+            list: Recognized text for each crop, in input order
+        """
+        texts = []
+        for start in range(0, len(crops), self.max_batch_size):
+            # The model's own input processing, kept apart from the ocr.preprocess.<op> crop stages
+            with metrics.stage('ocr.processor'):
+                batch = [self._prepare(crop) for crop in crops[start:start + self.max_batch_size]]
+                pixel_values = self.mocr.processor(batch, return_tensors="pt").pixel_values
+            with metrics.stage('ocr.generate', batch=len(batch)):
+                generated = self.mocr.model.generate(pixel_values.to(self.mocr.model.device), max_length=OCR_MAX_LENGTH).cpu()
+            decoded = self.mocr.tokenizer.batch_decode(generated, skip_special_tokens=True)
+            texts.extend(self._post_process(text) for text in decoded)
+            metrics.count('ocr.crops', len(batch))
+        return texts
+
+def load_manga_ocr():
+    """
+    Load the Manga OCR model. manga_ocr (and with it torch and transformers) is only
+    imported here, so importing this module stays cheap.
+    
+    Returns:
+        MangaOcr: Initialized Manga OCR model
+    """
+    from manga_ocr import MangaOcr
+    return MangaOcr()
+ 
\ No newline at end of file
@@ -0,0 +1,305 @@
+# Import required libraries for the perceptual-hash OCR cache
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from manga_translator.config import (
+    OCR_CACHE_MAX_ENTRIES, OCR_CACHE_MAX_DISTANCE, OCR_CACHE_SIZE_TOLERANCE, OCR_CACHE_THUMBNAIL_SIZE,
+    OCR_CACHE_MAX_PIXEL_DIFF
+)
+from manga_translator.metrics import metrics
+
+def _gray(crop):
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if len(crop.shape) == 3 else crop
+
+def perceptual_hash(crop, hash_size=16):
+    """
+    pHash of a crop: the signs of the lowest ``hash_size`` x ``hash_size`` DCT frequencies
+    of the grayscale crop scaled to a fixed size, relative to their median. Recompression
+    and small brightness changes flip only a few bits. Crops that differ in one character
+    can flip just as few, so a hash match alone does not prove two crops read the same.
+
+    Args:
+        crop (numpy.ndarray): BGR or grayscale crop
+        hash_size (int): Side of the frequency block; the hash has hash_size² bits
+
+    Returns:
+        int: The hash
+    """
+    small = cv2.resize(_gray(crop), (hash_size * 4, hash_size * 4), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size]
+    return int.from_bytes(np.packbits(low > np.median(low)).tobytes(), 'big')
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+def thumbnail(crop, size=OCR_CACHE_THUMBNAIL_SIZE):
+    """
+    Grayscale copy of a crop scaled down (never up) so its longest side is at most ``size``.
+    """
+    gray = _gray(crop)
+    height, width = gray.shape[:2]
+    scale = min(1.0, size / max(height, width))
+    if scale == 1.0:
+        return np.ascontiguousarray(gray)
+    return cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+def pixel_difference(stored, crop):
+    """
+    Largest local grey-level difference between a stored thumbnail and a crop scaled to the
+    same size. The median difference is subtracted first, so an overall brightness shift
+    does not count, and the difference is averaged over 3x3 pixels, so compression noise
+    stays low while a changed character stands out as a block of large differences.
+
+    Args:
+        stored (numpy.ndarray): Thumbnail built with ``thumbnail``
+        crop (numpy.ndarray): BGR or grayscale crop to compare
+
+    Returns:
+        float: The difference (0 for identical crops)
+    """
+    resized = cv2.resize(_gray(crop), (stored.shape[1], stored.shape[0]), interpolation=cv2.INTER_AREA)
+    diff = cv2.absdiff(stored, resized).astype(np.float32)
+    diff -= np.median(diff)
+    return float(cv2.blur(diff, (3, 3)).max())
+
+class OcrCache:
+    """
+    Cache of OCR results keyed by the perceptual hash and size of the crop, so recurring
+    sound effects, title cards and repeated bubbles are read once per series instead of
+    once per page.
+
+    A lookup first finds stored crops of about the same size within ``max_distance`` bits
+    of the crop's hash, then confirms the closest ones against their stored thumbnails with
+    ``pixel_difference``; only a crop that passes both counts as a hit. The hash alone is not
+    enough: bubbles differing in one character can be within a few bits of each other.
+
+    Near hashes are found with multi-index hashing: the hash is split into
+    ``max_distance + 1`` chunks, and any hash within ``max_distance`` bits shares at least
+    one chunk exactly, so only entries sharing a chunk are compared. Keys and texts live in
+    an in-memory LRU bounded by ``max_entries``; thumbnails are only kept in the SQLite
+    file and read when a hash matches. Entries are kept per ``namespace``, which should
+    name everything that changes the OCR output (backend, model, preprocessing).
+
+    Args:
+        db_path (str): Path of the SQLite database file, or ':memory:'
+        namespace (str): OCR configuration the entries belong to
+        max_entries (int): Maximum number of entries kept; least recently used go first
+        max_distance (int): Largest Hamming distance between hashes whose crops are compared
+        size_tolerance (int): Largest difference in pixels of width and height between matching crops
+        hash_size (int): Side of the pHash frequency block
+        thumbnail_size (int): Longest side of the stored thumbnails
+        max_pixel_diff (float): Largest ``pixel_difference`` still accepted as the same crop
+    """
+    def __init__(self, db_path, namespace='', max_entries=OCR_CACHE_MAX_ENTRIES, max_distance=OCR_CACHE_MAX_DISTANCE,
+                 size_tolerance=OCR_CACHE_SIZE_TOLERANCE, hash_size=16, thumbnail_size=OCR_CACHE_THUMBNAIL_SIZE,
+                 max_pixel_diff=OCR_CACHE_MAX_PIXEL_DIFF):
+        self.db_path = db_path
+        self.namespace = namespace
+        self.max_entries = max(1, int(max_entries))
+        self.max_distance = max(0, int(max_distance))
+        self.size_tolerance = size_tolerance
+        self.hash_size = hash_size
+        self.thumbnail_size = thumbnail_size
+        self.max_pixel_diff = max_pixel_diff
+        chunk_count = self.max_distance + 1
+        self._chunk_bits = -(-hash_size * hash_size // chunk_count)
+        self._index = [{} for _ in range(chunk_count)]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.evictions = 0
+        if db_path != ':memory:' and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(ocr_cache)")]
+        if columns and 'thumbnail' not in columns:
+            # Entries written before thumbnails were stored cannot be confirmed
+            logging.info(f"Discarding OCR cache entries without thumbnails in {db_path}")
+            self._conn.execute("DROP TABLE ocr_cache")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ocr_cache (
+                   namespace TEXT NOT NULL,
+                   hash TEXT NOT NULL,
+                   width INTEGER NOT NULL,
+                   height INTEGER NOT NULL,
+                   text TEXT NOT NULL,
+                   thumbnail BLOB NOT NULL,
+                   last_used REAL NOT NULL,
+                   PRIMARY KEY (namespace, hash, width, height)
+               )"""
+        )
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        # Keep the most recently used entries, oldest first so the LRU order carries over
+        rows = self._conn.execute(
+            "SELECT hash, width, height, text FROM ocr_cache WHERE namespace = ? ORDER BY last_used DESC LIMIT ?",
+            (self.namespace, self.max_entries)
+        ).fetchall()
+        for hash_hex, width, height, text in reversed(rows):
+            self._add((int(hash_hex, 16), width, height), text)
+        self._conn.execute(
+            "DELETE FROM ocr_cache WHERE namespace = ? AND rowid NOT IN "
+            "(SELECT rowid FROM ocr_cache WHERE namespace = ? ORDER BY last_used DESC LIMIT ?)",
+            (self.namespace, self.namespace, self.max_entries)
+        )
+        self._conn.commit()
+        if rows:
+            logging.info(f"Loaded {len(rows)} cached OCR results from {self.db_path}")
+
+    def _row_key(self, key):
+        return (self.namespace, f'{key[0]:x}', key[1], key[2])
+
+    def _chunks(self, value):
+        mask = (1 << self._chunk_bits) - 1
+        return [(value >> (i * self._chunk_bits)) & mask for i in range(len(self._index))]
+
+    def _add(self, key, text):
+        # Caller must hold the lock (or be the constructor)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self._entries[key] = text
+            return
+        self._entries[key] = text
+        for table, chunk in zip(self._index, self._chunks(key[0])):
+            table.setdefault(chunk, set()).add(key)
+
+    def _remove(self, key):
+        # Caller must hold the lock
+        del self._entries[key]
+        for table, chunk in zip(self._index, self._chunks(key[0])):
+            bucket = table[chunk]
+            bucket.discard(key)
+            if not bucket:
+                del table[chunk]
+
+    def _candidates(self, key):
+        # Caller must hold the lock; stored keys of about the same size within max_distance bits, closest first
+        value, width, height = key
+        candidates = set()
+        for table, chunk in zip(self._index, self._chunks(value)):
+            candidates.update(table.get(chunk, ()))
+        matches = []
+        for candidate in candidates:
+            if abs(candidate[1] - width) > self.size_tolerance or abs(candidate[2] - height) > self.size_tolerance:
+                continue
+            distance = hamming_distance(candidate[0], value)
+            if distance <= self.max_distance:
+                matches.append((distance, candidate))
+        return [candidate for _, candidate in sorted(matches)]
+
+    def _confirm(self, candidate, crop):
+        # Caller must hold the lock; compare the crop with the candidate's stored thumbnail
+        row = self._conn.execute(
+            "SELECT thumbnail FROM ocr_cache WHERE namespace = ? AND hash = ? AND width = ? AND height = ?",
+            self._row_key(candidate)
+        ).fetchone()
+        if row is None:
+            return False
+        stored = cv2.imdecode(np.frombuffer(row[0], dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        return stored is not None and pixel_difference(stored, crop) <= self.max_pixel_diff
+
+    def recognize(self, crops, ocr_engine):
+        """
+        OCR a list of crops, answering from the cache where possible and sending only the
+        misses to ``ocr_engine`` (in one call). The new results are stored.
+
+        Args:
+            crops (list): Crops as the OCR engine takes them
+            ocr_engine (callable): Takes a list of crops and returns their texts
+
+        Returns:
+            tuple: (list of texts in input order, list of booleans marking cache hits)
+        """
+        with metrics.stage('ocr.cache_lookup'):
+            keys = [(perceptual_hash(crop, self.hash_size), crop.shape[1], crop.shape[0]) for crop in crops]
+            texts, touched, rejected = [], [], 0
+            with self._lock:
+                for key, crop in zip(keys, crops):
+                    match = None
+                    for candidate in self._candidates(key):
+                        if self._confirm(candidate, crop):
+                            match = candidate
+                            break
+                        rejected += 1
+                    if match is None:
+                        texts.append(None)
+                        continue
+                    self._entries.move_to_end(match)
+                    texts.append(self._entries[match])
+                    touched.append(match)
+        hits = [text is not None for text in texts]
+        missing = [i for i, hit in enumerate(hits) if not hit]
+        if missing:
+            for i, text in zip(missing, ocr_engine([crops[i] for i in missing])):
+                texts[i] = text
+        self._store([(keys[i], texts[i], crops[i]) for i in missing], touched)
+        with self._lock:
+            self.hits += len(crops) - len(missing)
+            self.misses += len(missing)
+            self.rejected += rejected
+        metrics.count('ocr_cache.hits', len(crops) - len(missing))
+        metrics.count('ocr_cache.misses', len(missing))
+        metrics.count('ocr_cache.rejected', rejected)
+        return texts, hits
+
+    def _store(self, results, touched):
+        # Add new results, evict past max_entries and persist everything in one transaction
+        now = time.time()
+        rows = []
+        for key, text, crop in results:
+            ok, encoded = cv2.imencode('.png', thumbnail(crop, self.thumbnail_size))
+            if ok:
+                rows.append(self._row_key(key) + (text, encoded.tobytes(), now))
+        with self._lock:
+            for key, text, _ in results:
+                self._add(key, text)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                key = next(iter(self._entries))
+                self._remove(key)
+                evicted.append(key)
+            self.evictions += len(evicted)
+            # Insert before deleting, so results evicted within this same batch do not stay on disk
+            self._conn.executemany("INSERT OR REPLACE INTO ocr_cache VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany(
+                "DELETE FROM ocr_cache WHERE namespace = ? AND hash = ? AND width = ? AND height = ?",
+                [self._row_key(key) for key in evicted]
+            )
+            self._conn.executemany(
+                "UPDATE ocr_cache SET last_used = ? WHERE namespace = ? AND hash = ? AND width = ? AND height = ?",
+                [(now,) + self._row_key(key) for key in touched]
+            )
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Return hit/miss counters for reporting. ``rejected`` counts hash matches that the
+        thumbnail comparison turned down.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'rejected': self.rejected,
+                'entries': len(self._entries),
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        """
+        Close the underlying SQLite connection.
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,323 @@
+# Import required libraries for exporting models to ONNX and checking the exported models
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import logging
+import numpy as np
+from manga_translator.config import (
+    MODEL_PATH, IMAGE_DIR, ONNX_DIR, ONNX_THREADS, DETECTION_IMAGE_SIZE, OCR_MAX_BATCH_SIZE
+)
+from manga_translator.archive import PAGE_EXTENSIONS, natural_sort_key
+from manga_translator.onnx_models import (
+    DETECTOR_FILE, OCR_ENCODER_FILE, OCR_DECODER_FILE, OCR_DECODER_WITH_PAST_FILE, OCR_VOCAB_FILE, onnx_model_path,
+    load_onnx_detector, load_onnx_ocr
+)
+
+def export_detector(model_path=MODEL_PATH, onnx_dir=ONNX_DIR, imgsz=DETECTION_IMAGE_SIZE):
+    """
+    Export the YOLO weights to ONNX with dynamic batch and image size.
+
+    Returns:
+        str: Path of the exported model
+    """
+    from ultralytics import YOLO
+    exported = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    os.makedirs(onnx_dir, exist_ok=True)
+    output_path = onnx_model_path(onnx_dir, DETECTOR_FILE)
+    shutil.move(exported, output_path)
+    logging.info(f"Exported detector to {output_path}")
+    return output_path
+
+# Cached tensors per decoder layer: self-attention key/value, then cross-attention key/value
+PAST_KINDS = ('key', 'value', 'cross_key', 'cross_value')
+
+def _past_names(prefix, layers, kinds=PAST_KINDS):
+    return [f'{prefix}.{layer}.{kind}' for layer in range(layers) for kind in kinds]
+
+def _flatten_past(past_key_values):
+    # Newer transformers return a Cache object, older ones a tuple of 4-tuples per layer
+    if hasattr(past_key_values, 'to_legacy_cache'):
+        past_key_values = past_key_values.to_legacy_cache()
+    return tuple(tensor for layer in past_key_values for tensor in layer[:len(PAST_KINDS)])
+
+def _as_cache(flat):
+    layers = tuple(tuple(flat[i:i + len(PAST_KINDS)]) for i in range(0, len(flat), len(PAST_KINDS)))
+    try:
+        from transformers.cache_utils import EncoderDecoderCache
+    except ImportError:
+        return layers
+    # Indexing the cache by layer still yields the legacy 4-tuple, so older decoders accept it too
+    return EncoderDecoderCache.from_legacy_cache(layers)
+
+def export_ocr(onnx_dir=ONNX_DIR, opset=17):
+    """
+    Export the manga-ocr image encoder and text decoder to ONNX, and write the vocabulary
+    and preprocessing settings the ONNX OCR engine needs into a JSON file.
+
+    The decoder is exported twice so generation can use a KV cache: the first step runs
+    the plain decoder, which also returns the attention keys and values of every layer,
+    and later steps run the decoder with past inputs on the newest token only.
+
+    Returns:
+        list: Paths of the exported encoder, decoders and vocabulary
+    """
+    import torch
+    from manga_ocr import MangaOcr
+    mocr = MangaOcr(force_cpu=True)
+    model = mocr.model.eval()
+    processor = mocr.processor.image_processor if hasattr(mocr.processor, 'image_processor') else mocr.processor
+    size = processor.size['height'] if isinstance(processor.size, dict) else processor.size
+
+    class Encoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.encoder = model.encoder
+
+        def forward(self, pixel_values):
+            return self.encoder(pixel_values=pixel_values).last_hidden_state
+
+    class Decoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.decoder = model.decoder
+            self.projection = getattr(model, 'enc_to_dec_proj', None)
+
+        def forward(self, input_ids, encoder_hidden_states):
+            if self.projection is not None:
+                encoder_hidden_states = self.projection(encoder_hidden_states)
+            output = self.decoder(input_ids=input_ids, encoder_hidden_states=encoder_hidden_states, use_cache=True)
+            return (output.logits,) + _flatten_past(output.past_key_values)
+
+    class DecoderWithPast(Decoder):
+        def forward(self, input_ids, encoder_hidden_states, *past):
+            if self.projection is not None:
+                encoder_hidden_states = self.projection(encoder_hidden_states)
+            output = self.decoder(input_ids=input_ids, encoder_hidden_states=encoder_hidden_states,
+                                  past_key_values=_as_cache(past), use_cache=True)
+            # The cross-attention keys and values never change, so only the self-attention ones are returned
+            present = _flatten_past(output.past_key_values)
+            return (output.logits,) + tuple(tensor for i, tensor in enumerate(present) if i % len(PAST_KINDS) < 2)
+
+    os.makedirs(onnx_dir, exist_ok=True)
+    encoder_path = onnx_model_path(onnx_dir, OCR_ENCODER_FILE)
+    decoder_path = onnx_model_path(onnx_dir, OCR_DECODER_FILE)
+    decoder_with_past_path = onnx_model_path(onnx_dir, OCR_DECODER_WITH_PAST_FILE)
+    layers = model.decoder.config.num_hidden_layers
+    present_names = _past_names('present', layers)
+    pixel_values = torch.zeros(1, 3, size, size)
+    with torch.no_grad():
+        hidden = Encoder()(pixel_values)
+        torch.onnx.export(Encoder(), (pixel_values,), encoder_path, opset_version=opset,
+                          input_names=['pixel_values'], output_names=['last_hidden_state'],
+                          dynamic_axes={'pixel_values': {0: 'batch'}, 'last_hidden_state': {0: 'batch'}})
+        input_ids = torch.full((1, 2), model.config.decoder_start_token_id, dtype=torch.long)
+        torch.onnx.export(Decoder(), (input_ids, hidden), decoder_path, opset_version=opset,
+                          input_names=['input_ids', 'encoder_hidden_states'], output_names=['logits'] + present_names,
+                          dynamic_axes=dict({'input_ids': {0: 'batch', 1: 'sequence'},
+                                             'encoder_hidden_states': {0: 'batch'},
+                                             'logits': {0: 'batch', 1: 'sequence'}},
+                                            **{name: {0: 'batch', 2: 'sequence'} for name in present_names}))
+
+        # Export the cached step with the keys and values of a two-token prefix
+        past = Decoder()(input_ids, hidden)[1:]
+        past_names = _past_names('past', layers)
+        self_present_names = _past_names('present', layers, PAST_KINDS[:2])
+        next_ids = torch.full((1, 1), model.config.decoder_start_token_id, dtype=torch.long)
+        past_axes = {name: {0: 'batch', 2: 'past_sequence'} for name in _past_names('past', layers, PAST_KINDS[:2])}
+        past_axes.update({name: {0: 'batch'} for name in _past_names('past', layers, PAST_KINDS[2:])})
+        torch.onnx.export(DecoderWithPast(), (next_ids, hidden) + tuple(past), decoder_with_past_path,
+                          opset_version=opset,
+                          input_names=['input_ids', 'encoder_hidden_states'] + past_names,
+                          output_names=['logits'] + self_present_names,
+                          dynamic_axes=dict({'input_ids': {0: 'batch'}, 'encoder_hidden_states': {0: 'batch'},
+                                             'logits': {0: 'batch'}},
+                                            **past_axes,
+                                            **{name: {0: 'batch', 2: 'sequence'} for name in self_present_names}))
+
+    tokenizer = mocr.tokenizer
+    vocab_path = os.path.join(onnx_dir, OCR_VOCAB_FILE)
+    with open(vocab_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'tokens': tokenizer.convert_ids_to_tokens(list(range(len(tokenizer)))),
+            'special_ids': sorted(tokenizer.all_special_ids),
+            'decoder_start_token_id': model.config.decoder_start_token_id,
+            'eos_token_id': model.config.eos_token_id if model.config.eos_token_id is not None
+                            else tokenizer.sep_token_id,
+            'pad_token_id': model.config.pad_token_id if model.config.pad_token_id is not None
+                            else tokenizer.pad_token_id,
+            'image_size': size,
+            'image_mean': list(processor.image_mean),
+            'image_std': list(processor.image_std),
+        }, f, ensure_ascii=False)
+    logging.info(f"Exported OCR encoder and decoders to {onnx_dir}")
+    return [encoder_path, decoder_path, decoder_with_past_path, vocab_path]
+
+def quantize_models(onnx_dir=ONNX_DIR):
+    """
+    Write dynamically INT8-quantized copies of every exported model next to the originals.
+    Weights are quantized ahead of time and activations at run time, so no calibration
+    data is needed.
+
+    Returns:
+        list: Paths of the quantized models
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantized = []
+    for file_name in (DETECTOR_FILE, OCR_ENCODER_FILE, OCR_DECODER_FILE, OCR_DECODER_WITH_PAST_FILE):
+        source = onnx_model_path(onnx_dir, file_name)
+        if not os.path.exists(source):
+            continue
+        target = onnx_model_path(onnx_dir, file_name, quantized=True)
+        quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+        logging.info(f"Quantized {source} -> {target} "
+                     f"({os.path.getsize(source) / 1e6:.1f} MB -> {os.path.getsize(target) / 1e6:.1f} MB)")
+        quantized.append(target)
+    return quantized
+
+def box_iou(a, b):
+    """
+    Pairwise IoU between two sets of xyxy boxes.
+
+    Returns:
+        numpy.ndarray: (len(a), len(b)) matrix of IoU values
+    """
+    a, b = np.asarray(a, dtype=np.float32).reshape(-1, 4), np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+def _match_boxes(reference, candidate):
+    # Best IoU of every reference box with a candidate box of the same class
+    ref_boxes, ref_classes = reference
+    boxes, classes = candidate
+    if len(ref_boxes) == 0:
+        return []
+    if len(boxes) == 0:
+        return [0.0] * len(ref_boxes)
+    iou = box_iou(ref_boxes, boxes)
+    iou[np.asarray(ref_classes)[:, None] != np.asarray(classes)[None, :]] = 0.0
+    return iou.max(axis=1).tolist()
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def compare_backends(image_paths, model_path=MODEL_PATH, onnx_dir=ONNX_DIR, quantized=False,
+                     threads=ONNX_THREADS, imgsz=DETECTION_IMAGE_SIZE, ocr_batch_size=OCR_MAX_BATCH_SIZE):
+    """
+    Run the torch and ONNX detector and OCR side by side on the same pages and report how
+    closely the ONNX path reproduces the torch results and how long each took.
+
+    Detection accuracy is the IoU of every torch box with its best same-class ONNX box.
+    OCR accuracy is the share of text crops (cut from the torch detections, so both OCR
+    engines see identical input) that come out with exactly the same text.
+
+    Returns:
+        dict: Accuracy and timing figures
+    """
+    from manga_translator.image_utils import load_page
+    from manga_translator.detection import load_yolo_model, detect_text_regions_batch
+    from manga_translator.ocr import OcrEngine, load_manga_ocr
+    torch_detector = load_yolo_model(model_path)
+    onnx_detector = load_onnx_detector(onnx_dir, quantized, threads, imgsz)
+    torch_ocr = OcrEngine(load_manga_ocr(), max_batch_size=ocr_batch_size)
+    onnx_ocr = load_onnx_ocr(onnx_dir, quantized, threads, ocr_batch_size)
+
+    ious, texts_equal, texts_total = [], 0, 0
+    seconds = {'torch_detect': 0.0, 'onnx_detect': 0.0, 'torch_ocr': 0.0, 'onnx_ocr': 0.0}
+    pages = 0
+    for path in image_paths:
+        image, _ = load_page(path)
+        if image is None:
+            continue
+        pages += 1
+        (torch_result,), elapsed = _timed(detect_text_regions_batch, torch_detector, [image], 1, imgsz)
+        seconds['torch_detect'] += elapsed
+        (onnx_result,), elapsed = _timed(detect_text_regions_batch, onnx_detector, [image], 1, imgsz)
+        seconds['onnx_detect'] += elapsed
+        ious.extend(_match_boxes(torch_result, onnx_result))
+
+        crops = [image[int(y1):int(y2), int(x1):int(x2)]
+                 for (x1, y1, x2, y2), cls_id in zip(*torch_result) if int(cls_id) == 3]
+        if not crops:
+            continue
+        torch_texts, elapsed = _timed(torch_ocr, crops)
+        seconds['torch_ocr'] += elapsed
+        onnx_texts, elapsed = _timed(onnx_ocr, crops)
+        seconds['onnx_ocr'] += elapsed
+        texts_equal += sum(a == b for a, b in zip(torch_texts, onnx_texts))
+        texts_total += len(crops)
+
+    return {
+        'pages': pages,
+        'quantized': quantized,
+        'detection': {
+            'boxes': len(ious),
+            'mean_iou': float(np.mean(ious)) if ious else None,
+            'matched_at_0.5': float(np.mean(np.array(ious) >= 0.5)) if ious else None,
+        },
+        'ocr': {
+            'crops': texts_total,
+            'text_equality_rate': texts_equal / texts_total if texts_total else None,
+        },
+        'seconds_per_page': {name: value / pages for name, value in seconds.items()} if pages else {},
+        'speedup': {
+            'detect': seconds['torch_detect'] / seconds['onnx_detect'] if seconds['onnx_detect'] else None,
+            'ocr': seconds['torch_ocr'] / seconds['onnx_ocr'] if seconds['onnx_ocr'] else None,
+        },
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export the detector and OCR models to ONNX and check them.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="Export the models to ONNX")
+    export.add_argument('--stage', choices=['detector', 'ocr', 'all'], default='all')
+    export.add_argument('--model-path', default=MODEL_PATH)
+    export.add_argument('--imgsz', type=int, default=DETECTION_IMAGE_SIZE)
+    export.add_argument('--onnx-dir', default=ONNX_DIR)
+    export.add_argument('--quantize', action='store_true', help="Also write INT8-quantized copies")
+    quantize = commands.add_parser('quantize', help="Write INT8-quantized copies of exported models")
+    quantize.add_argument('--onnx-dir', default=ONNX_DIR)
+    compare = commands.add_parser('compare', help="Compare accuracy and speed of the torch and ONNX paths")
+    compare.add_argument('--images', default=IMAGE_DIR, help="Folder of sample pages")
+    compare.add_argument('--limit', type=int, default=20, help="Maximum number of pages used")
+    compare.add_argument('--model-path', default=MODEL_PATH)
+    compare.add_argument('--imgsz', type=int, default=DETECTION_IMAGE_SIZE)
+    compare.add_argument('--onnx-dir', default=ONNX_DIR)
+    compare.add_argument('--quantized', action='store_true', help="Compare against the INT8 models")
+    compare.add_argument('--threads', type=int, default=ONNX_THREADS)
+    compare.add_argument('--output', help="Also write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args(argv)
+    if args.command == 'export':
+        if args.stage in ('detector', 'all'):
+            export_detector(args.model_path, args.onnx_dir, args.imgsz)
+        if args.stage in ('ocr', 'all'):
+            export_ocr(args.onnx_dir)
+        if args.quantize:
+            quantize_models(args.onnx_dir)
+    elif args.command == 'quantize':
+        quantize_models(args.onnx_dir)
+    else:
+        names = sorted((f for f in os.listdir(args.images) if f.lower().endswith(PAGE_EXTENSIONS)),
+                       key=natural_sort_key)[:args.limit]
+        report = compare_backends([os.path.join(args.images, name) for name in names], args.model_path,
+                                  args.onnx_dir, args.quantized, args.threads, args.imgsz)
+        print(json.dumps(report, indent=2))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
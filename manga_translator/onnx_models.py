@@ -0,0 +1,277 @@
+# Import required libraries for ONNX Runtime inference; onnxruntime is imported when a session is created
+import os
+import re
+import json
+import logging
+import cv2
+import numpy as np
+from PIL import Image
+from manga_translator.config import ONNX_DIR, DETECTION_IMAGE_SIZE, OCR_MAX_LENGTH
+from manga_translator.metrics import metrics
+
+# File names of the exported models inside ONNX_DIR
+DETECTOR_FILE = 'detector.onnx'
+OCR_ENCODER_FILE = 'ocr_encoder.onnx'
+OCR_DECODER_FILE = 'ocr_decoder.onnx'
+OCR_DECODER_WITH_PAST_FILE = 'ocr_decoder_with_past.onnx'
+OCR_VOCAB_FILE = 'ocr_vocab.json'
+
+def onnx_model_path(onnx_dir, file_name, quantized=False):
+    """
+    Path of an exported model, or of its INT8-quantized copy ('detector.int8.onnx').
+    """
+    if quantized:
+        file_name = file_name.replace('.onnx', '.int8.onnx')
+    return os.path.join(onnx_dir, file_name)
+
+def create_session(path, threads=0):
+    """
+    Open an ONNX model on the CPU execution provider.
+
+    Args:
+        path (str): Path to the .onnx file
+        threads (int): Intra-op threads (0 lets onnxruntime use every core)
+
+    Returns:
+        onnxruntime.InferenceSession: The session
+    """
+    import onnxruntime as ort
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; export it with 'python -m manga_translator.onnx_export export'")
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+def letterbox(image, size):
+    """
+    Resize a BGR page to fit a ``size`` x ``size`` square, keeping its aspect ratio and
+    padding with grey, the same way ultralytics prepares its inputs.
+
+    Returns:
+        tuple: (padded image, scale factor, (left padding, top padding))
+    """
+    height, width = image.shape[:2]
+    gain = min(size / height, size / width)
+    new_width, new_height = int(round(width * gain)), int(round(height * gain))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_width) / 2, (size - new_height) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return image, gain, (left, top)
+
+class OnnxDetector:
+    """
+    YOLO text detector running the exported model through onnxruntime.
+    Called like the ultralytics model, but returns one (boxes, classes) tuple per page
+    directly instead of ultralytics result objects.
+
+    Args:
+        path (str): Exported detector (.onnx)
+        threads (int): Intra-op threads for onnxruntime (0 uses every core)
+        imgsz (int): Inference size used when the caller does not pass one
+        conf (float): Minimum class confidence of a kept box
+        iou (float): IoU above which overlapping boxes of the same class are suppressed
+        max_det (int): Maximum boxes kept per page
+    """
+    def __init__(self, path, threads=0, imgsz=DETECTION_IMAGE_SIZE, conf=0.25, iou=0.7, max_det=300):
+        self.session = create_session(path, threads)
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+
+    def __call__(self, images, imgsz=None, verbose=False):
+        # The detector is exported with dynamic axes, so any multiple of 32 works as imgsz
+        size = imgsz or self.imgsz
+        batch, transforms = [], []
+        for image in images:
+            padded, gain, pad = letterbox(image, size)
+            batch.append(cv2.cvtColor(padded, cv2.COLOR_BGR2RGB))
+            transforms.append((gain, pad, image.shape[:2]))
+        tensor = np.ascontiguousarray(np.stack(batch).transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        output = self.session.run(None, {self.input_name: tensor})[0]
+        return [self._postprocess(prediction, size, *transform) for prediction, transform in zip(output, transforms)]
+
+    def _postprocess(self, prediction, size, gain, pad, shape):
+        # YOLOv8 output is (4 + classes, anchors): box centre/size followed by class scores
+        prediction = prediction.T
+        scores = prediction[:, 4:]
+        classes = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), classes]
+        keep = confidences > self.conf
+        if not keep.any():
+            return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=int)
+        cx, cy, w, h = prediction[keep, :4].T
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        classes, confidences = classes[keep], confidences[keep]
+        # Offset boxes by class so NMS never suppresses a box of another class. Predicted boxes
+        # reach at most half their size past the ``size`` x ``size`` input, so every coordinate
+        # lies in (-size / 2, 1.5 * size) and an offset of twice the input size keeps classes apart
+        class_offset = 2.0 * size + 1
+        offset = boxes + (classes * class_offset)[:, None]
+        rects = np.concatenate([offset[:, :2], offset[:, 2:] - offset[:, :2]], axis=1)
+        indices = cv2.dnn.NMSBoxes(rects.tolist(), confidences.tolist(), self.conf, self.iou)
+        indices = np.array(indices, dtype=int).reshape(-1)[:self.max_det]
+        boxes, classes = boxes[indices], classes[indices]
+        # Undo the letterbox to get page coordinates
+        boxes -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)
+        boxes /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+        return boxes.astype(np.float32), classes.astype(int)
+
+def post_process_ocr_text(text):
+    """
+    Normalize decoded OCR text the way manga_ocr does, without importing manga_ocr (and torch).
+    """
+    import jaconv
+    text = ''.join(text.split())
+    text = text.replace('…', '...')
+    text = re.sub('[・.]{2,}', lambda match: (match.end() - match.start()) * '.', text)
+    return jaconv.h2z(text, ascii=True, digit=True)
+
+class OnnxOcrEngine:
+    """
+    Manga OCR running the exported encoder and decoder through onnxruntime, with the same
+    call interface as ``OcrEngine``. Crops are encoded in batches and decoded greedily;
+    the vocabulary is read from the JSON file written at export time, so neither torch
+    nor transformers is needed at run time.
+
+    The decoder reuses the attention keys and values of earlier tokens (a KV cache): the
+    first step runs the full decoder, which also returns every layer's keys and values,
+    and each further step feeds only the newest token to the decoder exported with past
+    inputs. Decoding then costs time linear in the number of generated tokens. Models
+    exported before the KV cache existed are still accepted, but every step re-runs the
+    decoder over the whole prefix, so a crop generating ``n`` tokens costs O(n^2) and
+    ``max_length`` bounds the worst case; re-export the OCR model to get the cached path.
+
+    Args:
+        encoder_path (str): Exported image encoder (.onnx)
+        decoder_path (str): Exported text decoder (.onnx)
+        vocab_path (str): Vocabulary and preprocessing settings written by the exporter
+        threads (int): Intra-op threads for onnxruntime (0 uses every core)
+        max_batch_size (int): Maximum number of crops encoded and decoded together
+        max_length (int): Maximum number of generated tokens per crop
+        decoder_with_past_path (str): Exported decoder taking cached keys and values (.onnx)
+    """
+    def __init__(self, encoder_path, decoder_path, vocab_path, threads=0, max_batch_size=16,
+                 max_length=OCR_MAX_LENGTH, decoder_with_past_path=None):
+        with open(vocab_path, encoding='utf-8') as f:
+            vocab = json.load(f)
+        self.tokens = vocab['tokens']
+        self.special_ids = set(vocab['special_ids'])
+        self.start_id = vocab['decoder_start_token_id']
+        self.eos_id = vocab['eos_token_id']
+        self.pad_id = vocab['pad_token_id']
+        self.image_size = vocab['image_size']
+        self.mean = np.array(vocab['image_mean'], dtype=np.float32)
+        self.std = np.array(vocab['image_std'], dtype=np.float32)
+        self.encoder = create_session(encoder_path, threads)
+        self.decoder = create_session(decoder_path, threads)
+        # Names of the cached keys and values, in the decoder's output order ('present.0.key', ...)
+        self.present_names = [output.name for output in self.decoder.get_outputs()[1:]]
+        self.decoder_with_past = None
+        if self.present_names and decoder_with_past_path and os.path.exists(decoder_with_past_path):
+            self.decoder_with_past = create_session(decoder_with_past_path, threads)
+            self.with_past_inputs = {item.name for item in self.decoder_with_past.get_inputs()}
+        else:
+            logging.warning("ONNX OCR decoder has no KV cache; decoding time grows quadratically with text "
+                            "length. Re-export it with 'python -m manga_translator.onnx_export export --stage ocr'")
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_length = max_length
+
+    def _prepare(self, crop):
+        # Grayscale and back to RGB, then the ViT processor's bilinear resize and normalization
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if len(crop.shape) == 3 else crop
+        image = Image.fromarray(gray).convert('RGB').resize((self.image_size, self.image_size), Image.BILINEAR)
+        pixels = (np.asarray(image, dtype=np.float32) / 255.0 - self.mean) / self.std
+        return pixels.transpose(2, 0, 1)
+
+    def _decode(self, ids):
+        pieces = [self.tokens[i] for i in ids if i not in self.special_ids]
+        return post_process_ocr_text(''.join(piece[2:] if piece.startswith('##') else piece for piece in pieces))
+
+    def _generate(self, pixel_values):
+        hidden = self.encoder.run(None, {'pixel_values': pixel_values})[0]
+        if self.decoder_with_past is not None:
+            return self._generate_cached(hidden)
+        ids = np.full((len(pixel_values), 1), self.start_id, dtype=np.int64)
+        done = np.zeros(len(pixel_values), dtype=bool)
+        for _ in range(self.max_length - 1):
+            logits = self.decoder.run(None, {'input_ids': ids, 'encoder_hidden_states': hidden})[0]
+            next_ids = logits[:, -1].argmax(axis=-1)
+            next_ids[done] = self.pad_id
+            ids = np.concatenate([ids, next_ids[:, None]], axis=1)
+            done |= next_ids == self.eos_id
+            if done.all():
+                break
+        return ids[:, 1:]
+
+    def _generate_cached(self, hidden):
+        ids = np.full((len(hidden), 1), self.start_id, dtype=np.int64)
+        outputs = self.decoder.run(None, {'input_ids': ids, 'encoder_hidden_states': hidden})
+        # Present keys and values of one step are the past inputs of the next
+        past = {name.replace('present', 'past', 1): value for name, value in zip(self.present_names, outputs[1:])}
+        logits = outputs[0]
+        generated = []
+        done = np.zeros(len(hidden), dtype=bool)
+        for step in range(self.max_length - 1):
+            next_ids = logits[:, -1].argmax(axis=-1)
+            next_ids[done] = self.pad_id
+            generated.append(next_ids)
+            done |= next_ids == self.eos_id
+            if done.all() or step == self.max_length - 2:
+                break
+            feed = dict(past, input_ids=next_ids[:, None].astype(np.int64), encoder_hidden_states=hidden)
+            outputs = self.decoder_with_past.run(None, {name: feed[name] for name in self.with_past_inputs})
+            logits = outputs[0]
+            # Only the self-attention cache grows; the cross-attention keys and values stay as they are
+            for output, value in zip(self.decoder_with_past.get_outputs()[1:], outputs[1:]):
+                past[output.name.replace('present', 'past', 1)] = value
+        return np.stack(generated, axis=1)
+
+    def __call__(self, crops):
+        """
+        Run OCR on a list of crops.
+
+        Args:
+            crops (list): BGR numpy arrays
+
+        Returns:
+            list: Recognized text for each crop, in input order
+        """
+        texts = []
+        for start in range(0, len(crops), self.max_batch_size):
+            # The model's own input processing, kept apart from the ocr.preprocess.<op> crop stages
+            with metrics.stage('ocr.processor'):
+                batch = [self._prepare(crop) for crop in crops[start:start + self.max_batch_size]]
+                pixel_values = np.ascontiguousarray(np.stack(batch), dtype=np.float32)
+            with metrics.stage('ocr.generate', batch=len(batch)):
+                generated = self._generate(pixel_values)
+            for ids in generated:
+                ids = ids.tolist()
+                if self.eos_id in ids:
+                    ids = ids[:ids.index(self.eos_id)]
+                texts.append(self._decode(ids))
+            metrics.count('ocr.crops', len(batch))
+        return texts
+
+def load_onnx_detector(onnx_dir=ONNX_DIR, quantized=False, threads=0, imgsz=DETECTION_IMAGE_SIZE):
+    return OnnxDetector(onnx_model_path(onnx_dir, DETECTOR_FILE, quantized), threads=threads, imgsz=imgsz)
+
+def load_onnx_ocr(onnx_dir=ONNX_DIR, quantized=False, threads=0, max_batch_size=16, max_length=OCR_MAX_LENGTH):
+    return OnnxOcrEngine(
+        onnx_model_path(onnx_dir, OCR_ENCODER_FILE, quantized),
+        onnx_model_path(onnx_dir, OCR_DECODER_FILE, quantized),
+        os.path.join(onnx_dir, OCR_VOCAB_FILE),
+        threads=threads,
+        max_batch_size=max_batch_size,
+        max_length=max_length,
+        decoder_with_past_path=onnx_model_path(onnx_dir, OCR_DECODER_WITH_PAST_FILE, quantized),
+    )
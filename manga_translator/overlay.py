@@ -1,31 +1,21 @@
-import os
 import cv2
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-import logging
-from manga_translator.text_utils import smart_wrap  # For text wrapping based on font size and box width
+from PIL import Image, ImageDraw
+from manga_translator.config import FONT_PATH, PAGE_BAND_HEIGHT
+from manga_translator.metrics import metrics
+from manga_translator.layout import fit_text, draw_layout  # Measured wrapping and cached fonts
+from manga_translator.image_utils import bands
 
-def insert_translation(image, box_coords, translated_text, font_path='font/CC Wild Words Roman.ttf', font_size_multiplier=1.0):
+def _preferred_font_size(region_width, region_height, translated_text, font_size_multiplier=1.0):
     """
-    Insert translated text into a text region with more dynamic font sizing.
+    Heuristic preferred font size for a region plus the padded width and height available for text.
+    The layout engine treats the preferred size as an upper bound and shrinks it until the text fits.
     """
-    # Unpack bounding box coordinates and calculate region size
-    x1, y1, x2, y2 = map(int, box_coords)
-    region_width, region_height = x2 - x1, y2 - y1
-
-    # Extract the region and create a clean white canvas of the same size
-    region = image[y1:y2, x1:x2].copy()
-    clean_region = np.ones_like(region) * 255  # white background
-
-    # Convert to PIL image for flexible font drawing
-    pil_region = Image.fromarray(cv2.cvtColor(clean_region, cv2.COLOR_BGR2RGB))
-    draw = ImageDraw.Draw(pil_region)
-
     # Estimate a base font size from the region dimensions
     base_font_size = int(min(region_height / 4, region_width / 8))
 
     # Adjust font size based on how long the text is relative to the area
-    text_length_factor = len(translated_text) / (region_width * region_height / 8000)
+    text_length_factor = len(translated_text) / max(1, region_width * region_height / 8000)
     adjusted_font_size = int(base_font_size / (1 + text_length_factor * 0.2))
 
     # Enforce font size boundaries (not too small or too large)
@@ -33,58 +23,56 @@ def insert_translation(image, box_coords, translated_text, font_path='font/CC Wi
     max_size = int(min(region_height / 3, region_width / 6))
     font_size = max(min_size, min(int(adjusted_font_size * font_size_multiplier * 1.2), max_size))
 
-    # Try to load the specified font; fallback to default if missing
-    try:
-        font = ImageFont.truetype(font_path, font_size)
-    except IOError:
-        logging.warning(f"Font {font_path} not found, using default font")
-        font = ImageFont.load_default()
-
     # Define inner padding to prevent text from touching the box edges
     padding_x = int(region_width * 0.04)
     padding_y = int(region_height * 0.04)
     effective_width = region_width - (2 * padding_x)
     effective_height = region_height - (2 * padding_y)
+    return font_size, effective_width, effective_height
 
-    # Estimate how many characters per line to wrap around properly
-    avg_char_width = font_size * 0.6
-    chars_per_line = int((effective_width * 0.95) / avg_char_width)
+def insert_translation(image, box_coords, translated_text, font_path='font/CC Wild Words Roman.ttf', font_size_multiplier=1.0):
+    """
+    Insert translated text into a text region with more dynamic font sizing.
+    """
+    # Unpack bounding box coordinates and calculate region size
+    x1, y1, x2, y2 = map(int, box_coords)
+    region_width, region_height = x2 - x1, y2 - y1
 
-    # Wrap the translated text to fit inside the box
-    wrapped_text = smart_wrap(translated_text, width=max(1, chars_per_line))
+    # Extract the region and create a clean white canvas of the same size
+    region = image[y1:y2, x1:x2].copy()
+    clean_region = np.ones_like(region) * 255  # white background
 
-    # Measure the bounding box of the wrapped text
-    text_bbox = draw.textbbox((0, 0), wrapped_text, font=font)
-    text_width = text_bbox[2] - text_bbox[0]
-    text_height = text_bbox[3] - text_bbox[1]
+    # Convert to PIL image for flexible font drawing
+    pil_region = Image.fromarray(cv2.cvtColor(clean_region, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(pil_region)
 
-    # If the text still doesn't fit, reduce font size accordingly
-    if text_height > effective_height:
-        reduction_factor = effective_height / text_height
-        new_font_size = max(min_size, int(font_size * reduction_factor * 0.95))
-        font = ImageFont.truetype(font_path, new_font_size)
-        wrapped_text = smart_wrap(translated_text, width=max(1, chars_per_line))
-        text_bbox = draw.textbbox((0, 0), wrapped_text, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
+    # Work out the preferred font size and the padded area available for text
+    font_size, effective_width, effective_height = _preferred_font_size(
+        region_width, region_height, translated_text, font_size_multiplier
+    )
 
-    # Center the text inside the region
-    text_x = (region_width - text_width) // 2
-    text_y = (region_height - text_height) // 2
+    # Find the largest size up to the preferred one whose measured, wrapped block fits the box
+    layout = fit_text(translated_text, font_path, effective_width * 0.95, effective_height, font_size)
 
-    # Draw the final translated text onto the region
-    draw.text((text_x, text_y), wrapped_text, font=font, fill=(0, 0, 0))
+    # Draw the wrapped lines centered inside the region
+    draw_layout(draw, layout, region_width, region_height)
 
     # Convert the updated region back to OpenCV format and replace in the original image
     result_region = cv2.cvtColor(np.array(pil_region), cv2.COLOR_RGB2BGR)
     image[y1:y2, x1:x2] = result_region
     return image
 
-def check_and_fix_truncated_text(image, region_translations):
+def plan_regions(region_translations):
     """
-    Enhanced function to fix text issues with better detection and handling for text class regions.
+    Decide once per region how it is rendered: a font size multiplier based on the region's
+    shape and text density, and a priority that sets the drawing order.
+
+    Args:
+        region_translations (dict): region_id -> {'translation', 'coords', ...}
+
+    Returns:
+        list: Region plans in drawing order
     """
-    fixed_image = image.copy()
     text_regions = []
 
     # Loop through all detected regions with translations
@@ -132,20 +120,75 @@ def check_and_fix_truncated_text(image, region_translations):
             'area': region_area
         })
 
-    # Sort regions by priority and size (larger areas first)
+    # Sort regions by priority, then by area
     text_regions.sort(key=lambda x: (x['priority'], -x['area']), reverse=True)
+    return text_regions
 
-    # Insert translations into each region with adjusted font size
-    for region in text_regions:
-        region_id = region['region_id']
-        data = region['data']
-        font_multiplier = region['font_multiplier']
-        fixed_image = insert_translation(
-            fixed_image,
-            data['coords'],
-            data['translation'],
-            font_path='font/CC Wild Words Roman.ttf',
-            font_size_multiplier=font_multiplier
+def composite_translations(image, region_translations, font_path=FONT_PATH, band_height=PAGE_BAND_HEIGHT):
+    """
+    Render every translated region in one pass and blend the result onto the page in place.
+    Each region is planned once, drawn (white box plus text, clipped to the box) into a single
+    shared RGBA layer covering only the union of the regions, and the layer is copied onto the
+    page with one masked numpy operation. No per-region color conversions and no full-page
+    copies are made. On tall pages the regions are split into horizontal bands with one layer
+    each, so the layer never grows with the length of a webtoon strip.
+
+    Args:
+        image (numpy.ndarray): BGR page, modified in place
+        region_translations (dict): region_id -> {'translation', 'coords', ...}
+        font_path (str): Font used for the translations
+        band_height (int): Approximate height of one compositing band in pixels
+
+    Returns:
+        numpy.ndarray: The same image array, with the translations drawn
+    """
+    with metrics.stage('render.composite', regions=len(region_translations)):
+        plans = plan_regions(region_translations)
+        metrics.count('render.regions', len(plans))
+        # Regions in different bands never overlap, so drawing band by band gives the same
+        # result as one pass; plans keep their drawing order inside each band
+        spans = [(int(plan['data']['coords'][1]), int(plan['data']['coords'][3])) for plan in plans]
+        for band in bands(spans, band_height):
+            _composite(image, [plans[i] for i in sorted(band)], font_path)
+        return image
+
+def _composite(image, plans, font_path):
+    page_height, page_width = image.shape[:2]
+
+    # The shared layer only needs to cover the union of all regions
+    boxes = [tuple(map(int, plan['data']['coords'])) for plan in plans]
+    left = max(0, min(box[0] for box in boxes))
+    top = max(0, min(box[1] for box in boxes))
+    right = min(page_width, max(box[2] for box in boxes))
+    bottom = min(page_height, max(box[3] for box in boxes))
+    if right <= left or bottom <= top:
+        return image
+    layer = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+
+    for plan, (x1, y1, x2, y2) in zip(plans, boxes):
+        region_width, region_height = x2 - x1, y2 - y1
+        if region_width <= 0 or region_height <= 0:
+            continue
+        translated_text = plan['data']['translation']
+        font_size, effective_width, effective_height = _preferred_font_size(
+            region_width, region_height, translated_text, plan['font_multiplier']
         )
+        layout = fit_text(translated_text, font_path, effective_width * 0.95, effective_height, font_size)
+        # Draw on an opaque white tile of the region's size, so text that still overflows at the
+        # smallest font size is clipped to its box, and later regions cover earlier ones
+        tile = Image.new('RGBA', (region_width, region_height), (255, 255, 255, 255))
+        draw_layout(ImageDraw.Draw(tile), layout, region_width, region_height, fill=(0, 0, 0, 255))
+        layer.paste(tile, (x1 - left, y1 - top))
+
+    # Blend the layer onto the page: text is drawn on opaque boxes, so covered pixels are replaced
+    pixels = np.asarray(layer)
+    target = image[top:bottom, left:right]
+    np.copyto(target, pixels[:, :, 2::-1], where=pixels[:, :, 3:4] > 0)
+    return image
 
-    return fixed_image
+def check_and_fix_truncated_text(image, region_translations):
+    """
+    Enhanced function to fix text issues with better detection and handling for text class regions.
+    Returns a new image; use ``composite_translations`` to draw onto the page in place.
+    """
+    return composite_translations(image.copy(), region_translations, font_path=FONT_PATH)
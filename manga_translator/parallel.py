@@ -0,0 +1,256 @@
+# Import required libraries for multi-process page processing
+import os
+import queue
+import logging
+import multiprocessing
+from manga_translator.config import TRANSLATED_DIR, PROCESS_WORKERS
+from manga_translator.metrics import metrics
+from manga_translator.pipeline import build_stages, run_isolated
+
+# Seconds the parent waits for a result before checking whether a worker died
+_POLL_SECONDS = 1.0
+
+def threads_per_worker(workers, cpu_count=None):
+    """
+    Split the machine's cores evenly between worker processes, so N workers running
+    torch at the same time do not each start one thread per core.
+
+    Args:
+        workers (int): Number of worker processes
+        cpu_count (int): Cores available (defaults to os.cpu_count())
+
+    Returns:
+        int: Intra-op threads each worker should use (at least 1)
+    """
+    return max(1, (cpu_count or os.cpu_count() or 1) // max(1, workers))
+
+def limit_threads(threads):
+    """
+    Cap the native thread pools of the current process. Must run before torch is imported
+    for the environment variables to take effect; torch is configured directly if it is
+    already available.
+    """
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Already set, or torch has started parallel work in this process
+        pass
+
+class WorkerSetup:
+    """
+    Builds the models and stage list of one worker process. Instances are pickled into
+    every worker, so they only hold plain settings; the models themselves are created
+    (and warmed up) inside the worker, once per process.
+
+    Args:
+        model_options (dict): Keyword arguments for ``LazyModels``
+        stage_options (dict): Keyword arguments for ``build_stages`` (batch sizes, window, ...)
+        cache_options (dict): Keyword arguments for ``TranslationCache``, or None to disable it
+        artifact_options (dict): Keyword arguments for ``ArtifactStore``, or None to disable it
+        ocr_cache_options (dict): Keyword arguments for ``OcrCache``, or None to disable it
+        comparison_scale (float): Scale for comparison images, or None to disable them
+        output_dir (str): Directory translated pages are written to
+        warm_up (bool): Load every model before taking the first page
+    """
+    def __init__(self, model_options, stage_options=None, cache_options=None, comparison_scale=None,
+                 output_dir=TRANSLATED_DIR, warm_up=True, artifact_options=None, ocr_cache_options=None):
+        self.model_options = model_options
+        self.stage_options = stage_options or {}
+        self.cache_options = cache_options
+        self.comparison_scale = comparison_scale
+        self.output_dir = output_dir
+        self.warm_up = warm_up
+        self.artifact_options = artifact_options
+        self.ocr_cache_options = ocr_cache_options
+
+    def __call__(self):
+        """
+        Create this worker's models and stages.
+
+        Returns:
+            tuple: (list of Stage objects, function releasing the worker's resources)
+        """
+        from manga_translator.models import LazyModels
+        from manga_translator.translation_cache import TranslationCache
+        from manga_translator.comparison import ComparisonWriter
+        from manga_translator.artifacts import ArtifactStore
+        from manga_translator.ocr_cache import OcrCache
+        models = LazyModels(**self.model_options)
+        if self.warm_up:
+            models.warm_up()
+        cache = TranslationCache(**self.cache_options) if self.cache_options else None
+        artifact_store = ArtifactStore(**self.artifact_options) if self.artifact_options else None
+        ocr_cache = OcrCache(**self.ocr_cache_options) if self.ocr_cache_options else None
+        comparison_writer = None
+        if self.comparison_scale is not None:
+            comparison_writer = ComparisonWriter(self.output_dir, scale=self.comparison_scale)
+        stages = build_stages(models, translation_cache=cache, comparison_writer=comparison_writer,
+                              output_dir=self.output_dir, artifact_store=artifact_store,
+                              ocr_cache=ocr_cache, **self.stage_options)
+
+        def close():
+            if comparison_writer is not None:
+                comparison_writer.close()
+            if cache is not None:
+                cache.close()
+            if artifact_store is not None:
+                artifact_store.close()
+            if ocr_cache is not None:
+                ocr_cache.close()
+            models.close()
+        return stages, close
+
+def _take_chunk(tasks, size):
+    """
+    Take up to ``size`` pages from the shared queue: block for the first one, then take
+    whatever else is already waiting. Returns the chunk and whether the stop marker was seen.
+    """
+    item = tasks.get()
+    if item is None:
+        return [], True
+    chunk = [item]
+    while len(chunk) < size:
+        try:
+            item = tasks.get_nowait()
+        except queue.Empty:
+            break
+        if item is None:
+            return chunk, True
+        chunk.append(item)
+    return chunk, False
+
+def _worker_main(setup, threads, tasks, results, log_level, collect_metrics, max_chunk):
+    """
+    Body of a worker process: take chunks of pages from the shared queue until the stop
+    marker, run each chunk through every stage and report its pages back to the parent.
+    A chunk holds as many pages as the largest stage batch (at most ``max_chunk``), so
+    detection, OCR and translation see the same page batches as in sequential mode.
+    """
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - [%(processName)s] %(message)s')
+    limit_threads(threads)
+    if collect_metrics:
+        metrics.enable()
+    try:
+        stages, close = setup()
+    except Exception as e:
+        logging.error(f"Worker setup failed: {e}")
+        results.put(('done', os.getpid(), None))
+        return
+    chunk_size = max(1, min(max(stage.batch_size for stage in stages), max_chunk))
+    stopped = False
+    while not stopped:
+        chunk, stopped = _take_chunk(tasks, chunk_size)
+        if not chunk:
+            break
+        # A page failing in one stage is retried alone from that stage, so the rest of its
+        # chunk is neither lost nor run (and written) a second time
+        finished, failed = run_isolated([page for _, page in chunk], stages)
+        finished = {id(page): page for page in finished}
+        failed = {id(page): e for page, e in failed}
+        for position, page in chunk:
+            if id(page) in failed:
+                logging.error(f"Failed to process {page['path']}: {failed[id(page)]}")
+                results.put(('error', position, f"{page['path']}: {failed[id(page)]}"))
+            else:
+                results.put(('page', position, finished.get(id(page))))
+    close()
+    results.put(('done', os.getpid(), metrics.summary() if collect_metrics else None))
+
+def run_processes(pages, setup, workers=PROCESS_WORKERS, manifest=None, threads=None):
+    """
+    Shard pages across worker processes, each with its own models, so model inference and
+    the Python-side cleaning, dedup and rendering run on several cores at once.
+
+    All pages go into one shared queue and every worker takes the next chunk of pages as
+    soon as it is free, so a slow chunk only holds up its own worker while each chunk still
+    fills the detection, OCR and translation batches. Chunks are capped so that every worker
+    gets pages even when there are few of them. Workers write their pages themselves; the
+    parent records them in the manifest in page order, except pages with failed translations.
+
+    Args:
+        pages (iterable): Page dicts created with ``make_page``
+        setup (WorkerSetup): Picklable callable building a worker's stages
+        workers (int): Number of worker processes
+        manifest (RunManifest): Manifest finished pages are recorded in
+        threads (int): Native threads per worker (defaults to an even split of the cores)
+
+    Returns:
+        list: Pages that made it through every stage, in input order
+
+    Raises:
+        RuntimeError: If any page failed or a worker died, after the remaining pages finished
+    """
+    pages = list(pages)
+    if not pages:
+        return []
+    workers = max(1, min(workers, len(pages)))
+    threads = threads or threads_per_worker(workers)
+    logging.info(f"Starting {workers} worker processes with {threads} threads each")
+
+    # Spawn rather than fork, so workers never inherit a parent's half-initialized torch threads
+    context = multiprocessing.get_context('spawn')
+    tasks = context.Queue()
+    results = context.Queue()
+    for position, page in enumerate(pages):
+        tasks.put((position, page))
+    for _ in range(workers):
+        tasks.put(None)
+    processes = [
+        context.Process(target=_worker_main, name=f'pipeline-worker-{n}', daemon=True,
+                        args=(setup, threads, tasks, results, logging.getLogger().level, metrics.enabled,
+                              -(-len(pages) // workers)))
+        for n in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    finished = {}
+    errors = []
+    stopped = set()
+    next_position = 0
+    while len(stopped) < len(processes):
+        try:
+            kind, key, value = results.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            for process in processes:
+                if process.exitcode not in (None, 0) and process.pid not in stopped:
+                    stopped.add(process.pid)
+                    errors.append(RuntimeError(f"{process.name} exited with code {process.exitcode}"))
+            continue
+        if kind == 'page':
+            finished[key] = value
+        elif kind == 'error':
+            finished[key] = None
+            errors.append(RuntimeError(value))
+        elif kind == 'done':
+            stopped.add(key)
+            if value is not None:
+                metrics.merge(value)
+        # Record pages as soon as every page before them is accounted for
+        while next_position in finished:
+            page = finished[next_position]
+            if page is not None and manifest is not None and not page.get('translation_failures'):
+                manifest.record(page['path'], page['input_hash'], page['fingerprint'], page['output_path'])
+            next_position += 1
+    for process in processes:
+        process.join()
+
+    # Pages behind a lost page (a worker that died mid-page) are recorded now
+    for position in range(next_position, len(pages)):
+        page = finished.get(position)
+        if page is not None and manifest is not None and not page.get('translation_failures'):
+            manifest.record(page['path'], page['input_hash'], page['fingerprint'], page['output_path'])
+    if not errors and len(finished) < len(pages):
+        errors.append(RuntimeError(f"{len(pages) - len(finished)} pages were not processed"))
+    if errors:
+        raise errors[0]
+    return [finished[position] for position in sorted(finished) if finished[position] is not None]
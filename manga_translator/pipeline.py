@@ -0,0 +1,518 @@
+# Import required libraries for staged page processing
+import os
+import logging
+import queue
+import itertools
+import threading
+import cv2
+from manga_translator.config import (
+    FONT_PATH, TRANSLATED_DIR, NORMALIZED_CACHE_DIR, DETECTION_BATCH_SIZE, DETECTION_IMAGE_SIZE, DETECTION_TILING,
+    TRANSLATION_PAGE_WINDOW, OCR_PREPROCESS_PROFILE
+)
+from manga_translator.image_utils import load_page, decode_page_bytes, CropPreprocessor
+from manga_translator.archive import read_archive_member
+from manga_translator.detection import detect_text_regions_tiled, sort_bubbles
+from manga_translator.ocr import validate_ocr_result, verify_japanese_text
+from manga_translator.screening import screen_regions
+from manga_translator.text_utils import (
+    clean_ocr_text, split_japanese_sentences, SimilarityIndex, MangaFormatter, is_sfx
+)
+from manga_translator.translation import translate_batch, post_process_translation
+from manga_translator.overlay import composite_translations
+from manga_translator.metrics import metrics
+
+# Marker placed on a queue to tell a worker that no more pages will arrive
+_STOP = object()
+
+class Stage:
+    """
+    A single step of the page pipeline.
+
+    Args:
+        name (str): Stage name used in logs
+        func (callable): Function taking a list of page dicts and returning the pages to pass on
+        workers (int): Number of worker threads running this stage in pipelined mode
+        batch_size (int): Maximum number of pages handed to ``func`` in one call
+    """
+    def __init__(self, name, func, workers=1, batch_size=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+
+def per_page(func):
+    """
+    Adapt a function working on a single page into a stage function working on a list of pages.
+    Pages for which ``func`` returns None are dropped from the pipeline.
+    """
+    def run(pages):
+        processed = []
+        for page in pages:
+            result = func(page)
+            if result is not None:
+                processed.append(result)
+        return processed
+    return run
+
+def with_artifacts(name, func, artifact_store):
+    """
+    Wrap the stage function of an artifact stage ('detect', 'ocr' or 'translate') so pages
+    restored from the ArtifactStore at or past it skip it, and the results of the pages it
+    did run on are stored. Pages whose translation requests failed are not stored, so the
+    next run translates them again. Without a store the function is returned unchanged.
+    """
+    if artifact_store is None:
+        return func
+    def run(pages):
+        pending = [page for page in pages if artifact_store.needs(page, name)]
+        if pending:
+            func(pending)
+            artifact_store.save(name, [page for page in pending if not page.get('translation_failures')])
+        return pages
+    return run
+
+def make_page(index, image_path, **extra):
+    """
+    Create the state dict that travels through the pipeline for one page.
+    Extra keyword arguments are stored on the page as-is.
+    """
+    page = {'index': index, 'path': image_path}
+    page.update(extra)
+    return page
+
+def decode_page(page, cache_dir=NORMALIZED_CACHE_DIR):
+    """
+    Read and decode the page once; the same array is used by detection, OCR and rendering.
+    Pages carrying their encoded bytes in ``page['data']``, or an ``archive`` and ``member``
+    name, are decoded from memory instead of from ``page['path']``. Unreadable pages are dropped.
+    """
+    if 'data' in page:
+        image, input_hash = decode_page_bytes(page.pop('data'), page['path'], cache_dir=cache_dir)
+    elif 'member' in page:
+        data = read_archive_member(page['archive'], page['member'])
+        image, input_hash = decode_page_bytes(data, page['path'], cache_dir=cache_dir)
+    else:
+        image, input_hash = load_page(page['path'], cache_dir=cache_dir)
+    if image is None:
+        logging.warning(f"Could not read image: {page['path']}")
+        return None
+    page['image'] = image
+    page['input_hash'] = input_hash
+    return page
+
+def detect_pages(pages, model, batch_size=DETECTION_BATCH_SIZE, imgsz=DETECTION_IMAGE_SIZE, tiling=DETECTION_TILING):
+    """
+    Run YOLO on the decoded pages in batches and keep the boxes and class ids.
+    Tall strips and huge scans are detected in overlapping tiles (see ``detect_text_regions_tiled``).
+    """
+    detections = detect_text_regions_tiled(model, [page['image'] for page in pages],
+                                           batch_size=batch_size, imgsz=imgsz, tiling=tiling)
+    for page, (boxes, classes) in zip(pages, detections):
+        page['boxes'] = boxes
+        page['classes'] = classes
+        page['sorted_boxes'] = sort_bubbles(boxes)
+    return pages
+
+def ocr_pages(pages, ocr_engine, preprocessor=None, ocr_cache=None):
+    """
+    OCR every text region (class 3 only) of the given pages in shared batches and
+    keep the results that pass validation. Regions whose image statistics already fail
+    validation are screened out before OCR; their count is kept in ``page['screened_out']``.
+    With a CropPreprocessor, the OCR engine sees the preprocessed crops while validation
+    still checks the raw ones. With an OcrCache, recurring crops are answered from the
+    cache; their count is kept in ``page['ocr_cache_hits']``.
+    """
+    crops = []
+    for page in pages:
+        page['text_regions'] = []
+        image = page['image']
+        boxes = [
+            tuple(map(int, box)) for box, cls_id in zip(page['boxes'], page['classes'])
+            if int(cls_id) == 3
+        ]
+        with metrics.stage('ocr.screen'):
+            keep = screen_regions(image, boxes)
+        page['screened_out'] = keep.count(False)
+        metrics.count('ocr.screened_out', page['screened_out'])
+        for (x1, y1, x2, y2), passed in zip(boxes, keep):
+            if passed:
+                crops.append((page, image[y1:y2, x1:x2], (x1, y1, x2, y2), 3))
+    metrics.count('ocr.screened_in', len(crops))
+    ocr_inputs = [cropped for _, cropped, _, _ in crops]
+    if preprocessor is not None:
+        ocr_inputs = preprocessor(ocr_inputs)
+    if ocr_cache is not None and crops:
+        texts, hits = ocr_cache.recognize(ocr_inputs, ocr_engine)
+    else:
+        texts, hits = (ocr_engine(ocr_inputs) if crops else []), [False] * len(crops)
+    for page in pages:
+        page['ocr_cache_hits'] = 0
+    for (page, _, _, _), hit in zip(crops, hits):
+        page['ocr_cache_hits'] += hit
+    for (page, cropped, coords, cls_id), text in zip(crops, texts):
+        is_valid = validate_ocr_result(text, cropped) and verify_japanese_text(text)
+        if not is_valid:
+            continue
+        page['text_regions'].append({'text': text, 'coords': coords, 'class': cls_id})
+    return pages
+
+def group_sentences(text_regions):
+    """
+    Clean and split OCR text into sentences, grouped by region, and collect the unique sentences.
+
+    Returns:
+        tuple: (region_to_sentences dict, list of unique (region_id, sentence) pairs)
+    """
+    cleaned_text_regions = []
+    for i, region in enumerate(text_regions):
+        cleaned_text = clean_ocr_text(region['text'])
+        formatted_text = split_japanese_sentences(cleaned_text)
+        if formatted_text.strip():
+            cleaned_text_regions.append({'id': i, 'text': formatted_text, 'coords': region['coords']})
+    region_to_sentences = {}
+    for region in cleaned_text_regions:
+        sentences = region['text'].split('\n')
+        valid_sentences = [s for s in sentences if s.strip()]
+        if valid_sentences:
+            region_to_sentences[region['id']] = {'sentences': valid_sentences, 'coords': region['coords']}
+    all_sentences = []
+    for region_id, region_data in region_to_sentences.items():
+        for sentence in region_data['sentences']:
+            all_sentences.append((region_id, sentence))
+    unique_sentences = []
+    index = SimilarityIndex()
+    for region_id, sentence in all_sentences:
+        if index.find_duplicate(sentence) is None:
+            index.add(sentence)
+            unique_sentences.append((region_id, sentence))
+    return region_to_sentences, unique_sentences
+
+def map_translations(region_to_sentences, translation_map):
+    """
+    Map sentence translations back onto the regions they came from.
+
+    Returns:
+        dict: region_id -> {'original', 'translation', 'coords'}
+    """
+    region_translations = {}
+    index = SimilarityIndex()
+    for original in translation_map:
+        index.add(original)
+    for region_id, region_data in region_to_sentences.items():
+        sentences = region_data['sentences']
+        translations = []
+        for sentence in sentences:
+            if not sentence.strip():
+                continue
+            if not is_sfx(sentence) and sentence.strip() in ['！', '。', '、', '．．．']:
+                continue
+            if sentence in translation_map:
+                translations.append(translation_map[sentence])
+            else:
+                best_match, _ = index.best_match(sentence)
+                if best_match:
+                    translations.append(translation_map[best_match])
+        if translations:
+            combined_translation = ' '.join(translations)
+            is_sfx_region = any(is_sfx(s) for s in sentences)
+            final_translation = post_process_translation(combined_translation, "sfx" if is_sfx_region else None)
+            region_translations[region_id] = {
+                'original': "\n".join(sentences),
+                'translation': final_translation,
+                'coords': region_data['coords']
+            }
+    return region_translations
+
+def translate_pages(pages, translator_deepl, cache=None, formatter=None):
+    """
+    Clean and deduplicate each page's sentences, translate the sentences of all given
+    pages in bulk, then map the translations back to each page's regions.
+    ``formatter`` is the MangaFormatter holding the series glossary (None uses the built-in one).
+    The number of a page's sentences whose translation request failed is kept in
+    ``page['translation_failures']``; such pages are still rendered with what did translate.
+    """
+    grouped = [group_sentences(page['text_regions']) for page in pages]
+    sentences = [sentence for _, unique_sentences in grouped for _, sentence in unique_sentences]
+    translations = dict(zip(sentences, translate_batch(sentences, translator_deepl, cache=cache, formatter=formatter)))
+    for page, (region_to_sentences, unique_sentences) in zip(pages, grouped):
+        translation_map = {}
+        page['translation_failures'] = 0
+        for _, sentence in unique_sentences:
+            if translations.get(sentence):
+                translation_map[sentence] = translations[sentence]
+            elif translations[sentence] is None:
+                page['translation_failures'] += 1
+        page['region_translations'] = map_translations(region_to_sentences, translation_map)
+        if page['translation_failures']:
+            logging.warning(f"{page['translation_failures']} sentences of {page['path']} could not be translated")
+    return pages
+
+def render_page(page, font_path=FONT_PATH, keep_original=False):
+    """
+    Overlay the translations onto the page in a single compositing pass.
+    The page is drawn on in place unless the original is still needed for a comparison image.
+    """
+    image = page['image'].copy() if keep_original else page['image']
+    page['translated_image'] = composite_translations(image, page['region_translations'], font_path=font_path)
+    return page
+
+def write_page(page, output_dir=TRANSLATED_DIR, manifest=None, comparison_writer=None, archive_writer=None):
+    """
+    Save the translated page, and queue its side-by-side comparison if a ComparisonWriter is given.
+    With an ArchiveWriter the page is encoded in memory and stored in the output archive under
+    its member name, in page order, instead of being written to ``output_dir``.
+    If a RunManifest is given, the finished page is recorded in it, unless some of its
+    translations failed, so the next run processes it again.
+    """
+    if archive_writer is not None:
+        member = page.get('member', os.path.basename(page['path']))
+        ok, encoded = cv2.imencode(os.path.splitext(member)[1] or '.png', page['translated_image'])
+        if not ok:
+            raise ValueError(f"Could not encode translated page {page['path']}")
+        archive_writer.add(member, encoded.tobytes(), page['index'])
+        output_path = f"{archive_writer.path}:{member}"
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, f"translated_{os.path.basename(page['path'])}")
+        cv2.imwrite(output_path, page['translated_image'])
+    logging.info(f"Saved translated image to: {output_path}")
+    page['output_path'] = output_path
+    if comparison_writer is not None:
+        comparison_writer.submit(page['path'], page['image'], page['translated_image'], page.get('member'))
+    if manifest is not None and not page.get('translation_failures'):
+        manifest.record(page['path'], page['input_hash'], page['fingerprint'], output_path)
+    # Drop the large arrays so finished pages don't pile up in memory
+    page.pop('image', None)
+    page.pop('translated_image', None)
+    return page
+
+def build_stages(models, translate_workers=1,
+                 detect_batch_size=DETECTION_BATCH_SIZE, detect_imgsz=DETECTION_IMAGE_SIZE, detect_tiling=DETECTION_TILING,
+                 translation_cache=None, translation_window=TRANSLATION_PAGE_WINDOW, manifest=None,
+                 comparison_writer=None, output_dir=TRANSLATED_DIR, archive_writer=None,
+                 ocr_preprocess=OCR_PREPROCESS_PROFILE, formatting_glossary=None, artifact_store=None,
+                 ocr_cache=None):
+    """
+    Build the default decode -> detect -> OCR -> translate -> render -> write stage list.
+
+    Args:
+        models (LazyModels): Source of the detector, OCR engine and translator, loaded on first use
+        translate_workers (int): Worker threads for the network-bound translation stage
+        detect_batch_size (int): Pages per YOLO forward pass
+        detect_imgsz (int): Inference size pages are letterboxed to
+        detect_tiling (str): 'auto', 'always' or 'off' tiled detection of tall and huge pages
+        translation_cache (TranslationCache): Cache consulted before any translation request
+        translation_window (int): Pages whose sentences are sent to the translator together
+        manifest (RunManifest): Manifest finished pages are recorded in
+        comparison_writer (ComparisonWriter): Writer for comparison images (None disables them)
+        output_dir (str): Directory translated pages are written to
+        archive_writer (ArchiveWriter): Output archive pages are streamed into instead of output_dir
+        ocr_preprocess (str): Crop preprocessing profile applied before OCR ('none', 'fast' or 'quality')
+        formatting_glossary (str): Glossary of names, phrases and honorifics for formatting translations
+        artifact_store (ArtifactStore): Store of earlier detection/OCR/translation results; pages
+            restored from it start after the latest stage whose stored result is still valid
+        ocr_cache (OcrCache): Perceptual-hash cache of OCR results consulted before the OCR model
+
+    Returns:
+        list: Stage objects in processing order
+    """
+    preprocessor = CropPreprocessor(ocr_preprocess)
+    formatter = MangaFormatter.from_glossary(formatting_glossary) if formatting_glossary else None
+
+    def decode(page):
+        index = page['index']
+        page = decode_page(page)
+        if page is None:
+            if archive_writer is not None:
+                # Don't hold back the archive pages that follow an unreadable one
+                archive_writer.skip(index)
+        elif artifact_store is not None:
+            artifact_store.restore(page)
+        return page
+
+    # Models are only loaded once a stage has pages left to run on
+    return [
+        Stage('decode', per_page(decode)),
+        Stage('detect', with_artifacts('detect', lambda pages: detect_pages(pages, models.detector, detect_batch_size,
+                                                                            detect_imgsz, detect_tiling),
+                                       artifact_store),
+              batch_size=detect_batch_size),
+        # OCR takes the same page chunks as detection so crops from several pages share batches
+        Stage('ocr', with_artifacts('ocr', lambda pages: ocr_pages(pages, lambda crops: models.ocr_engine(crops),
+                                                                   preprocessor, ocr_cache),
+                                    artifact_store),
+              batch_size=detect_batch_size),
+        Stage('translate', with_artifacts('translate', lambda pages: translate_pages(pages, models.translator,
+                                                                                  translation_cache, formatter),
+                                          artifact_store),
+              workers=translate_workers, batch_size=translation_window),
+        Stage('render', per_page(lambda page: render_page(page, keep_original=comparison_writer is not None))),
+        Stage('write', per_page(lambda page: write_page(page, output_dir, manifest, comparison_writer,
+                                                        archive_writer))),
+    ]
+
+def _run_stage(stage, batch):
+    """
+    Call a stage on a batch of pages, timing it and splitting the time between the pages.
+    """
+    with metrics.stage(stage.name, pages=[os.path.basename(page['path']) for page in batch]):
+        return stage.func(batch)
+
+def _chunks(items, size):
+    # Works on any iterable and only pulls the next chunk when asked, so lazily
+    # produced pages are never all read up front
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def run_sequential(pages, stages):
+    """
+    Run pages through all stages in the calling thread, one chunk of pages at a time.
+    The chunk size is the largest stage batch size, so memory stays bounded to one chunk.
+
+    Returns:
+        list: Pages that made it through every stage, in input order
+    """
+    chunk_size = max(stage.batch_size for stage in stages)
+    finished = []
+    for chunk in _chunks(pages, chunk_size):
+        for stage in stages:
+            chunk = [page for batch in _chunks(chunk, stage.batch_size) for page in _run_stage(stage, batch)]
+        finished.extend(chunk)
+    return finished
+
+def run_isolated(pages, stages):
+    """
+    Run pages through all stages like ``run_sequential``, but keep a failing page from
+    taking the others down with it. When a stage call fails on a batch of several pages,
+    only that batch is run through the stage again one page at a time; pages of earlier
+    stages and other batches are not run again, so no page is processed or written twice.
+
+    Returns:
+        tuple: (pages that made it through every stage in input order,
+                list of (page, exception) for the pages that failed)
+    """
+    failed = []
+    for stage in stages:
+        survivors = []
+        for batch in _chunks(pages, stage.batch_size):
+            try:
+                survivors.extend(_run_stage(stage, batch))
+                continue
+            except Exception as e:
+                if len(batch) == 1:
+                    failed.append((batch[0], e))
+                    continue
+                logging.warning(f"Stage '{stage.name}' failed on a batch of {len(batch)} pages ({e}); "
+                                f"retrying them one at a time")
+            for page in batch:
+                try:
+                    survivors.extend(_run_stage(stage, [page]))
+                except Exception as e:
+                    failed.append((page, e))
+        pages = survivors
+    return pages, failed
+
+def run_pipelined(pages, stages, queue_size=4):
+    """
+    Run every stage in its own group of worker threads, connected by bounded queues.
+    A full queue blocks the upstream stage, so at most ``queue_size`` pages wait between
+    two stages while page N+1 is detected as page N is being translated.
+
+    Args:
+        pages (iterable): Page dicts created with ``make_page``
+        stages (list): Stage objects in processing order
+        queue_size (int): Capacity of each queue between stages
+
+    Returns:
+        list: Pages that made it through every stage, in input order
+
+    Raises:
+        Exception: The first exception raised by any stage. No new pages are fed in once a
+            stage has failed; the pages already in flight drain first
+    """
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(len(stages) + 1)]
+    errors = []
+    errors_lock = threading.Lock()
+
+    def feed():
+        for page in pages:
+            # The run fails anyway, so don't start pages whose output would be thrown away
+            # (and that an ArchiveWriter would hold back behind the failed page)
+            if errors:
+                break
+            queues[0].put(page)
+        for _ in range(stages[0].workers):
+            queues[0].put(_STOP)
+
+    def work(stage, inbox, outbox):
+        stopped = False
+        while not stopped:
+            batch = []
+            item = inbox.get()
+            if item is _STOP:
+                break
+            batch.append(item)
+            # Pull whatever else is already waiting, up to the batch size
+            while len(batch) < stage.batch_size:
+                try:
+                    item = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopped = True
+                    break
+                batch.append(item)
+            try:
+                results = _run_stage(stage, batch)
+            except Exception as e:
+                logging.error(f"Stage '{stage.name}' failed on {[page['path'] for page in batch]}: {e}")
+                with errors_lock:
+                    errors.append(e)
+                continue
+            for page in results:
+                outbox.put(page)
+
+    finished = []
+
+    def collect():
+        while True:
+            item = queues[-1].get()
+            if item is _STOP:
+                break
+            finished.append(item)
+
+    feeder = threading.Thread(target=feed, name='pipeline-feed', daemon=True)
+    collector = threading.Thread(target=collect, name='pipeline-collect', daemon=True)
+    groups = []
+    for i, stage in enumerate(stages):
+        group = [
+            threading.Thread(target=work, args=(stage, queues[i], queues[i + 1]),
+                             name=f'pipeline-{stage.name}-{n}', daemon=True)
+            for n in range(stage.workers)
+        ]
+        groups.append(group)
+
+    feeder.start()
+    collector.start()
+    for group in groups:
+        for thread in group:
+            thread.start()
+
+    # Once every worker of a stage has stopped, tell the next stage's workers to stop too
+    feeder.join()
+    for i, group in enumerate(groups):
+        for thread in group:
+            thread.join()
+        downstream = stages[i + 1].workers if i + 1 < len(stages) else 1
+        for _ in range(downstream):
+            queues[i + 1].put(_STOP)
+    collector.join()
+
+    if errors:
+        raise errors[0]
+    finished.sort(key=lambda page: page['index'])
+    return finished
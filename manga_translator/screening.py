@@ -0,0 +1,105 @@
+# Import required libraries for screening text regions before OCR
+import cv2
+import numpy as np
+from manga_translator.config import OCR_SCREENING_MARGIN, PAGE_BAND_HEIGHT
+from manga_translator.image_utils import bands
+from manga_translator.ocr import MIN_LAPLACIAN_VARIANCE, MIN_CONTRAST, MIN_TEXT_DENSITY
+
+def _box_sum(table, x1, y1, x2, y2):
+    # Sum over [y1:y2, x1:x2] from a summed-area table with a leading row and column of zeros
+    return table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1]
+
+def region_statistics(image, boxes, band_height=PAGE_BAND_HEIGHT):
+    """
+    Compute the Laplacian variance, contrast and dark-pixel density that
+    ``validate_ocr_result`` checks, for every box of a page at once.
+
+    The Laplacian is taken once over the page area around the boxes, and summed-area tables
+    of the Laplacian, its square and the dark-pixel mask give each box's sums in four
+    lookups, however large the box. Contrast comes from ``cv2.minMaxLoc`` on a view of the
+    box. Tables are built per horizontal band of boxes, so memory stays bounded on long
+    webtoon strips.
+
+    The Laplacian at a box edge sees the real neighbouring pixels instead of the
+    reflected border a separate crop would use, so the variance can differ slightly from
+    ``validate_ocr_result``'s value; density and contrast are exact.
+
+    Args:
+        image (numpy.ndarray): BGR or grayscale page
+        boxes (list): (x1, y1, x2, y2) integer boxes
+        band_height (int): Approximate height of one band of summed-area tables
+
+    Returns:
+        list: One dict per box with 'laplacian_var', 'contrast' and 'text_density'
+              (None for empty boxes)
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    page_height, page_width = gray.shape[:2]
+    boxes = [
+        (max(0, x1), max(0, y1), min(page_width, x2), min(page_height, y2))
+        for x1, y1, x2, y2 in boxes
+    ]
+    stats = [None] * len(boxes)
+    for band in bands([(y1, y2) for _, y1, _, y2 in boxes], band_height):
+        band = [i for i in band if boxes[i][2] > boxes[i][0] and boxes[i][3] > boxes[i][1]]
+        if not band:
+            continue
+        # One pixel of context around the band so the Laplacian inside matches the page-level one
+        left = max(0, min(boxes[i][0] for i in band) - 1)
+        top = max(0, min(boxes[i][1] for i in band) - 1)
+        right = min(page_width, max(boxes[i][2] for i in band) + 1)
+        bottom = min(page_height, max(boxes[i][3] for i in band) + 1)
+        window = gray[top:bottom, left:right]
+        # The 3x3 Laplacian of 8-bit pixels fits in int16, and its square is exact in float32;
+        # two single integrals of those are faster than integral2 over a float64 Laplacian
+        laplacian = cv2.Laplacian(window, cv2.CV_16S).astype(np.float32)
+        lap_sum = cv2.integral(laplacian, sdepth=cv2.CV_64F)
+        lap_sqsum = cv2.integral(cv2.multiply(laplacian, laplacian), sdepth=cv2.CV_64F)
+        dark_sum = cv2.integral((window < 128).astype(np.uint8))
+        for i in band:
+            x1, y1, x2, y2 = boxes[i]
+            area = (x2 - x1) * (y2 - y1)
+            wx1, wy1, wx2, wy2 = x1 - left, y1 - top, x2 - left, y2 - top
+            mean = _box_sum(lap_sum, wx1, wy1, wx2, wy2) / area
+            variance = _box_sum(lap_sqsum, wx1, wy1, wx2, wy2) / area - mean * mean
+            min_val, max_val, _, _ = cv2.minMaxLoc(gray[y1:y2, x1:x2])
+            stats[i] = {
+                'laplacian_var': max(0.0, variance),
+                'contrast': max_val - min_val,
+                'text_density': _box_sum(dark_sum, wx1, wy1, wx2, wy2) / area,
+            }
+    return stats
+
+def _laplacian_var(gray, x1, y1, x2, y2):
+    # Exactly the variance validate_ocr_result computes on the crop, reflected border included
+    return cv2.Laplacian(gray[y1:y2, x1:x2], cv2.CV_64F).var()
+
+def screen_regions(image, boxes, margin=OCR_SCREENING_MARGIN):
+    """
+    Decide for every box whether it can possibly pass ``validate_ocr_result``, before any
+    OCR is spent on it. Contrast and density use the exact thresholds. A box whose page-level
+    Laplacian variance reaches ``margin`` times the sharpness threshold is kept; one below
+    it is only rejected after the variance of the crop itself, computed exactly as validation
+    does, confirms it (the page-level value can differ a lot at the box edges, see
+    ``region_statistics``). So a box is never rejected that validation would accept.
+
+    Args:
+        image (numpy.ndarray): BGR or grayscale page
+        boxes (list): (x1, y1, x2, y2) integer boxes
+        margin (float): Share of MIN_LAPLACIAN_VARIANCE above which a box is kept without the exact check
+
+    Returns:
+        list: True for boxes worth sending to OCR
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    page_height, page_width = gray.shape[:2]
+    keep = []
+    for (x1, y1, x2, y2), stats in zip(boxes, region_statistics(gray, boxes)):
+        if stats is None or stats['contrast'] < MIN_CONTRAST or stats['text_density'] < MIN_TEXT_DENSITY:
+            keep.append(False)
+        elif stats['laplacian_var'] >= MIN_LAPLACIAN_VARIANCE * margin:
+            keep.append(True)
+        else:
+            box = (max(0, x1), max(0, y1), min(page_width, x2), min(page_height, y2))
+            keep.append(bool(_laplacian_var(gray, *box) >= MIN_LAPLACIAN_VARIANCE))
+    return keep
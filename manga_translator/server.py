@@ -0,0 +1,305 @@
+# Import required libraries for the long-running translation service
+import json
+import time
+import queue
+import base64
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import cv2
+from manga_translator.config import (
+    FONT_PATH, DETECTION_IMAGE_SIZE, DETECTION_TILING, OCR_PREPROCESS_PROFILE, SERVER_HOST, SERVER_PORT,
+    SERVER_MAX_BATCH_SIZE, SERVER_MAX_WAIT_MS, SERVER_MAX_UPLOAD_BYTES
+)
+from manga_translator.metrics import metrics
+from manga_translator.image_utils import CropPreprocessor
+from manga_translator.text_utils import MangaFormatter
+from manga_translator.pipeline import make_page, decode_page, detect_pages, ocr_pages, translate_pages, render_page
+
+# Marker placed on a batcher's queue to stop its thread
+_STOP = object()
+
+class StageBatcher:
+    """
+    Coalesces pages submitted by concurrent requests into one call of a stage function.
+    A batch is sent as soon as it is full or the first page in it has waited ``max_wait``
+    seconds, so a lone request pays at most ``max_wait`` extra latency while busy periods
+    get full batches. If the stage fails on a batch, its pages are run again one at a time,
+    so only the requests whose page actually fails get the error.
+
+    Args:
+        name (str): Stage name used in metrics
+        func (callable): Stage function taking and returning a list of pages, in order
+        max_batch_size (int): Maximum pages per call
+        max_wait (float): Seconds the first page of a batch waits for others to join
+    """
+    def __init__(self, name, func, max_batch_size=SERVER_MAX_BATCH_SIZE, max_wait=SERVER_MAX_WAIT_MS / 1000):
+        self.name = name
+        self.func = func
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f'batcher-{name}', daemon=True)
+        self._thread.start()
+
+    def submit(self, page):
+        """
+        Run the stage on ``page`` as part of the next batch and wait for it.
+
+        Returns:
+            dict: The page after the stage
+
+        Raises:
+            Exception: Whatever the stage function raised for this page
+        """
+        future = Future()
+        self._queue.put((page, future))
+        return future.result()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Finish this batch first, then stop on the next collect
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+            pages = [page for page, _ in batch]
+            metrics.count(f'server.{self.name}.batches')
+            metrics.count(f'server.{self.name}.pages', len(pages))
+            try:
+                with metrics.stage(f'server.{self.name}', batch=len(pages)):
+                    # Stage functions update the pages in place
+                    self.func(pages)
+            except Exception as e:
+                if len(batch) == 1:
+                    logging.error(f"Stage '{self.name}' failed on {pages[0]['path']}: {e}")
+                    batch[0][1].set_exception(e)
+                    continue
+                # Find the failing pages, so one bad upload doesn't fail its neighbours' requests
+                logging.warning(f"Stage '{self.name}' failed on a batch of {len(pages)} pages ({e}); "
+                                f"retrying them one at a time")
+                metrics.count(f'server.{self.name}.batch_retries')
+                for page, future in batch:
+                    try:
+                        self.func([page])
+                    except Exception as page_error:
+                        logging.error(f"Stage '{self.name}' failed on {page['path']}: {page_error}")
+                        future.set_exception(page_error)
+                    else:
+                        future.set_result(page)
+                continue
+            for page, future in batch:
+                future.set_result(page)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+class TranslationService:
+    """
+    Keeps the detector, OCR engine and translator warm and translates single pages for
+    concurrent callers. Detection, OCR and translation each go through a StageBatcher,
+    so pages arriving at about the same time share forward passes and translation requests.
+    Decoding and rendering run on the caller's thread.
+
+    Args:
+        models (LazyModels): Source of the detector, OCR engine and translator
+        translation_cache (TranslationCache): Cache consulted before any translation request
+        max_batch_size (int): Maximum pages per detection/OCR/translation call
+        max_wait (float): Seconds a page waits for others to join its batch
+        detect_imgsz (int): Inference size pages are letterboxed to
+        detect_tiling (str): 'auto', 'always' or 'off' tiled detection of tall and huge pages
+        font_path (str): Font used for the translated text
+        ocr_preprocess (str): Crop preprocessing profile applied before OCR ('none', 'fast' or 'quality')
+        formatting_glossary (str): Glossary of names, phrases and honorifics for formatting translations
+        ocr_cache (OcrCache): Perceptual-hash cache of OCR results consulted before the OCR model
+    """
+    def __init__(self, models, translation_cache=None, max_batch_size=SERVER_MAX_BATCH_SIZE,
+                 max_wait=SERVER_MAX_WAIT_MS / 1000, detect_imgsz=DETECTION_IMAGE_SIZE, detect_tiling=DETECTION_TILING,
+                 font_path=FONT_PATH, ocr_preprocess=OCR_PREPROCESS_PROFILE,
+                 formatting_glossary=None, ocr_cache=None):
+        self.models = models
+        self.translation_cache = translation_cache
+        self.ocr_cache = ocr_cache
+        self.font_path = font_path
+        self.started = time.time()
+        self._ids = itertools.count()
+        preprocessor = CropPreprocessor(ocr_preprocess)
+        formatter = MangaFormatter.from_glossary(formatting_glossary) if formatting_glossary else None
+        self.batchers = [
+            StageBatcher('detect', lambda pages: detect_pages(pages, models.detector, max_batch_size, detect_imgsz,
+                                                              detect_tiling),
+                         max_batch_size, max_wait),
+            StageBatcher('ocr', lambda pages: ocr_pages(pages, models.ocr_engine, preprocessor, ocr_cache),
+                         max_batch_size, max_wait),
+            StageBatcher('translate',
+                         lambda pages: translate_pages(pages, models.translator, translation_cache, formatter),
+                         max_batch_size, max_wait),
+        ]
+
+    def translate_page(self, data, name='upload'):
+        """
+        Translate one encoded page.
+
+        Args:
+            data (bytes): Encoded page image (PNG, JPEG, ...)
+            name (str): Name used in log messages
+
+        Returns:
+            tuple: (PNG bytes of the translated page, list of region dicts, number of
+                    sentences whose translation request failed and were left untranslated)
+
+        Raises:
+            ValueError: If the image cannot be decoded
+        """
+        page = make_page(next(self._ids), name, data=data)
+        with metrics.stage('server.request'):
+            if decode_page(page, cache_dir=None) is None:
+                raise ValueError("Could not decode the uploaded image")
+            for batcher in self.batchers:
+                batcher.submit(page)
+            render_page(page, font_path=self.font_path)
+            ok, encoded = cv2.imencode('.png', page['translated_image'])
+        metrics.count('server.requests')
+        if not ok:
+            raise ValueError("Could not encode the translated image")
+        regions = [
+            {
+                'id': int(region_id),
+                'original': region['original'],
+                'translation': region['translation'],
+                'coords': [int(v) for v in region['coords']],
+            }
+            for region_id, region in sorted(page['region_translations'].items())
+        ]
+        return encoded.tobytes(), regions, page.get('translation_failures', 0)
+
+    def health(self):
+        """
+        Describe the service state for the health endpoint.
+        """
+        health = {
+            'status': 'ok',
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'models_loaded': sorted(self.models.load_times),
+            'pending': {batcher.name: batcher.pending() for batcher in self.batchers},
+        }
+        if self.ocr_cache is not None:
+            health['ocr_cache'] = self.ocr_cache.stats()
+        return health
+
+    def close(self):
+        for batcher in self.batchers:
+            batcher.close()
+
+class TranslationRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP front end of a TranslationService:
+
+    - ``POST /translate`` with the page image as the request body returns JSON with the
+      translated page as base64 PNG, the translated regions and the number of sentences
+      whose translation failed (``translation_failures``; those regions are left untranslated)
+    - ``GET /health`` returns the service state as JSON
+    - ``GET /metrics`` returns stage timings and counters in the Prometheus text format
+    """
+    server_version = 'MangaFlow'
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, self.server.service.health())
+        elif path == '/metrics':
+            self._send(200, metrics.prometheus_text().encode('utf-8'), 'text/plain; version=0.0.4')
+        else:
+            self._send_json(404, {'error': f"Unknown path {path}"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path != '/translate':
+            self._send_json(404, {'error': f"Unknown path {path}"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            self._send_json(400, {'error': "Request body must contain the page image"})
+            return
+        if length > SERVER_MAX_UPLOAD_BYTES:
+            self._send_json(413, {'error': f"Page larger than {SERVER_MAX_UPLOAD_BYTES} bytes"})
+            return
+        data = self.rfile.read(length)
+        start = time.perf_counter()
+        try:
+            image, regions, failures = self.server.service.translate_page(
+                data, name=self.headers.get('X-Page-Name', 'upload')
+            )
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            logging.error(f"Translation request failed: {e}")
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {
+            'regions': regions,
+            'translation_failures': failures,
+            'image': base64.b64encode(image).decode('ascii'),
+            'seconds': round(time.perf_counter() - start, 4),
+        })
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} - {format % args}")
+
+def serve(service, host=SERVER_HOST, port=SERVER_PORT):
+    """
+    Serve ``service`` over HTTP until interrupted.
+
+    Args:
+        service (TranslationService): The warm service answering requests
+        host (str): Interface to bind to
+        port (int): Port to listen on
+    """
+    httpd = ThreadingHTTPServer((host, port), TranslationRequestHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    logging.info(f"Serving on http://{host}:{httpd.server_address[1]}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.close()
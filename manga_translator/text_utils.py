@@ -1,4 +1,7 @@
 import re
+import json
+import logging
+from collections import defaultdict
 from difflib import SequenceMatcher
 import textwrap
 
@@ -28,74 +31,305 @@ def is_similar(a, b, threshold=0.8):
     # Use difflib's SequenceMatcher to compare similarity
     return SequenceMatcher(None, a, b).ratio() > threshold
 
-def manga_style_formatting(text):
+def similarity_ratio(a, b, threshold=0.0):
     """
-    Apply universal manga-specific formatting rules.
+    Return the SequenceMatcher similarity ratio of two strings.
+    The cheap upper bounds are checked first, so pairs that cannot beat ``threshold``
+    return 0.0 without running the full matcher.
+    """
+    matcher = SequenceMatcher(None, a, b)
+    if matcher.real_quick_ratio() <= threshold or matcher.quick_ratio() <= threshold:
+        return 0.0
+    return matcher.ratio()
+
+class SimilarityIndex:
     """
+    Near-duplicate sentence index based on an inverted character n-gram index.
+    Instead of comparing a sentence with every stored sentence, candidates sharing the most
+    n-grams (and of compatible length) are shortlisted and only those are verified with
+    the real SequenceMatcher ratio.
+
+    Args:
+        threshold (float): Minimum ratio for two sentences to count as similar (exclusive, like is_similar)
+        ngram (int): Character n-gram size used for the inverted index
+        shortlist (int): Maximum number of candidates verified per query
+    """
+    def __init__(self, threshold=0.8, ngram=2, shortlist=32):
+        self.threshold = threshold
+        self.ngram = ngram
+        self.shortlist = shortlist
+        self.texts = []
+        self._exact = {}
+        self._postings = defaultdict(list)
+
+    def _ngrams(self, text):
+        if len(text) <= self.ngram:
+            return {text}
+        return {text[i:i + self.ngram] for i in range(len(text) - self.ngram + 1)}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, text):
+        """
+        Add a sentence to the index. Exact repeats are stored once.
+        """
+        if text in self._exact:
+            return
+        text_id = len(self.texts)
+        self.texts.append(text)
+        self._exact[text] = text_id
+        for gram in self._ngrams(text):
+            self._postings[gram].append(text_id)
+
+    def _candidates(self, text):
+        # A ratio above the threshold bounds the length ratio of the two strings
+        low = len(text) * self.threshold / (2 - self.threshold)
+        high = len(text) * (2 - self.threshold) / max(self.threshold, 1e-9)
+        counts = defaultdict(int)
+        for gram in self._ngrams(text):
+            for text_id in self._postings.get(gram, ()):
+                counts[text_id] += 1
+        ranked = sorted(
+            (text_id for text_id in counts if low <= len(self.texts[text_id]) <= high),
+            key=lambda text_id: (-counts[text_id], text_id)
+        )
+        return ranked[:self.shortlist]
+
+    def best_match(self, text):
+        """
+        Find the stored sentence most similar to ``text`` above the threshold.
+
+        Returns:
+            tuple: (matching sentence, ratio), or (None, 0.0) if nothing is similar enough
+        """
+        if text in self._exact:
+            return text, 1.0
+        best, best_score = None, 0.0
+        for text_id in self._candidates(text):
+            score = similarity_ratio(text, self.texts[text_id], self.threshold)
+            if score > self.threshold and score > best_score:
+                best, best_score = self.texts[text_id], score
+        return best, best_score
+
+    def find_duplicate(self, text):
+        """
+        Return a stored sentence similar to ``text`` above the threshold, or None.
+        Stops at the first verified candidate instead of ranking them all.
+        """
+        if text in self._exact:
+            return text
+        for text_id in self._candidates(text):
+            if similarity_ratio(text, self.texts[text_id], self.threshold) > self.threshold:
+                return self.texts[text_id]
+        return None
 
-    # Honorifics commonly used in manga
-    manga_terms = {
-        'sama': '-sama',
-        'san': '-san',
-        'kun': '-kun',
-        'chan': '-chan',
-        'sensei': '-sensei',
-        'senpai': '-senpai',
-        'kouhai': '-kouhai',
-        'dono': '-dono',
-        'shi': '-shi',
-    }
-
-    # Mapping Japanese character names to English equivalents
-    character_names = {
-        'カイドウ': 'Kaido',
-        'モンキー・ロ・ルフィ': 'Monkey D. Luffy',
-        '海賊王': 'Pirate King'
-    }
-
-    # Mapping of common Japanese words/phrases to their English manga-style translations
-    phrase_map = {
-        'お前': 'you',
-        'おれ': 'I',
-        '俺': 'I',
-        'あいつ': 'that guy',
-        'ばか': 'idiot',
-        'くそ': 'damn',
-        'ちくしょう': 'shit',
-        'なに': 'what',
-        'なにぃ': 'whaaat',
-        'やった': 'hell yeah',
-        'うるさい': 'shut up',
-        'やれやれ': 'good grief',
-        'はい': 'yeah',
-        'いいえ': 'nah',
-    }
-
-    formatted_text = text
-
-    # Replace Japanese character names with English equivalents
-    for jp, en in character_names.items():
-        formatted_text = formatted_text.replace(jp, en)
-
-    # Replace known Japanese phrases with English translations
-    for jp, en in phrase_map.items():
-        formatted_text = formatted_text.replace(jp, en)
-
-    # Replace honorifics like 'san', 'chan' with '-san', '-chan' etc.
-    for key, val in manga_terms.items():
-        formatted_text = re.sub(rf'\b{key}\b', val, formatted_text, flags=re.IGNORECASE)
-
-    # Replace multiple dots with ellipses and normalize excessive punctuation
-    formatted_text = formatted_text.replace('...', '…')
-    formatted_text = re.sub(r'([!?]){2,}', r'\1', formatted_text)
-    formatted_text = re.sub(r'\?+!+|\!+\?+', '?!', formatted_text)
-    formatted_text = re.sub(r'(?<!\.)\.\.(?!\.)', '…', formatted_text)
-
-    # Convert to uppercase if text contains an exclamation mark (shouting emphasis)
-    if '!' in formatted_text:
-        formatted_text = formatted_text.upper()
-
-    return formatted_text
+# Honorifics commonly used in manga
+DEFAULT_HONORIFICS = {
+    'sama': '-sama',
+    'san': '-san',
+    'kun': '-kun',
+    'chan': '-chan',
+    'sensei': '-sensei',
+    'senpai': '-senpai',
+    'kouhai': '-kouhai',
+    'dono': '-dono',
+    'shi': '-shi',
+}
+
+# Mapping Japanese character names to English equivalents
+DEFAULT_CHARACTER_NAMES = {
+    'カイドウ': 'Kaido',
+    'モンキー・ロ・ルフィ': 'Monkey D. Luffy',
+    '海賊王': 'Pirate King'
+}
+
+# Mapping of common Japanese words/phrases to their English manga-style translations
+DEFAULT_PHRASES = {
+    'お前': 'you',
+    'おれ': 'I',
+    '俺': 'I',
+    'あいつ': 'that guy',
+    'ばか': 'idiot',
+    'くそ': 'damn',
+    'ちくしょう': 'shit',
+    'なに': 'what',
+    'なにぃ': 'whaaat',
+    'やった': 'hell yeah',
+    'うるさい': 'shut up',
+    'やれやれ': 'good grief',
+    'はい': 'yeah',
+    'いいえ': 'nah',
+}
+
+# Runs of sound-effect katakana (ドドド, ゴゴゴ, ...)
+SFX_PATTERN = re.compile(r'[ドゴバキガ]{2,}')
+
+# Punctuation rules applied after the glossary, in order
+PUNCTUATION_RULES = [
+    (re.compile(r'\.\.\.'), '…'),               # Three dots become an ellipsis
+    (re.compile(r'([!?]){2,}'), r'\1'),          # Collapse repeated ! or ?
+    (re.compile(r'\?+!+|\!+\?+'), '?!'),         # Normalize mixed ?! runs
+    (re.compile(r'(?<!\.)\.\.(?!\.)'), '…'),    # Two dots become an ellipsis
+]
+
+# Joins a batch of texts into one string; no glossary entry or punctuation rule can match it
+_BATCH_SEPARATOR = '\x00'
+
+def is_sfx(text):
+    """
+    Check if text contains a sound-effect katakana run.
+    """
+    return SFX_PATTERN.search(text) is not None
+
+def trie_pattern(words):
+    """
+    Build a regex source matching any of ``words``, with the alternatives nested by common
+    prefix. Matching at a position then costs the length of the match instead of the number
+    of words, and longer words are tried before their prefixes, so the longest word wins.
+    """
+    trie = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A word ends here: the longer continuations are optional and tried first
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+class MangaFormatter:
+    """
+    Compiled manga-style formatting: glossary replacement of character names, phrases and
+    honorifics, punctuation normalization and shouting in uppercase.
+    All glossary entries are compiled into one prefix-trie regex, so every text is scanned
+    once however large the glossary is; at each position the longest entry wins, and names
+    take precedence over phrases with the same source text. Honorifics only match as whole
+    words, ignoring case.
+
+    Args:
+        names (dict): Character names -> replacement (defaults to DEFAULT_CHARACTER_NAMES)
+        phrases (dict): Phrases -> replacement (defaults to DEFAULT_PHRASES)
+        honorifics (dict): Honorifics -> replacement (defaults to DEFAULT_HONORIFICS)
+    """
+    def __init__(self, names=None, phrases=None, honorifics=None):
+        self.names = dict(DEFAULT_CHARACTER_NAMES if names is None else names)
+        self.phrases = dict(DEFAULT_PHRASES if phrases is None else phrases)
+        self.honorifics = dict(DEFAULT_HONORIFICS if honorifics is None else honorifics)
+        self._terms = {**self.phrases, **self.names}
+        self._honorifics = {key.lower(): value for key, value in self.honorifics.items()}
+        parts = []
+        if self._terms:
+            parts.append(f'(?P<term>{trie_pattern(self._terms)})')
+        if self._honorifics:
+            parts.append(rf'\b(?P<honorific>(?i:{trie_pattern(self._honorifics)}))\b')
+        self._pattern = re.compile('|'.join(parts)) if parts else None
+
+    @classmethod
+    def from_glossary(cls, glossary_path):
+        """
+        Build a formatter from the defaults extended by a glossary file.
+        The file is either a JSON object with optional ``names``, ``phrases`` and
+        ``honorifics`` objects (a flat JSON object is read as names), or a tab-separated
+        text file with one ``source<TAB>replacement`` name per line, or
+        ``kind<TAB>source<TAB>replacement`` with kind ``name``, ``phrase`` or ``honorific``.
+
+        Args:
+            glossary_path (str): Path to the glossary
+
+        Returns:
+            MangaFormatter: The compiled formatter
+
+        Raises:
+            ValueError: If a line of a tab-separated glossary names an unknown kind
+        """
+        entries = {'names': {}, 'phrases': {}, 'honorifics': {}}
+        with open(glossary_path, encoding='utf-8') as f:
+            if glossary_path.lower().endswith('.json'):
+                data = json.load(f)
+                if entries.keys() & data.keys():
+                    for kind in entries:
+                        entries[kind].update(data.get(kind, {}))
+                else:
+                    entries['names'].update(data)
+            else:
+                kinds = {'name': 'names', 'phrase': 'phrases', 'honorific': 'honorifics'}
+                for number, line in enumerate(f, 1):
+                    line = line.rstrip('\n')
+                    if not line.strip() or line.startswith('#') or '\t' not in line:
+                        continue
+                    fields = line.split('\t')
+                    if len(fields) == 2:
+                        fields = ['name'] + fields
+                    if fields[0] not in kinds:
+                        raise ValueError(f"{glossary_path}:{number}: unknown glossary kind '{fields[0]}'")
+                    entries[kinds[fields[0]]][fields[1]] = '\t'.join(fields[2:])
+        formatter = cls(
+            names={**DEFAULT_CHARACTER_NAMES, **entries['names']},
+            phrases={**DEFAULT_PHRASES, **entries['phrases']},
+            honorifics={**DEFAULT_HONORIFICS, **entries['honorifics']},
+        )
+        logging.info(f"Loaded {sum(len(values) for values in entries.values())} formatting glossary entries "
+                     f"from {glossary_path}")
+        return formatter
+
+    def _replace(self, match):
+        if match.lastgroup == 'term':
+            return self._terms[match.group()]
+        return self._honorifics[match.group().lower()]
+
+    def _apply(self, text):
+        # Glossary replacement in one scan, then the punctuation rules
+        if self._pattern is not None:
+            text = self._pattern.sub(self._replace, text)
+        for pattern, replacement in PUNCTUATION_RULES:
+            text = pattern.sub(replacement, text)
+        return text
+
+    def format(self, text):
+        """
+        Apply the formatting to one text.
+        """
+        text = self._apply(text)
+        # Convert to uppercase if text contains an exclamation mark (shouting emphasis)
+        return text.upper() if '!' in text else text
+
+    def format_batch(self, texts):
+        """
+        Apply the formatting to a list of texts. The texts are joined and every rule runs
+        once over the whole batch instead of once per text.
+
+        Args:
+            texts (list): Texts to format
+
+        Returns:
+            list: Formatted texts, in input order
+        """
+        texts = list(texts)
+        if any(_BATCH_SEPARATOR in text for text in texts):
+            return [self.format(text) for text in texts]
+        if not texts:
+            return []
+        formatted = self._apply(_BATCH_SEPARATOR.join(texts)).split(_BATCH_SEPARATOR)
+        return [text.upper() if '!' in text else text for text in formatted]
+
+# Formatter with the built-in glossary, used when no glossary file is configured
+default_formatter = MangaFormatter()
+
+def manga_style_formatting(text, formatter=None):
+    """
+    Apply universal manga-specific formatting rules.
+    """
+    return (formatter or default_formatter).format(text)
 
 def smart_wrap(text, width):
     """
@@ -1,7 +1,30 @@
+import json
 import logging
 import re
-import deepl
-from manga_translator.text_utils import manga_style_formatting  # Custom formatting function for manga style
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from manga_translator.config import SOURCE_LANG, TARGET_LANG, DEEPL_MAX_TEXTS_PER_REQUEST, DEEPL_MAX_REQUEST_BYTES
+from manga_translator.metrics import metrics
+from manga_translator.text_utils import default_formatter, is_sfx  # Compiled manga-style formatting
+
+# Spacing cleanup applied after manga-style formatting
+_SPACE_BEFORE_PUNCTUATION = re.compile(r'\s+([!?.,])')
+_WHITESPACE = re.compile(r'[\s\n]+')
+
+# Fallback translator that wraps text with a marker, used when DeepL is unavailable
+class PlaceholderTranslator:
+    backend_name = 'placeholder'
+
+    def translate_text(self, text, source_lang, target_lang, preserve_formatting=True):
+        class Result:
+            def __init__(self, text):
+                self.text = f"[TRANSLATION: {text}]"
+        # Accept a list like deepl.Translator does
+        if isinstance(text, (list, tuple)):
+            return [Result(t) for t in text]
+        return Result(text)
 
 # Initialize the DeepL translator, or a placeholder if no valid API key is provided
 def get_translator_deepl(api_key):
@@ -11,36 +34,130 @@ def get_translator_deepl(api_key):
     """
     if not api_key:
         logging.warning("No DeepL API key provided. Using placeholder translator.")
-
-        # Define fallback translator that wraps text with a marker
-        class PlaceholderTranslator:
-            def translate_text(self, text, source_lang, target_lang, preserve_formatting=True):
-                class Result:
-                    def __init__(self, text):
-                        self.text = f"[TRANSLATION: {text}]"
-                return Result(text)
-
         return PlaceholderTranslator()
 
     try:
+        import deepl  # Imported on first use to keep startup fast
         return deepl.Translator(api_key)  # Try to initialize actual DeepL translator
     except Exception as e:
         logging.error(f"Failed to initialize DeepL translator: {e}")
-
         # Use fallback translator on error
-        class PlaceholderTranslator:
-            def translate_text(self, text, source_lang, target_lang, preserve_formatting=True):
-                class Result:
-                    def __init__(self, text):
-                        self.text = f"[TRANSLATION: {text}]"
-                return Result(text)
-
         return PlaceholderTranslator()
 
+def translator_backend_name(translator):
+    """
+    Name identifying a translator backend, used to keep cache entries of different backends apart.
+    """
+    if type(translator).__module__.split('.')[0] == 'deepl':
+        return 'deepl'
+    return getattr(translator, 'backend_name', type(translator).__name__)
+
+class TransientTranslationError(Exception):
+    """
+    Raised by a transport when a request failed in a way worth retrying (HTTP 429 or 5xx).
+
+    Args:
+        message (str): Error description
+        status (int): HTTP status code, if known
+        retry_after (float): Seconds the server asked us to wait, if given
+    """
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class DeepLClientTransport:
+    """
+    Transport sending batches through a ``deepl.Translator`` (or any object with the same
+    ``translate_text`` signature, such as the placeholder translator).
+    """
+    def __init__(self, translator):
+        self.translator = translator
+        self.backend_name = translator_backend_name(translator)
+
+    def translate_texts(self, texts, source_lang, target_lang):
+        try:
+            results = self.translator.translate_text(
+                list(texts),
+                source_lang=source_lang,
+                target_lang=target_lang,
+                preserve_formatting=True
+            )
+        except Exception as e:
+            # Map deepl's rate-limit and server errors without importing deepl for other translators
+            status = 429 if type(e).__name__ == 'TooManyRequestsException' else getattr(e, 'http_status_code', None)
+            if status is not None and (status == 429 or status >= 500):
+                raise TransientTranslationError(str(e), status=status)
+            raise
+        return [result.text for result in results]
+
+def deepl_translate_url(api_key, server_url=None):
+    """
+    URL of the DeepL translate endpoint; free-tier keys (ending in ':fx') use the free API host.
+    """
+    if server_url is None:
+        server_url = 'https://api-free.deepl.com' if api_key.endswith(':fx') else 'https://api.deepl.com'
+    return server_url.rstrip('/') + '/v2/translate'
+
+class DeepLHttpTransport:
+    """
+    Transport talking to the DeepL REST API directly with urllib.
+    Pointing ``server_url`` at a local stub server lets the batching and retry logic be
+    exercised without network access.
+
+    Args:
+        api_key (str): DeepL authentication key
+        server_url (str): Base URL of the API; defaults to the free or pro endpoint based on the key
+        timeout (float): Socket timeout per request in seconds
+    """
+    backend_name = 'deepl'
+
+    def __init__(self, api_key, server_url=None, timeout=30):
+        self.api_key = api_key
+        self.url = deepl_translate_url(api_key, server_url)
+        self.timeout = timeout
+
+    def translate_texts(self, texts, source_lang, target_lang):
+        fields = [('text', text) for text in texts]
+        fields += [('source_lang', source_lang), ('target_lang', target_lang), ('preserve_formatting', '1')]
+        request = urllib.request.Request(
+            self.url,
+            data=urllib.parse.urlencode(fields).encode('utf-8'),
+            headers={
+                'Authorization': f'DeepL-Auth-Key {self.api_key}',
+                'Content-Type': 'application/x-www-form-urlencoded',
+            },
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                retry_after = e.headers.get('Retry-After') if e.headers else None
+                raise TransientTranslationError(
+                    f"DeepL returned HTTP {e.code}", status=e.code,
+                    retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+                )
+            raise
+        except urllib.error.URLError as e:
+            raise TransientTranslationError(f"DeepL request failed: {e.reason}")
+        return [item['text'] for item in payload['translations']]
+
+def make_transport(translator):
+    """
+    Return a batch transport for ``translator``; objects that already are transports pass through.
+    """
+    if hasattr(translator, 'translate_texts'):
+        return translator
+    return DeepLClientTransport(translator)
+
 # Clean and translate input Japanese text into English
-def clean_and_translate_text(text, translator_deepl, context=None):
+def clean_and_translate_text(text, translator_deepl, context=None, cache=None):
     """
     Clean and translate text with universal manga context.
+    If a TranslationCache is given, it is consulted before calling the translator and
+    the raw translator output is stored in it afterwards.
     """
     # Ignore punctuation-only input
     if text.strip() in ['！', '。', '、', '．．．', '？']:
@@ -49,20 +166,20 @@ def clean_and_translate_text(text, translator_deepl, context=None):
     cleaned_text = text.strip()
 
     try:
-        # Translate text from Japanese to English
-        translation = translator_deepl.translate_text(
-            cleaned_text,
-            source_lang='JA',
-            target_lang='EN-US',
-            preserve_formatting=True
-        ).text
+        backend = translator_backend_name(translator_deepl)
+        translation = cache.get(cleaned_text, SOURCE_LANG, TARGET_LANG, backend) if cache is not None else None
+        if translation is None:
+            # Translate text from Japanese to English
+            translation = translator_deepl.translate_text(
+                cleaned_text,
+                source_lang=SOURCE_LANG,
+                target_lang=TARGET_LANG,
+                preserve_formatting=True
+            ).text
+            if cache is not None:
+                cache.put(cleaned_text, translation, SOURCE_LANG, TARGET_LANG, backend)
 
-        # Apply manga-specific formatting
-        translation = manga_style_formatting(translation)
-
-        # Clean up spacing before punctuation
-        translation = re.sub(r'\s+([!?.,])', r'\1', translation)
-        translation = re.sub(r'[\s\n]+', ' ', translation).strip()
+        translation = format_translation(translation)
 
         logging.info(f"Translated: {cleaned_text} -> {translation}")
         return translation
@@ -71,6 +188,123 @@ def clean_and_translate_text(text, translator_deepl, context=None):
         logging.error(f"Translation failed for {cleaned_text}: {e}")
         return ""
 
+def _clean_spacing(translation):
+    # Clean up spacing before punctuation
+    translation = _SPACE_BEFORE_PUNCTUATION.sub(r'\1', translation)
+    return _WHITESPACE.sub(' ', translation).strip()
+
+def format_translation(translation, formatter=None):
+    """
+    Apply manga-style formatting and spacing cleanup to raw translator output.
+    """
+    return _clean_spacing((formatter or default_formatter).format(translation))
+
+def format_translations(translations, formatter=None):
+    """
+    Batch version of ``format_translation``: the formatter's rules run once over the whole list.
+    """
+    return [_clean_spacing(translation) for translation in (formatter or default_formatter).format_batch(translations)]
+
+def _split_requests(texts, max_texts, max_bytes):
+    """
+    Split texts into request-sized chunks honouring both the text count and payload size limits.
+    """
+    chunks, current, current_bytes = [], [], 0
+    for text in texts:
+        size = len(text.encode('utf-8'))
+        if current and (len(current) >= max_texts or current_bytes + size > max_bytes):
+            chunks.append(current)
+            current, current_bytes = [], 0
+        current.append(text)
+        current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _send_with_backoff(transport, texts, max_retries, backoff_base):
+    """
+    Send one request, retrying transient failures with exponential backoff.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return transport.translate_texts(texts, SOURCE_LANG, TARGET_LANG)
+        except TransientTranslationError as e:
+            if attempt == max_retries:
+                raise
+            metrics.count('translate.retries')
+            delay = e.retry_after if e.retry_after is not None else backoff_base * (2 ** attempt)
+            logging.warning(f"Translation request failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def translate_batch(texts, translator, cache=None, max_texts=DEEPL_MAX_TEXTS_PER_REQUEST,
+                    max_bytes=DEEPL_MAX_REQUEST_BYTES, max_retries=5, backoff_base=0.5, formatter=None):
+    """
+    Translate many sentences with as few translator round-trips as the request limits allow.
+    Punctuation-only input is skipped, duplicates are sent once, cached translations are
+    reused, and each result gets the same formatting ``clean_and_translate_text`` applies
+    followed by ``post_process_translation``.
+
+    Args:
+        texts (list): Source sentences
+        translator: A transport with ``translate_texts`` or a translator accepted by ``make_transport``
+        cache (TranslationCache): Optional cache consulted before sending anything
+        max_texts (int): Maximum sentences per request
+        max_bytes (int): Maximum UTF-8 payload bytes per request
+        max_retries (int): Retries for 429/5xx responses before giving up on a request
+        backoff_base (float): First retry delay in seconds; doubled on every further retry
+        formatter (MangaFormatter): Formatter with the series glossary (defaults to the built-in one)
+
+    Returns:
+        list: Final translation for each input text, in input order ("" when skipped,
+              None when its request failed after all retries)
+    """
+    transport = make_transport(translator)
+    backend = translator_backend_name(transport)
+    cleaned = [text.strip() for text in texts]
+    raw = {}
+    pending = []
+    seen = set()
+    for text in cleaned:
+        if text in ['！', '。', '、', '．．．', '？'] or text in seen:
+            continue
+        seen.add(text)
+        cached = cache.get(text, SOURCE_LANG, TARGET_LANG, backend) if cache is not None else None
+        if cached is not None:
+            raw[text] = cached
+        else:
+            pending.append(text)
+    metrics.count('translate.sentences', len(cleaned))
+    metrics.count('translate.cache_hits', len(raw))
+
+    for chunk in _split_requests(pending, max_texts, max_bytes):
+        metrics.count('translate.requests')
+        metrics.count('translate.characters_sent', sum(len(text) for text in chunk))
+        try:
+            with metrics.stage('translate.request', texts=len(chunk)):
+                translations = _send_with_backoff(transport, chunk, max_retries, backoff_base)
+            if len(translations) != len(chunk):
+                raise ValueError(f"{backend} returned {len(translations)} translations for {len(chunk)} texts")
+        except Exception as e:
+            logging.error(f"Translation failed for {len(chunk)} sentences: {e}")
+            metrics.count('translate.failed_sentences', len(chunk))
+            continue
+        raw.update(zip(chunk, translations))
+        if cache is not None:
+            cache.put_many(list(zip(chunk, translations)), SOURCE_LANG, TARGET_LANG, backend)
+
+    formatted = dict(zip(raw, format_translations(list(raw.values()), formatter)))
+    results = []
+    for text in cleaned:
+        if text not in formatted:
+            results.append(None if text in seen else "")
+            continue
+        translation = formatted[text]
+        if translation:
+            translation = post_process_translation(translation, "sfx" if is_sfx(text) else None)
+        results.append(translation)
+    logging.info(f"Translated {len(cleaned)} sentences with {len(pending)} sent to {backend}")
+    return results
+
 # Add special formatting to translated text based on detected text type (e.g., SFX or emphasis)
 def post_process_translation(translation, text_type=None):
     """
@@ -78,7 +312,7 @@ def post_process_translation(translation, text_type=None):
     """
     if text_type is None:
         # Auto-detect text type based on characters or punctuation
-        if bool(re.search(r'[ドゴバキガ]{2,}', translation)):
+        if is_sfx(translation):
             text_type = "sfx"
         elif '!' in translation or '?' in translation:
             text_type = "emphasis"
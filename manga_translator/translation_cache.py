@@ -0,0 +1,281 @@
+# Import required libraries for persistent translation caching
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Cache hits whose new last_used time is buffered before it is written to disk in one statement
+TOUCH_FLUSH_SIZE = 256
+
+# Share of max_entries freed at once when the store is full, so eviction doesn't run on every write
+EVICTION_HEADROOM = 0.05
+
+def normalize_source_text(text):
+    """
+    Normalize source text so trivially different OCR results share one cache entry.
+    Applies NFKC normalization (full-width/half-width forms) and collapses whitespace.
+
+    Args:
+        text (str): Source text as produced by OCR and cleaning
+
+    Returns:
+        str: Normalized text used as the cache key
+    """
+    return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+class TranslationCache:
+    """
+    Two-level translation cache: a bounded in-memory LRU in front of an SQLite store.
+    Entries are keyed by normalized source text, source/target language and backend name,
+    so switching backends or language pairs never returns a stale translation.
+
+    Both memory and disk hits refresh the entry's ``last_used`` time on disk, so the store
+    evicts the least recently used entries. The updates are buffered and written in batches
+    (and before any eviction) instead of one commit per hit. When the store is full, a few
+    percent of it is evicted at once, and only the evicted keys leave the memory cache.
+
+    Args:
+        db_path (str): Path of the SQLite database file, or ':memory:'
+        memory_size (int): Maximum number of entries kept in the in-memory LRU
+        max_entries (int): Maximum number of entries kept on disk; oldest-used are evicted first
+        ttl_seconds (float): Entries older than this are treated as missing and purged (None disables)
+    """
+    def __init__(self, db_path, memory_size=4096, max_entries=200000, ttl_seconds=None):
+        self.db_path = db_path
+        self.memory_size = max(0, int(memory_size))
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._touched = {}
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if db_path != ':memory:' and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # The pipeline's translation workers share one connection, guarded by the lock;
+        # worker processes open their own connections and wait for each other's writes
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS translations (
+                   source_text TEXT NOT NULL,
+                   source_lang TEXT NOT NULL,
+                   target_lang TEXT NOT NULL,
+                   backend TEXT NOT NULL,
+                   translation TEXT NOT NULL,
+                   created_at REAL NOT NULL,
+                   last_used REAL NOT NULL,
+                   PRIMARY KEY (source_text, source_lang, target_lang, backend)
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+        self._conn.commit()
+        # Rows on disk, counted once here and then kept up to date by the writes below
+        self._count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        self.purge_expired()
+
+    def _key(self, text, source_lang, target_lang, backend):
+        return (normalize_source_text(text), source_lang, target_lang, backend)
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key, translation, created_at):
+        # Caller must hold the lock
+        if self.memory_size == 0:
+            return
+        self._memory[key] = (translation, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _touch(self, key, now):
+        # Caller must hold the lock
+        self._touched[key] = now
+        if len(self._touched) >= TOUCH_FLUSH_SIZE:
+            self._flush_touched()
+            self._conn.commit()
+
+    def _flush_touched(self):
+        # Caller must hold the lock; the caller commits
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE translations SET last_used = ? "
+                "WHERE source_text = ? AND source_lang = ? AND target_lang = ? AND backend = ?",
+                [(last_used,) + key for key, last_used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def flush(self):
+        """
+        Write the buffered ``last_used`` times of recent hits to disk.
+        """
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+
+    def get(self, text, source_lang, target_lang, backend):
+        """
+        Look up a cached translation.
+
+        Returns:
+            str: The cached translation, or None on a miss
+        """
+        key = self._key(text, source_lang, target_lang, backend)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self._touch(key, now)
+                self.memory_hits += 1
+                return entry[0]
+            row = self._conn.execute(
+                "SELECT translation, created_at FROM translations "
+                "WHERE source_text = ? AND source_lang = ? AND target_lang = ? AND backend = ?",
+                key
+            ).fetchone()
+            if row is None or self._expired(row[1], now):
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+            self._touch(key, now)
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def put(self, text, translation, source_lang, target_lang, backend):
+        """
+        Store a translation in both cache levels, evicting the least recently used
+        disk entries when the store grows past ``max_entries``.
+        """
+        self.put_many([(text, translation)], source_lang, target_lang, backend)
+
+    def put_many(self, pairs, source_lang, target_lang, backend):
+        """
+        Store several (source text, translation) pairs in one transaction.
+        """
+        now = time.time()
+        # Later pairs for the same normalized text win, as they would with one put per pair
+        latest = {}
+        for text, translation in pairs:
+            latest[self._key(text, source_lang, target_lang, backend)] = translation
+        rows = [key + (translation, now, now) for key, translation in latest.items()]
+        if not rows:
+            return
+        with self._lock:
+            existing = sum(
+                self._conn.execute(
+                    "SELECT 1 FROM translations "
+                    "WHERE source_text = ? AND source_lang = ? AND target_lang = ? AND backend = ?",
+                    row[:4]
+                ).fetchone() is not None
+                for row in rows
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations "
+                "(source_text, source_lang, target_lang, backend, translation, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._count += len(rows) - existing
+            for row in rows:
+                self._remember(row[:4], row[4], now)
+                self._touched.pop(row[:4], None)
+            self._evict_oversize()
+            self._flush_touched()
+            self._conn.commit()
+
+    def _evict_oversize(self):
+        # Caller must hold the lock
+        if self._count <= self.max_entries:
+            return
+        # Other processes may share the database, so recount before deciding what to evict
+        self._count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        excess = self._count - self.max_entries
+        if excess <= 0:
+            return
+        excess += int(self.max_entries * EVICTION_HEADROOM)
+        # Recent hits must be on disk before the least recently used rows are chosen
+        self._flush_touched()
+        evicted = self._conn.execute(
+            "SELECT rowid, source_text, source_lang, target_lang, backend FROM translations "
+            "ORDER BY last_used ASC LIMIT ?",
+            (excess,)
+        ).fetchall()
+        self._conn.executemany("DELETE FROM translations WHERE rowid = ?", [(row[0],) for row in evicted])
+        for row in evicted:
+            self._memory.pop(tuple(row[1:]), None)
+        self._count -= len(evicted)
+        self.evictions += len(evicted)
+
+    def purge_expired(self):
+        """
+        Delete every entry older than the TTL from both cache levels.
+
+        Returns:
+            int: Number of disk entries removed
+        """
+        if self.ttl_seconds is None:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM translations WHERE created_at < ?", (cutoff,)).rowcount
+            self._conn.commit()
+            self._count -= removed
+            for key in [k for k, (_, created_at) in self._memory.items() if created_at < cutoff]:
+                del self._memory[key]
+            self.evictions += removed
+        return removed
+
+    def load_glossary(self, glossary_path, source_lang, target_lang, backend):
+        """
+        Pre-warm the cache from a glossary file so known lines never reach the network.
+        The file is either a JSON object mapping source text to translation, or a
+        tab-separated text file with one ``source<TAB>translation`` pair per line.
+
+        Returns:
+            int: Number of entries loaded
+        """
+        with open(glossary_path, encoding='utf-8') as f:
+            if glossary_path.lower().endswith('.json'):
+                pairs = list(json.load(f).items())
+            else:
+                pairs = []
+                for line in f:
+                    line = line.rstrip('\n')
+                    if not line.strip() or line.startswith('#') or '\t' not in line:
+                        continue
+                    source, translation = line.split('\t', 1)
+                    pairs.append((source, translation))
+        self.put_many(pairs, source_lang, target_lang, backend)
+        logging.info(f"Loaded {len(pairs)} glossary entries from {glossary_path}")
+        return len(pairs)
+
+    def stats(self):
+        """
+        Return hit/miss counters for reporting.
+        """
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        """
+        Write the buffered hit times and close the underlying SQLite connection.
+        """
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,109 @@
+# Tests for reading pages from and streaming translated pages into CBZ archives
+import os
+import random
+import threading
+import zipfile
+import pytest
+from manga_translator import archive as archive_module
+from manga_translator.archive import ArchiveWriter, close_archives, list_archive_pages, read_archive_member
+from manga_translator.pipeline import Stage, per_page, run_pipelined
+
+def test_pages_are_written_in_index_order_whatever_order_they_finish_in(tmp_path):
+    path = str(tmp_path / 'out.cbz')
+    order = list(range(20))
+    random.Random(0).shuffle(order)
+    with ArchiveWriter(path) as writer:
+        for index in order:
+            if index == 7:
+                writer.skip(index)
+            else:
+                writer.add(f'{index:03d}.png', bytes([index]), index)
+    with zipfile.ZipFile(path) as archive:
+        assert archive.namelist() == [f'{index:03d}.png' for index in range(20) if index != 7]
+    assert writer.count == 19
+    assert not os.path.exists(path + '.tmp')
+
+def test_pages_after_a_missing_one_are_written_on_close(tmp_path):
+    path = str(tmp_path / 'out.cbz')
+    with ArchiveWriter(path) as writer:
+        writer.add('b.png', b'b', 2)
+        writer.add('a.png', b'a', 0)
+    with zipfile.ZipFile(path) as archive:
+        assert archive.namelist() == ['a.png', 'b.png']
+
+def test_a_failed_run_leaves_neither_a_partial_archive_nor_its_temporary_file(tmp_path):
+    path = str(tmp_path / 'out.cbz')
+    with open(path, 'wb') as f:
+        f.write(b'previous archive')
+    with pytest.raises(RuntimeError):
+        with ArchiveWriter(path) as writer:
+            writer.add('000.png', b'page', 0)
+            raise RuntimeError("stage failed")
+    assert os.listdir(tmp_path) == ['out.cbz']
+    with open(path, 'rb') as f:
+        assert f.read() == b'previous archive'
+
+def test_members_are_read_concurrently_from_per_thread_handles(tmp_path):
+    path = str(tmp_path / 'in.cbz')
+    with zipfile.ZipFile(path, 'w') as archive:
+        for i in range(30):
+            archive.writestr(f'ch1/{i}.png', os.urandom(2000) + bytes([i]))
+        archive.writestr('__MACOSX/ch1/._0.png', b'')
+    members = list_archive_pages(path)
+    assert members[:3] == ['ch1/0.png', 'ch1/1.png', 'ch1/2.png'] and len(members) == 30
+    errors = []
+
+    def read_all():
+        try:
+            for member in members:
+                assert read_archive_member(path, member)[-1] == int(os.path.basename(member)[:-4])
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=read_all) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    close_archives()
+
+def test_close_archives_closes_every_threads_handles_and_reading_reopens(tmp_path):
+    path = str(tmp_path / 'in.cbz')
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('0.png', b'zero')
+    close_archives()
+    thread = threading.Thread(target=read_archive_member, args=(path, '0.png'))
+    thread.start()
+    thread.join()
+    assert read_archive_member(path, '0.png') == b'zero'
+    handles = list(archive_module._handles)
+    assert len(handles) == 2
+    close_archives()
+    assert all(handle.fp is None for handle in handles) and archive_module._handles == []
+    assert read_archive_member(path, '0.png') == b'zero'
+    close_archives()
+
+def test_a_stage_failure_stops_feeding_pages_and_discards_the_archive(tmp_path):
+    path = str(tmp_path / 'out.cbz')
+    fed = []
+
+    def source(page):
+        fed.append(page['index'])
+        return page
+
+    def fail_on_third(page):
+        if page['index'] == 2:
+            raise RuntimeError("stage failed")
+        return page
+
+    def write(page):
+        writer.add(f"{page['index']:03d}.png", b'page', page['index'])
+        return page
+    stages = [Stage('source', per_page(source)), Stage('fail', per_page(fail_on_third)), Stage('write', per_page(write))]
+    pages = [{'index': index, 'path': str(index)} for index in range(200)]
+    with pytest.raises(RuntimeError):
+        with ArchiveWriter(path) as writer:
+            run_pipelined(pages, stages, queue_size=2)
+    # Only the pages already in flight when the stage failed were started
+    assert len(fed) < 20
+    assert os.listdir(tmp_path) == []
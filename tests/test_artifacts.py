@@ -0,0 +1,82 @@
+# Tests for the per-stage artifact store: restoring, invalidation by stage version and skipped stages
+import os
+import cv2
+import numpy as np
+from benchmarks.stubs import StubModels
+from benchmarks.synthetic import SAMPLE_LINES, write_pages
+from manga_translator.artifacts import ArtifactStore, stage_versions
+from manga_translator.pipeline import make_page, build_stages, run_sequential
+
+def test_a_stage_setting_invalidates_that_stage_and_the_ones_after_it():
+    base = stage_versions({'detect': {'imgsz': 640}, 'translate': {'target': 'EN-US'}})
+    translate_changed = stage_versions({'detect': {'imgsz': 640}, 'translate': {'target': 'DE'}})
+    detect_changed = stage_versions({'detect': {'imgsz': 1024}, 'translate': {'target': 'EN-US'}})
+    assert [translate_changed[stage] == base[stage] for stage in base] == [True, True, False]
+    assert all(detect_changed[stage] != base[stage] for stage in base)
+
+def stored_page(store):
+    page = {'input_hash': 'abc', 'boxes': np.array([[1, 2, 30, 40]], np.float32), 'classes': np.array([3]),
+            'text_regions': [{'text': 'テスト', 'coords': (1, 2, 30, 40), 'class': 3}], 'screened_out': 1,
+            'region_translations': {0: {'original': 'テスト', 'translation': 'TEST', 'coords': (1, 2, 30, 40)}}}
+    for stage in ('detect', 'ocr', 'translate'):
+        store.save(stage, [page])
+    return page
+
+def test_the_latest_stage_with_a_matching_version_is_restored(tmp_path):
+    db_path = str(tmp_path / 'artifacts.sqlite3')
+    versions = stage_versions({})
+    saved = stored_page(ArtifactStore(db_path, versions))
+    page = {'input_hash': 'abc'}
+    assert ArtifactStore(db_path, versions).restore(page) == 'translate'
+    assert page['region_translations'] == saved['region_translations']
+    # A new translation setting: the OCR results are still good
+    store = ArtifactStore(db_path, stage_versions({'translate': {'target': 'DE'}}))
+    page = {'input_hash': 'abc'}
+    assert store.restore(page) == 'ocr' and page['text_regions'] == saved['text_regions']
+    assert not store.needs(page, 'ocr') and store.needs(page, 'translate')
+    # A new detection setting: nothing can be reused
+    store = ArtifactStore(db_path, stage_versions({'detect': {'imgsz': 1024}}))
+    page = {'input_hash': 'abc'}
+    assert store.restore(page) is None and store.needs(page, 'detect') and 'boxes' not in page
+    assert ArtifactStore(db_path, versions).restore({'input_hash': 'other'}) is None
+
+class CountingModels(StubModels):
+    """
+    Stub models counting detector and OCR calls.
+    """
+    def __init__(self):
+        super().__init__(SAMPLE_LINES)
+        self.calls = {'detect': 0, 'ocr': 0}
+        detector, ocr_engine = self.detector, self.ocr_engine
+
+        def detect(images, **kwargs):
+            self.calls['detect'] += 1
+            return detector(images, **kwargs)
+
+        def ocr(crops):
+            self.calls['ocr'] += 1
+            return ocr_engine(crops)
+        self.detector, self.ocr_engine = detect, ocr
+
+def run(paths, db_path, output_dir, settings=None):
+    models = CountingModels()
+    store = ArtifactStore(db_path, stage_versions(settings or {}))
+    try:
+        run_sequential([make_page(index, path) for index, path in enumerate(paths)],
+                       build_stages(models, artifact_store=store, output_dir=output_dir))
+    finally:
+        store.close()
+    return models
+
+def test_a_rerun_skips_the_stored_stages_and_renders_the_same_pages(tmp_path):
+    paths = write_pages(str(tmp_path / 'pages'), 3, width=600, height=850, bubbles=4)
+    db_path = str(tmp_path / 'artifacts.sqlite3')
+    first = run(paths, db_path, str(tmp_path / 'first'))
+    assert first.calls['detect'] > 0 and first.calls['ocr'] > 0 and first.translator.requests > 0
+    second = run(paths, db_path, str(tmp_path / 'second'))
+    assert second.calls == {'detect': 0, 'ocr': 0} and second.translator.requests == 0
+    for path in paths:
+        name = f"translated_{os.path.basename(path)}"
+        assert (cv2.imread(str(tmp_path / 'first' / name)) == cv2.imread(str(tmp_path / 'second' / name))).all()
+    third = run(paths, db_path, str(tmp_path / 'third'), settings={'translate': {'target': 'DE'}})
+    assert third.calls == {'detect': 0, 'ocr': 0} and third.translator.requests > 0
@@ -0,0 +1,81 @@
+# Tests for the coalescing async translator and its synchronous facade
+import asyncio
+from manga_translator.async_translation import BackgroundTranslator, CoalescingTranslator, FakeAsyncBackend
+from manga_translator.translation import translate_batch
+
+class CountingBackend(FakeAsyncBackend):
+    """
+    Fake backend that tracks the peak number of concurrent requests and can drop results.
+    """
+    def __init__(self, delay=0.01, drop=0):
+        super().__init__(delay)
+        self.drop = drop
+        self.active = 0
+        self.peak = 0
+
+    async def translate_texts(self, texts, source_lang, target_lang):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            translations = await super().translate_texts(texts, source_lang, target_lang)
+        finally:
+            self.active -= 1
+        return translations[:len(translations) - self.drop]
+
+def run(coroutine, timeout=5):
+    # A bounded wait turns a future that is never resolved into a test failure instead of a hang
+    return asyncio.run(asyncio.wait_for(coroutine, timeout))
+
+def test_overlapping_calls_share_in_flight_sentences():
+    backend = CountingBackend(delay=0.05)
+    translator = CoalescingTranslator(backend)
+
+    async def pages():
+        return await asyncio.gather(
+            translator.translate_texts(['一', '二', '三'], 'JA', 'EN-US'),
+            translator.translate_texts(['二', '三', '四'], 'JA', 'EN-US'),
+        )
+    first, second = run(pages())
+    assert first == ['[TRANSLATION: 一]', '[TRANSLATION: 二]', '[TRANSLATION: 三]']
+    assert second == ['[TRANSLATION: 二]', '[TRANSLATION: 三]', '[TRANSLATION: 四]']
+    assert sorted(text for request in backend.requests for text in request) == ['一', '三', '二', '四']
+    assert translator.coalesced == 2
+
+def test_requests_are_split_and_concurrency_is_limited():
+    backend = CountingBackend()
+    translator = CoalescingTranslator(backend, max_in_flight=2, max_texts_per_request=3)
+    texts = [str(i) for i in range(10)]
+    assert run(translator.translate_texts(texts, 'JA', 'EN-US')) == [f'[TRANSLATION: {text}]' for text in texts]
+    assert [len(request) for request in backend.requests] == [3, 3, 3, 1]
+    assert backend.peak == 2
+
+def test_too_few_translations_fail_every_waiting_caller():
+    translator = CoalescingTranslator(CountingBackend(delay=0.05, drop=1))
+
+    async def pages():
+        return await asyncio.gather(
+            translator.translate_texts(['一', '二'], 'JA', 'EN-US'),
+            translator.translate_texts(['二'], 'JA', 'EN-US'),
+            return_exceptions=True,
+        )
+    results = run(pages())
+    assert all(isinstance(result, ValueError) for result in results)
+    # Nothing is left in flight, so a later call sends the sentences again
+    assert translator._in_flight == {}
+
+def test_background_translator_drives_translate_batch():
+    backend = CountingBackend()
+    translator = BackgroundTranslator(CoalescingTranslator(backend, max_texts_per_request=2))
+    try:
+        results = translate_batch(['一', '二', '一', '三'], translator, max_texts=10)
+    finally:
+        translator.close()
+    assert all(results) and results[0] == results[2]
+    assert backend.requests == [['一', '二'], ['三']]
+
+def test_background_translator_reports_length_mismatch_as_failed_sentences():
+    translator = BackgroundTranslator(CoalescingTranslator(CountingBackend(drop=1)))
+    try:
+        assert translate_batch(['一', '二'], translator) == [None, None]
+    finally:
+        translator.close()
@@ -0,0 +1,80 @@
+# Tests for batched text region detection over decoded pages
+import numpy as np
+from benchmarks.stubs import StubDetector
+from benchmarks.synthetic import make_page
+from manga_translator.detection import (
+    detect_text_regions_batch, detect_text_regions_tiled, merge_tile_boxes, needs_tiling
+)
+
+class RecordingDetector(StubDetector):
+    """
+    Stub detector remembering what every forward pass was given.
+    """
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def __call__(self, images, imgsz=640, verbose=False):
+        self.calls.append((images, imgsz))
+        return super().__call__(images, imgsz, verbose)
+
+def test_pages_are_detected_in_batches_of_decoded_arrays():
+    pages = [make_page(seed, width=500, height=700, bubbles=3) for seed in range(5)]
+    detector = RecordingDetector()
+    detections = detect_text_regions_batch(detector, [page for page, _, _ in pages], batch_size=2, imgsz=320)
+    assert [len(images) for images, _ in detector.calls] == [2, 2, 1]
+    assert all(isinstance(image, np.ndarray) for images, _ in detector.calls for image in images)
+    assert all(imgsz == 320 for _, imgsz in detector.calls)
+    assert len(detections) == 5
+    for (boxes, classes), (_, expected, _) in zip(detections, pages):
+        assert boxes.shape == (len(expected), 4) and classes.dtype.kind == 'i'
+        # The synthetic boxes are inclusive, the detected ones exclusive of their far corner
+        found = np.array(sorted(boxes.astype(int).tolist()))
+        assert np.abs(found - np.array(sorted(expected))).max() <= 1
+
+def test_batches_match_one_page_at_a_time():
+    images = [make_page(seed, width=500, height=700, bubbles=3)[0] for seed in range(4)]
+    batched = detect_text_regions_batch(StubDetector(), images, batch_size=4)
+    single = [detect_text_regions_batch(StubDetector(), [image], batch_size=1)[0] for image in images]
+    for (boxes, classes), (single_boxes, single_classes) in zip(batched, single):
+        assert (boxes == single_boxes).all() and (classes == single_classes).all()
+
+def test_onnx_style_tuple_results_are_passed_through():
+    boxes = np.array([[1, 2, 3, 4]], dtype=np.float32)
+    classes = np.array([3])
+    detections = detect_text_regions_batch(lambda images, imgsz, verbose: [(boxes, classes)] * len(images),
+                                           [np.zeros((10, 10, 3), np.uint8)] * 3, batch_size=2)
+    assert len(detections) == 3 and all(result[0] is boxes for result in detections)
+
+def test_tile_duplicates_merge_into_the_complete_box():
+    boxes = np.array([
+        [100, 900, 300, 1024],   # Bubble cut by the bottom edge of the first tile
+        [100, 900, 300, 1100],   # The same bubble, complete in the second tile
+        [102, 901, 299, 1099],   # Near-identical duplicate from a third tile
+        [100, 900, 300, 1100],   # Same box, different class
+        [500, 100, 600, 200],
+    ], dtype=np.float32)
+    classes = np.array([3, 3, 3, 1, 3])
+    merged, merged_classes = merge_tile_boxes(boxes, classes)
+    assert merged.tolist() == [[100, 900, 300, 1100], [100, 900, 300, 1100], [500, 100, 600, 200]]
+    assert merged_classes.tolist() == [3, 1, 3]
+
+def test_a_tall_strip_gives_the_same_boxes_tiled_as_whole():
+    strip = np.concatenate([make_page(seed, width=600, height=850, bubbles=4)[0] for seed in range(6)])
+    assert needs_tiling(strip.shape, 'auto', 1024)
+    detector = RecordingDetector()
+    (tiled_boxes, tiled_classes), = detect_text_regions_tiled(detector, [strip], batch_size=4, tiling='auto',
+                                                              tile_size=1024, overlap=256)
+    # Every forward pass gets tiles, never the whole strip
+    assert all(image.shape[0] <= 1024 for images, _ in detector.calls for image in images)
+    (whole_boxes, _), = detect_text_regions_tiled(StubDetector(), [strip], tiling='off')
+    assert sorted(tiled_boxes.tolist()) == sorted(whole_boxes.tolist())
+    assert (tiled_classes == 3).all()
+
+def test_pages_that_need_no_tiles_are_detected_whole():
+    page = make_page(0, width=600, height=850, bubbles=4)[0]
+    detector = RecordingDetector()
+    detect_text_regions_tiled(detector, [page, page], batch_size=4, tiling='auto')
+    assert [len(images) for images, _ in detector.calls] == [2]
+    assert not needs_tiling((850, 600), 'always', 1024) and needs_tiling((1100, 600), 'always', 1024)
+    assert not needs_tiling((9000, 600), 'off', 1024)
@@ -0,0 +1,80 @@
+# Tests for the single decode/validate pass over input pages and the crop preprocessing profiles
+import os
+import hashlib
+import cv2
+import numpy as np
+import pytest
+from manga_translator.metrics import metrics
+from manga_translator.image_utils import load_page, preprocess_plan, CropPreprocessor, PREPROCESS_PROFILES
+
+def write_page(path):
+    image = np.zeros((60, 40, 3), np.uint8)
+    image[:, :, 2] = np.arange(40, dtype=np.uint8) * 6
+    cv2.imwrite(str(path), image)
+    return image
+
+def test_a_well_formed_page_is_decoded_without_touching_the_file(tmp_path):
+    path = tmp_path / 'page.png'
+    image = write_page(path)
+    data = path.read_bytes()
+    mtime = os.stat(path).st_mtime_ns
+    cache_dir = tmp_path / 'cache'
+    decoded, input_hash = load_page(str(path), cache_dir=str(cache_dir))
+    assert (decoded == image).all()
+    assert input_hash == hashlib.sha256(data).hexdigest()
+    assert path.read_bytes() == data and os.stat(path).st_mtime_ns == mtime
+    assert not cache_dir.exists()
+
+def test_a_truncated_page_is_decoded_and_a_normalized_copy_cached(tmp_path):
+    path = tmp_path / 'page.jpg'
+    image = np.random.default_rng(0).integers(0, 255, (200, 200, 3), dtype=np.uint8)
+    cv2.imwrite(str(path), image)
+    truncated = path.read_bytes()[:-200]
+    path.write_bytes(truncated)
+    cache_dir = tmp_path / 'cache'
+    decoded, input_hash = load_page(str(path), cache_dir=str(cache_dir))
+    assert decoded is not None and decoded.shape == (200, 200, 3)
+    # The input is never rewritten; the normalized copy goes to the cache instead
+    assert path.read_bytes() == truncated
+    assert os.listdir(cache_dir) == [f"{input_hash}.png"]
+
+def test_an_undecodable_page_is_skipped(tmp_path):
+    path = tmp_path / 'page.png'
+    path.write_bytes(b'not an image')
+    decoded, input_hash = load_page(str(path), cache_dir=str(tmp_path / 'cache'))
+    assert decoded is None and input_hash == hashlib.sha256(b'not an image').hexdigest()
+
+def crops():
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (30 + 5 * i, 20, 3), dtype=np.uint8) for i in range(3)]
+
+def test_profiles_run_only_the_operations_they_need():
+    assert preprocess_plan(PREPROCESS_PROFILES['none']) == []
+    assert preprocess_plan(PREPROCESS_PROFILES['fast']) == ['gray', 'clahe']
+    assert preprocess_plan(PREPROCESS_PROFILES['quality']) == ['gray', 'denoise', 'denoise_clahe']
+
+def test_profiles_match_the_operations_applied_by_hand():
+    raw = crops()
+    assert all(out is crop for out, crop in zip(CropPreprocessor('none')(raw), raw))
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    for crop, fast, quality in zip(raw, CropPreprocessor('fast')(raw), CropPreprocessor('quality')(raw)):
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        assert (fast == clahe.apply(gray)).all()
+        assert (quality == clahe.apply(cv2.fastNlMeansDenoising(gray, None, 10, 7, 21))).all()
+
+def test_every_operation_is_timed_once_per_batch():
+    metrics.reset()
+    metrics.enable()
+    try:
+        CropPreprocessor('quality')(crops())
+        stages = metrics.summary()['stages']
+    finally:
+        metrics.disable()
+        metrics.reset()
+    assert {name: stage['calls'] for name, stage in stages.items()} == {
+        'ocr.preprocess.gray': 1, 'ocr.preprocess.denoise': 1, 'ocr.preprocess.denoise_clahe': 1
+    }
+
+def test_an_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="Unknown preprocessing profile"):
+        CropPreprocessor('sharpest')
@@ -0,0 +1,55 @@
+# Tests for the measured text layout engine
+import os
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+from manga_translator import layout as layout_module
+from manga_translator.layout import fit_text, draw_layout, text_width, wrap_text, get_font
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'font', 'CC Wild Words Roman.ttf')
+
+TEXTS = [
+    "WAIT! WHERE DO YOU THINK YOU'RE GOING?",
+    "I TOLD YOU... THIS ISN'T OVER YET",
+    "SUPERCALIFRAGILISTICEXPIALIDOCIOUS",
+    "HM?",
+]
+
+@pytest.mark.parametrize('text', TEXTS)
+@pytest.mark.parametrize('box', [(200, 120), (90, 160), (400, 60)])
+def test_the_fitted_block_fits_the_box_and_the_next_size_does_not(text, box):
+    max_width, max_height = box
+    layout = fit_text(text, FONT_PATH, max_width, max_height, max_size=60)
+    assert layout.fits(max_width, max_height)
+    assert all(width <= max_width for width in layout.line_widths)
+    if layout.size < 60:
+        bigger = fit_text(text, FONT_PATH, max_width, max_height, max_size=layout.size + 1, min_size=layout.size + 1)
+        assert not bigger.fits(max_width, max_height)
+
+def test_drawn_text_stays_inside_the_measured_block():
+    width, height = 220, 140
+    layout = fit_text(TEXTS[0], FONT_PATH, width, height, max_size=60)
+    canvas = Image.new('L', (width, height), 255)
+    draw_layout(ImageDraw.Draw(canvas), layout, width, height, fill=0)
+    ys, xs = np.nonzero(np.asarray(canvas) < 128)
+    assert xs.min() >= (width - layout.width) // 2 - 2 and xs.max() <= (width + layout.width) // 2 + 2
+    assert ys.min() >= (height - layout.height) // 2 - 2 and ys.max() <= (height + layout.height) // 2 + 2
+
+def test_overlong_words_are_hyphenated_to_the_width():
+    lines = wrap_text(TEXTS[2], FONT_PATH, 30, 120)
+    assert len(lines) > 1 and all(line.endswith('-') for line in lines[:-1])
+    assert all(text_width(line, FONT_PATH, 30) <= 120 for line in lines)
+
+def test_measured_widths_match_the_font():
+    font = get_font(FONT_PATH, 24)
+    for text in TEXTS:
+        assert abs(text_width(text, FONT_PATH, 24) - font.getlength(text)) <= 0.05 * font.getlength(text) + 1
+
+def test_the_glyph_advance_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(layout_module, 'MAX_CACHED_ADVANCES', 10)
+    layout_module._advances.cache_clear()
+    text = ''.join(chr(code) for code in range(0x41, 0x41 + 26))
+    first = text_width(text, FONT_PATH, 31)
+    assert len(layout_module._advances(FONT_PATH, 31)) == 10
+    assert text_width(text, FONT_PATH, 31) == first
+    layout_module._advances.cache_clear()
@@ -0,0 +1,51 @@
+# Tests for the run manifest: skipping up-to-date pages and invalidating changed ones
+import os
+import pytest
+from manga_translator import manifest as manifest_module
+from manga_translator.manifest import RunManifest, file_digest, run_fingerprint
+
+@pytest.fixture
+def recorded(tmp_path):
+    page_path = tmp_path / 'page.png'
+    page_path.write_bytes(b'page one')
+    output_path = tmp_path / 'translated_page.png'
+    output_path.write_bytes(b'output')
+    manifest = RunManifest(str(tmp_path / 'manifest.json'))
+    manifest.record(str(page_path), file_digest(str(page_path)), 'fp1', str(output_path))
+    return manifest, page_path, output_path
+
+def test_a_recorded_page_is_skipped_after_reopening(recorded, monkeypatch):
+    manifest, page_path, _ = recorded
+    reopened = RunManifest(manifest.path)
+    # Unchanged size and mtime: the page is not even read
+    monkeypatch.setattr(manifest_module, 'file_digest', lambda path: pytest.fail("page was hashed"))
+    assert reopened.is_up_to_date(str(page_path), 'fp1')
+
+def test_a_changed_page_is_processed_again(recorded):
+    manifest, page_path, _ = recorded
+    page_path.write_bytes(b'page two')
+    assert not manifest.is_up_to_date(str(page_path), 'fp1')
+
+def test_a_touched_but_identical_page_is_still_skipped(recorded):
+    manifest, page_path, _ = recorded
+    stat = os.stat(page_path)
+    os.utime(page_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert manifest.is_up_to_date(str(page_path), 'fp1')
+
+def test_a_new_fingerprint_or_a_missing_output_invalidates_the_page(recorded):
+    manifest, page_path, output_path = recorded
+    assert not manifest.is_up_to_date(str(page_path), 'fp2')
+    output_path.unlink()
+    assert not manifest.is_up_to_date(str(page_path), 'fp1')
+    assert not manifest.is_up_to_date(str(page_path.with_name('other.png')), 'fp1')
+
+def test_the_fingerprint_covers_model_font_and_settings(tmp_path):
+    model = tmp_path / 'model.pt'
+    font = tmp_path / 'font.ttf'
+    model.write_bytes(b'weights')
+    font.write_bytes(b'glyphs')
+    base = run_fingerprint(str(model), str(font), {'imgsz': 640})
+    assert run_fingerprint(str(model), str(font), {'imgsz': 640}) == base
+    assert run_fingerprint(str(model), str(font), {'imgsz': 1024}) != base
+    font.write_bytes(b'other glyphs')
+    assert run_fingerprint(str(model), str(font), {'imgsz': 640}) != base
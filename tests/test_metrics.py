@@ -0,0 +1,78 @@
+# Tests for stage timings, counters and their JSON, Prometheus and trace exports
+import json
+import time
+from benchmarks.stubs import StubModels
+from benchmarks.synthetic import SAMPLE_LINES, write_pages
+from manga_translator import metrics as metrics_module
+from manga_translator.metrics import Metrics
+from manga_translator.pipeline import make_page, build_stages, run_sequential
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics()
+    with metrics.stage('detect', pages=['a']):
+        pass
+    metrics.count('detect.boxes', 3)
+    assert metrics.summary() == {'stages': {}, 'counters': {}, 'pages': {}}
+
+def test_stage_time_is_split_between_its_pages():
+    metrics = Metrics(enabled=True)
+    with metrics.stage('ocr', pages=['a', 'b'], batch=2):
+        time.sleep(0.02)
+    with metrics.stage('ocr', pages=['a']):
+        pass
+    metrics.count('ocr.crops', 5)
+    metrics.count('ocr.crops', 2)
+    summary = metrics.summary()
+    assert summary['stages']['ocr']['calls'] == 2 and summary['stages']['ocr']['seconds'] >= 0.02
+    assert summary['counters'] == {'ocr.crops': 7}
+    assert summary['pages']['a']['ocr'] > summary['pages']['b']['ocr'] >= 0.01
+    assert summary['pages']['a']['total'] == summary['pages']['a']['ocr']
+
+def test_merged_worker_summaries_add_up():
+    parent, worker = Metrics(enabled=True), Metrics(enabled=True)
+    for metrics in (parent, worker):
+        with metrics.stage('detect', pages=['a']):
+            pass
+        metrics.count('detect.boxes', 4)
+    parent.merge(worker.summary())
+    summary = parent.summary()
+    assert summary['stages']['detect']['calls'] == 2 and summary['counters']['detect.boxes'] == 8
+    assert summary['pages']['a']['detect'] == summary['pages']['a']['total']
+
+def test_exports(tmp_path):
+    metrics = Metrics(enabled=True)
+    with metrics.stage('translate', pages=['a'], sentences=3):
+        pass
+    metrics.count('translate.requests')
+    metrics.export_all(str(tmp_path))
+    assert json.loads((tmp_path / 'metrics.json').read_text())['counters'] == {'translate.requests': 1}
+    prometheus = (tmp_path / 'metrics.prom').read_text()
+    assert 'mangaflow_stage_calls_total{stage="translate"} 1' in prometheus
+    assert 'mangaflow_items_total{counter="translate.requests"} 1' in prometheus
+    events = json.loads((tmp_path / 'trace.json').read_text())['traceEvents']
+    assert [(event['name'], event['ph'], event['args']) for event in events] == [
+        ('translate', 'X', {'sentences': 3, 'pages': ['a']})
+    ]
+
+def test_trace_events_are_capped(monkeypatch):
+    monkeypatch.setattr(metrics_module, 'MAX_TRACE_EVENTS', 3)
+    metrics = Metrics(enabled=True)
+    for _ in range(5):
+        with metrics.stage('render'):
+            pass
+    assert len(metrics.events) == 3 and metrics.summary()['stages']['render']['calls'] == 5
+
+def test_a_pipeline_run_records_every_stage(tmp_path):
+    paths = write_pages(str(tmp_path / 'pages'), 2, width=600, height=850, bubbles=4)
+    metrics_module.metrics.reset()
+    metrics_module.metrics.enable()
+    try:
+        run_sequential([make_page(index, path) for index, path in enumerate(paths)],
+                       build_stages(StubModels(SAMPLE_LINES), output_dir=str(tmp_path / 'out')))
+        summary = metrics_module.metrics.summary()
+    finally:
+        metrics_module.metrics.disable()
+        metrics_module.metrics.reset()
+    assert {'decode', 'detect', 'ocr', 'translate', 'render', 'write'} <= set(summary['stages'])
+    assert summary['counters']['detect.pages'] == 2 and summary['counters']['ocr.screened_in'] > 0
+    assert sorted(summary['pages']) == ['page_000.png', 'page_001.png']
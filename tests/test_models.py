@@ -0,0 +1,50 @@
+# Tests for lazy model loading and the import cost of the CLI
+import os
+import sys
+import time
+import threading
+import subprocess
+from manga_translator.models import LazyModels
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('torch', 'ultralytics', 'manga_ocr', 'transformers', 'deepl', 'httpx', 'matplotlib')
+
+def test_importing_the_cli_does_not_import_heavy_libraries():
+    # Record every import attempt, so the check also holds where the libraries are not installed
+    script = (
+        "import sys\n"
+        "attempted = set()\n"
+        "class Recorder:\n"
+        "    def find_spec(self, name, path=None, target=None):\n"
+        "        attempted.add(name.split('.')[0])\n"
+        "sys.meta_path.insert(0, Recorder())\n"
+        "import main\n"
+        f"print(' '.join(sorted(attempted & set({HEAVY_MODULES!r}))))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
+
+def test_models_are_loaded_on_first_use_only_once(monkeypatch):
+    loads = []
+
+    def slow_loader():
+        loads.append(threading.current_thread().name)
+        time.sleep(0.05)
+        return object()
+    monkeypatch.setattr(LazyModels, '_load_detector', lambda self: slow_loader())
+    models = LazyModels()
+    assert models.load_times == {} and loads == []
+    detectors = []
+    threads = [threading.Thread(target=lambda: detectors.append(models.detector)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1 and all(detector is detectors[0] for detector in detectors)
+    assert list(models.load_times) == ['detector'] and models.load_times['detector'] >= 0.05
+
+def test_a_missing_api_key_only_creates_the_placeholder_translator():
+    models = LazyModels(api_key=None)
+    assert models.translator_backend == 'placeholder'
+    assert list(models.load_times) == ['translator']
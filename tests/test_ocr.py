@@ -0,0 +1,81 @@
+# Tests for batched OCR across the crops of a page chunk
+import numpy as np
+import pytest
+from benchmarks.stubs import StubDetector, StubOcrEngine
+from benchmarks.synthetic import SAMPLE_LINES, make_page
+from manga_translator.pipeline import detect_pages, ocr_pages
+
+class RecordingOcr(StubOcrEngine):
+    """
+    Stub OCR engine remembering how many crops every call was given.
+    """
+    def __init__(self):
+        super().__init__(SAMPLE_LINES)
+        self.calls = []
+
+    def __call__(self, crops):
+        self.calls.append(len(crops))
+        return super().__call__(crops)
+
+def detected_pages(count):
+    pages = [{'index': seed, 'path': f'{seed}.png', 'image': make_page(seed, width=600, height=850, bubbles=4)[0]}
+             for seed in range(count)]
+    return detect_pages(pages, StubDetector())
+
+def test_crops_of_all_pages_share_one_ocr_call():
+    pages = detected_pages(3)
+    engine = RecordingOcr()
+    ocr_pages(pages, engine)
+    assert len(engine.calls) == 1
+    assert engine.calls[0] == sum(int((page['classes'] == 3).sum()) - page['screened_out'] for page in pages)
+
+def test_batched_results_go_back_to_their_own_pages():
+    batched = ocr_pages(detected_pages(3), RecordingOcr())
+    single = [ocr_pages([page], RecordingOcr())[0] for page in detected_pages(3)]
+    assert all(page['text_regions'] for page in batched)
+    for page, expected in zip(batched, single):
+        assert page['text_regions'] == expected['text_regions']
+
+def test_pages_without_text_regions_skip_the_model():
+    page = {'index': 0, 'path': 'blank.png', 'image': np.full((100, 100, 3), 255, np.uint8),
+            'boxes': np.zeros((0, 4)), 'classes': np.zeros(0, int)}
+    engine = RecordingOcr()
+    assert ocr_pages([page], engine)[0]['text_regions'] == [] and engine.calls == []
+
+class FakeTensor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.device = 'cpu'
+
+    def to(self, device):
+        return self
+
+    def cpu(self):
+        return self
+
+class FakeMangaOcr:
+    """
+    Stands in for a loaded MangaOcr model: 'generates' the batch position of every crop.
+    """
+    def __init__(self):
+        self.generate_calls = []
+        self.processor = lambda batch, return_tensors: type('Inputs', (), {'pixel_values': FakeTensor(len(batch))})
+        self.tokenizer = type('Tokenizer', (), {'batch_decode': staticmethod(
+            lambda generated, skip_special_tokens: [f'テキスト{i}' for i in range(generated.rows)])})
+        self.model = self
+
+    @property
+    def device(self):
+        return 'cpu'
+
+    def generate(self, pixel_values, max_length):
+        self.generate_calls.append(pixel_values.rows)
+        return pixel_values
+
+def test_ocr_engine_decodes_crops_in_batches():
+    pytest.importorskip('manga_ocr')
+    from manga_translator.ocr import OcrEngine
+    mocr = FakeMangaOcr()
+    crops = [np.zeros((20, 10, 3), np.uint8)] * 5
+    texts = OcrEngine(mocr, max_batch_size=2)(crops)
+    assert mocr.generate_calls == [2, 2, 1] and len(texts) == 5
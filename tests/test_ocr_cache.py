@@ -0,0 +1,120 @@
+# Tests for the perceptual-hash OCR cache; the OCR engine is an oracle returning each crop's true text
+import random
+import string
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from benchmarks.synthetic import SAMPLE_LINES, draw_glyph, make_page
+from manga_translator.config import FONT_PATH
+from manga_translator.ocr_cache import OcrCache
+
+KANA = 'なにをしているお前はだれだちくょうやったうるさいドバキれぜカイこ海賊王俺'
+
+class OracleEngine:
+    """
+    OCR engine that knows the text drawn into every crop it is given, and counts its calls.
+    """
+    def __init__(self):
+        self.truth = {}
+        self.crops = 0
+
+    def label(self, crop, text):
+        self.truth[id(crop)] = text
+        return crop
+
+    def __call__(self, crops):
+        self.crops += len(crops)
+        return [self.truth[id(crop)] for crop in crops]
+
+def font_crop(text, size=34, width=420, height=200):
+    image = Image.new('L', (width, height), 255)
+    ImageDraw.Draw(image).multiline_text((20, 20), text, font=ImageFont.truetype(FONT_PATH, size), fill=0, spacing=8)
+    return cv2.cvtColor(np.array(image), cv2.COLOR_GRAY2BGR)
+
+def glyph_crop(text, size=34, column_length=6):
+    columns = (len(text) + column_length - 1) // column_length
+    width, height = (columns + 1) * size, (min(len(text), column_length) + 1) * size
+    crop = np.full((height, width, 3), 255, dtype=np.uint8)
+    for n, char in enumerate(text):
+        column, row = divmod(n, column_length)
+        draw_glyph(crop, char, width - size // 2 - (column + 1) * size, size // 2 + row * size, size)
+    return crop
+
+def jpeg(crop, quality):
+    return cv2.imdecode(cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, quality])[1], cv2.IMREAD_COLOR)
+
+def change_one_character(rng, text, alphabet):
+    positions = [i for i, char in enumerate(text) if char in alphabet]
+    i = rng.choice(positions)
+    return text[:i] + rng.choice([char for char in alphabet if char != text[i]]) + text[i + 1:]
+
+def one_character_pairs(count=40, seed=0):
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(count):
+        words = [''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(2, 6))) for _ in range(4)]
+        text = ' '.join(words[:2]) + '\n' + ' '.join(words[2:])
+        other = change_one_character(rng, text, string.ascii_uppercase)
+        pairs.append((font_crop(text), text, font_crop(other), other))
+        text = ''.join(rng.choice(KANA) for _ in range(rng.randint(3, 12)))
+        other = change_one_character(rng, text, KANA)
+        pairs.append((glyph_crop(text), text, glyph_crop(other), other))
+    return pairs
+
+def test_one_character_difference_is_never_a_hit():
+    engine = OracleEngine()
+    cache = OcrCache(':memory:')
+    for crop, text, other_crop, other in one_character_pairs():
+        cache.recognize([engine.label(crop, text)], engine)
+        texts, hits = cache.recognize([engine.label(other_crop, other)], engine)
+        assert texts == [other] and hits == [False]
+    # The hashes alone would have matched some of these pairs
+    assert cache.stats()['rejected'] > 0
+    cache.close()
+
+def test_recompressed_and_brightened_crops_hit():
+    engine = OracleEngine()
+    cache = OcrCache(':memory:')
+    for crop, text, _, _ in one_character_pairs(count=10, seed=1):
+        cache.recognize([engine.label(crop, text)], engine)
+        brighter = np.clip(crop.astype(np.int16) + 12, 0, 255).astype(np.uint8)
+        copies = [jpeg(crop, 50), jpeg(crop, 90), brighter]
+        texts, hits = cache.recognize([engine.label(copy, text) for copy in copies], engine)
+        assert texts == [text] * 3 and hits == [True] * 3
+
+def test_synthetic_pages_never_get_another_crops_text():
+    engine = OracleEngine()
+    cache = OcrCache(':memory:')
+    wrong = hits = total = 0
+    for seed in range(6):
+        page, boxes, lines = make_page(seed)
+        for source in (page, jpeg(page, 60), jpeg(page, 85)):
+            crops = [engine.label(source[y1:y2, x1:x2], line) for (x1, y1, x2, y2), line in zip(boxes, lines)]
+            texts, page_hits = cache.recognize(crops, engine)
+            wrong += sum(text != line for text, line in zip(texts, lines))
+            hits += sum(page_hits)
+            total += len(crops)
+    assert wrong == 0
+    # Every re-encoded copy of a page is answered from the cache
+    assert hits >= total * 2 // 3
+    assert engine.crops == total - hits
+
+def test_entries_persist_and_are_evicted_least_recently_used_first(tmp_path):
+    db_path = str(tmp_path / 'ocr.sqlite3')
+    engine = OracleEngine()
+    crops = [engine.label(glyph_crop(line), line) for line in SAMPLE_LINES]
+    cache = OcrCache(db_path, namespace='torch:fp:none', max_entries=8)
+    cache.recognize(crops, engine)
+    assert cache.stats()['entries'] == 8 and cache.stats()['evictions'] == len(crops) - 8
+    cache.close()
+
+    reopened = OcrCache(db_path, namespace='torch:fp:none', max_entries=8)
+    texts, hits = reopened.recognize(crops[-8:], engine)
+    assert texts == SAMPLE_LINES[-8:] and all(hits)
+    texts, hits = reopened.recognize(crops[:1], engine)
+    assert texts == SAMPLE_LINES[:1] and hits == [False]
+    reopened.close()
+
+    other = OcrCache(db_path, namespace='onnx:int8:none')
+    assert other.stats()['entries'] == 0
+    other.close()
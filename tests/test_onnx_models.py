@@ -0,0 +1,139 @@
+# Tests for the ONNX detector and OCR engine, with fake sessions standing in for the exported models
+import json
+import numpy as np
+from manga_translator import onnx_models
+from manga_translator.onnx_models import OnnxOcrEngine
+
+VOCAB_SIZE, PAD_ID, START_ID, EOS_ID = 11, 0, 1, 2
+
+class Node:
+    def __init__(self, name):
+        self.name = name
+
+def next_token_logits(sums, seeds):
+    # The next token depends on the whole prefix through the running sum of its ids
+    tokens = (sums * 7 + seeds[:, None] * 3 + 5) % VOCAB_SIZE
+    return np.eye(VOCAB_SIZE, dtype=np.float32)[tokens]
+
+class FakeEncoder:
+    def run(self, names, feed):
+        return [feed['pixel_values'].mean(axis=(1, 2, 3))[:, None, None].round().astype(np.float32)]
+
+class FakeDecoder:
+    """
+    Full decoder: logits for every position plus the running sums as the layer's self-attention
+    cache and the seeds as its cross-attention cache. Without ``present`` it mimics an old export.
+    """
+    def __init__(self, present=True):
+        self.present = present
+        self.lengths = []
+
+    def get_outputs(self):
+        names = ['logits'] + (['present.0.key', 'present.0.value', 'present.0.cross_key', 'present.0.cross_value']
+                              if self.present else [])
+        return [Node(name) for name in names]
+
+    def run(self, names, feed):
+        ids, seeds = feed['input_ids'], feed['encoder_hidden_states'][:, 0, 0].astype(np.int64)
+        self.lengths.append(ids.shape[1])
+        sums = np.cumsum(ids, axis=1)
+        cache = sums[:, None, :, None].astype(np.float32)
+        cross = feed['encoder_hidden_states'][:, None]
+        return [next_token_logits(sums, seeds)] + ([cache, cache, cross, cross] if self.present else [])
+
+class FakeDecoderWithPast:
+    """
+    Cached step: takes only the newest token and extends the running sums, reading the seeds
+    from the cross-attention cache instead of the encoder output.
+    """
+    def __init__(self):
+        self.lengths = []
+
+    def get_inputs(self):
+        return [Node(name) for name in ['input_ids', 'past.0.key', 'past.0.value', 'past.0.cross_key',
+                                        'past.0.cross_value']]
+
+    def get_outputs(self):
+        return [Node(name) for name in ['logits', 'present.0.key', 'present.0.value']]
+
+    def run(self, names, feed):
+        assert 'encoder_hidden_states' not in feed
+        ids, past = feed['input_ids'], feed['past.0.key']
+        self.lengths.append(ids.shape[1])
+        seeds = feed['past.0.cross_key'][:, 0, 0, 0].astype(np.int64)
+        sums = past[:, 0, -1:, 0].astype(np.int64) + ids
+        cache = np.concatenate([past, sums[:, None, :, None].astype(np.float32)], axis=2)
+        return [next_token_logits(sums, seeds), cache, cache]
+
+def make_engine(tmp_path, monkeypatch, cached, max_length=40):
+    tmp_path.mkdir()
+    vocab_path = tmp_path / 'vocab.json'
+    vocab_path.write_text(json.dumps({
+        'tokens': [f't{i}' for i in range(VOCAB_SIZE)], 'special_ids': [PAD_ID, START_ID, EOS_ID],
+        'decoder_start_token_id': START_ID, 'eos_token_id': EOS_ID, 'pad_token_id': PAD_ID,
+        'image_size': 8, 'image_mean': [0.5] * 3, 'image_std': [0.5] * 3,
+    }))
+    # Old exports have neither the decoder outputs nor the file of the cached step
+    with_past = tmp_path / 'decoder_with_past.onnx'
+    if cached:
+        with_past.write_bytes(b'')
+    sessions = {'encoder': FakeEncoder(), 'decoder': FakeDecoder(present=cached),
+                str(with_past): FakeDecoderWithPast()}
+    monkeypatch.setattr(onnx_models, 'create_session', lambda path, threads=0: sessions[path])
+    engine = OnnxOcrEngine('encoder', 'decoder', str(vocab_path), max_length=max_length,
+                           decoder_with_past_path=str(with_past))
+    return engine, sessions['decoder'], sessions[str(with_past)]
+
+def test_kv_cached_decoding_matches_full_prefix_decoding(tmp_path, monkeypatch):
+    pixel_values = np.stack([np.full((3, 8, 8), seed, dtype=np.float32) for seed in range(6)])
+    plain, plain_decoder, _ = make_engine(tmp_path / 'plain', monkeypatch, cached=False)
+    expected = plain._generate(pixel_values)
+    assert plain.decoder_with_past is None
+    assert (expected == EOS_ID).any(axis=1).any() and (expected == PAD_ID).any()
+    cached, decoder, decoder_with_past = make_engine(tmp_path / 'cached', monkeypatch, cached=True)
+    assert cached.decoder_with_past is decoder_with_past
+    np.testing.assert_array_equal(cached._generate(pixel_values), expected)
+    # Without the cache every step re-reads the prefix; with it, each step after the first feeds one token
+    assert plain_decoder.lengths == list(range(1, len(plain_decoder.lengths) + 1))
+    assert decoder.lengths == [1]
+    assert decoder_with_past.lengths == [1] * (len(plain_decoder.lengths) - 1)
+
+def test_generation_stops_at_max_length(tmp_path, monkeypatch):
+    pixel_values = np.stack([np.full((3, 8, 8), seed, dtype=np.float32) for seed in range(6)])
+    for cached in (False, True):
+        engine, _, _ = make_engine(tmp_path / str(cached), monkeypatch, cached=cached, max_length=4)
+        assert engine._generate(pixel_values).shape[1] <= 3
+
+class FakeDetectorSession:
+    """
+    Detector session answering every page with the same YOLOv8-shaped prediction.
+    """
+    def __init__(self, prediction):
+        self.prediction = prediction
+
+    def get_inputs(self):
+        return [Node('images')]
+
+    def run(self, names, feed):
+        return [np.stack([self.prediction] * len(feed['images']))]
+
+def yolo_prediction(boxes, classes, scores, class_count=4):
+    # (4 + classes, anchors): centre/size rows, then one score row per class
+    prediction = np.zeros((4 + class_count, len(boxes)), dtype=np.float32)
+    for anchor, ((x1, y1, x2, y2), cls, score) in enumerate(zip(boxes, classes, scores)):
+        prediction[:4, anchor] = [(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1]
+        prediction[4 + cls, anchor] = score
+    return prediction
+
+def test_nms_only_suppresses_boxes_of_the_same_class(monkeypatch):
+    # A large input, where offsetting classes by a fixed 4096 would let them overlap
+    size = 6400
+    # With classes 4096 apart, the class 2 box at (4196, 4196) would land on the class 3 box at (100, 100)
+    boxes = [(100, 100, 400, 400), (105, 105, 405, 405), (4196, 4196, 4496, 4496), (4200, 4200, 4500, 4500)]
+    prediction = yolo_prediction(boxes, [3, 3, 2, 2], [0.9, 0.7, 0.8, 0.6])
+    monkeypatch.setattr(onnx_models, 'create_session', lambda path, threads=0: FakeDetectorSession(prediction))
+    detector = onnx_models.OnnxDetector('detector.onnx', imgsz=640)
+    (found, classes), = detector([np.zeros((size, size, 3), np.uint8)], imgsz=size)
+    assert sorted(zip(classes.tolist(), found.round().astype(int).tolist())) == [
+        (2, [4196, 4196, 4496, 4496]), (3, [100, 100, 400, 400])
+    ]
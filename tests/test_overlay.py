@@ -0,0 +1,46 @@
+# Tests for single-pass overlay compositing against drawing every region on its own
+import os
+import numpy as np
+from manga_translator.overlay import composite_translations, insert_translation, plan_regions
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'font', 'CC Wild Words Roman.ttf')
+
+def make_regions():
+    return {
+        0: {'translation': "WHERE ARE YOU GOING?", 'coords': (20, 30, 220, 190)},
+        1: {'translation': "HM?", 'coords': (260, 40, 330, 110)},
+        2: {'translation': "I TOLD YOU THIS IS NOT OVER YET, NOT BY A LONG SHOT", 'coords': (40, 400, 140, 700)},
+        3: {'translation': "   ", 'coords': (300, 500, 380, 560)},
+        # Overlaps region 0, so the drawing order matters
+        4: {'translation': "BAM", 'coords': (180, 150, 300, 260)},
+    }
+
+def noisy_page(height=800, width=400):
+    return np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+def test_compositing_matches_drawing_each_region_in_plan_order():
+    regions = make_regions()
+    expected = noisy_page()
+    for plan in plan_regions(regions):
+        insert_translation(expected, plan['data']['coords'], plan['data']['translation'], FONT_PATH,
+                           plan['font_multiplier'])
+    composited = composite_translations(noisy_page(), regions, font_path=FONT_PATH)
+    assert (composited == expected).all()
+
+def test_pixels_outside_the_regions_are_untouched():
+    page = noisy_page()
+    original = page.copy()
+    composite_translations(page, make_regions(), font_path=FONT_PATH)
+    outside = np.ones(page.shape[:2], bool)
+    for region_id, region in make_regions().items():
+        if region['translation'].strip():
+            x1, y1, x2, y2 = region['coords']
+            outside[y1:y2, x1:x2] = False
+    assert (page[outside] == original[outside]).all()
+    x1, y1, x2, y2 = make_regions()[3]['coords']
+    assert (page[y1:y2, x1:x2] == original[y1:y2, x1:x2]).all()
+
+def test_bands_give_the_same_page_as_one_layer():
+    one_layer = composite_translations(noisy_page(), make_regions(), font_path=FONT_PATH, band_height=10 ** 6)
+    banded = composite_translations(noisy_page(), make_regions(), font_path=FONT_PATH, band_height=50)
+    assert (banded == one_layer).all()
@@ -0,0 +1,67 @@
+# Tests for the worker processes: chunking and retrying only the pages of a failed stage call
+import queue
+from collections import Counter
+from manga_translator import parallel
+from manga_translator.pipeline import Stage, per_page, run_isolated
+
+class RecordingStages:
+    """
+    Stub decode -> detect -> write stages counting how often each page completes a stage;
+    detection fails on every batch holding the page with index ``bad``.
+    """
+    def __init__(self, bad, batch_size=4):
+        self.bad = bad
+        self.runs = {'decode': Counter(), 'detect': Counter(), 'write': Counter()}
+        self.detect_calls = []
+
+        def record(name):
+            def run(page):
+                self.runs[name][page['index']] += 1
+                return page
+            return run
+
+        def detect(pages):
+            self.detect_calls.append([page['index'] for page in pages])
+            if any(page['index'] == bad for page in pages):
+                raise RuntimeError("detection failed")
+            for page in pages:
+                self.runs['detect'][page['index']] += 1
+            return pages
+        self.stages = [
+            Stage('decode', per_page(record('decode'))),
+            Stage('detect', detect, batch_size=batch_size),
+            Stage('write', per_page(record('write'))),
+        ]
+
+    def __call__(self):
+        return self.stages, lambda: None
+
+def make_pages(count):
+    return [{'index': index, 'path': f'{index:03d}.png'} for index in range(count)]
+
+def test_only_the_failing_batch_is_retried_page_by_page():
+    recording = RecordingStages(bad=5)
+    finished, failed = run_isolated(make_pages(8), recording.stages)
+    assert [page['index'] for page in finished] == [0, 1, 2, 3, 4, 6, 7]
+    assert [(page['index'], str(e)) for page, e in failed] == [(5, "detection failed")]
+    assert recording.detect_calls == [[0, 1, 2, 3], [4, 5, 6, 7], [4], [5], [6], [7]]
+    for name, runs in recording.runs.items():
+        assert max(runs.values()) == 1
+    assert 5 not in recording.runs['write'] and len(recording.runs['write']) == 7
+
+def test_a_worker_reports_a_failing_page_without_processing_others_twice(monkeypatch):
+    monkeypatch.setattr(parallel, 'limit_threads', lambda threads: None)
+    recording = RecordingStages(bad=2)
+    tasks = queue.Queue()
+    results = queue.Queue()
+    for position, page in enumerate(make_pages(6)):
+        tasks.put((position, page))
+    tasks.put(None)
+    parallel._worker_main(recording, 1, tasks, results, 'WARNING', False, max_chunk=8)
+    reported = [results.get_nowait() for _ in range(results.qsize())]
+    assert reported[-1][0] == 'done'
+    assert sorted(key for kind, key, _ in reported if kind == 'page') == [0, 1, 3, 4, 5]
+    assert [(key, value) for kind, key, value in reported if kind == 'error'] == [(2, "002.png: detection failed")]
+    for name, runs in recording.runs.items():
+        assert max(runs.values()) == 1
+    assert sorted(recording.runs['write']) == [0, 1, 3, 4, 5]
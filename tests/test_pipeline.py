@@ -0,0 +1,75 @@
+# Tests for the staged page pipeline: page order, batching and error propagation
+import os
+import time
+import random
+import threading
+import cv2
+import pytest
+from benchmarks.stubs import StubModels
+from benchmarks.synthetic import SAMPLE_LINES, write_pages
+from manga_translator.pipeline import Stage, per_page, make_page, build_stages, run_sequential, run_pipelined
+
+def make_pages(count):
+    return [make_page(index, f'{index:03d}.png') for index in range(count)]
+
+def jittered(name):
+    """
+    Per-page stage function that sleeps a random few milliseconds, so pages finish out of order.
+    """
+    rng = random.Random(name)
+    lock = threading.Lock()
+
+    def run(page):
+        with lock:
+            delay = rng.random() * 0.005
+        time.sleep(delay)
+        page.setdefault('seen', []).append(name)
+        return page
+    return per_page(run)
+
+@pytest.mark.parametrize('run', [run_sequential, lambda pages, stages: run_pipelined(pages, stages, queue_size=2)])
+def test_pages_come_out_in_input_order_after_every_stage(run):
+    stages = [Stage('a', jittered('a'), workers=3), Stage('b', jittered('b'), workers=2, batch_size=3),
+              Stage('c', jittered('c'))]
+    finished = run(make_pages(25), stages)
+    assert [page['index'] for page in finished] == list(range(25))
+    assert all(page['seen'] == ['a', 'b', 'c'] for page in finished)
+
+def test_batched_stages_get_batches_up_to_their_batch_size():
+    sizes = []
+
+    def batched(pages):
+        sizes.append(len(pages))
+        return pages
+    finished = run_sequential(make_pages(10), [Stage('decode', per_page(lambda page: page)),
+                                               Stage('batched', batched, batch_size=4)])
+    assert len(finished) == 10 and sizes == [4, 4, 2]
+
+def test_dropped_pages_are_left_out():
+    stages = [Stage('drop', per_page(lambda page: None if page['index'] % 3 == 0 else page), workers=2)]
+    for finished in (run_sequential(make_pages(9), stages), run_pipelined(make_pages(9), stages)):
+        assert [page['index'] for page in finished] == [1, 2, 4, 5, 7, 8]
+
+@pytest.mark.parametrize('run', [run_sequential, run_pipelined])
+def test_a_stage_error_is_raised_to_the_caller(run):
+    def fail_on_fourth(page):
+        if page['index'] == 4:
+            raise ValueError("page 4 is broken")
+        return page
+    stages = [Stage('decode', per_page(lambda page: page)), Stage('broken', per_page(fail_on_fourth), workers=2)]
+    with pytest.raises(ValueError, match="page 4 is broken"):
+        run(make_pages(10), stages)
+
+def test_sequential_and_pipelined_runs_write_the_same_pages(tmp_path):
+    paths = write_pages(str(tmp_path / 'pages'), 4, width=600, height=850, bubbles=4)
+    outputs = {}
+    for mode, run in (('sequential', run_sequential), ('pipelined', run_pipelined)):
+        output_dir = str(tmp_path / mode)
+        stages = build_stages(StubModels(SAMPLE_LINES), output_dir=output_dir, translate_workers=2,
+                              detect_batch_size=2, translation_window=2)
+        finished = run([make_page(index, path) for index, path in enumerate(paths)], stages)
+        assert [page['path'] for page in finished] == paths
+        outputs[mode] = {name: cv2.imread(os.path.join(output_dir, name)) for name in sorted(os.listdir(output_dir))}
+    assert list(outputs['sequential']) == [f"translated_{os.path.basename(path)}" for path in paths]
+    for name, image in outputs['sequential'].items():
+        assert (image == outputs['pipelined'][name]).all()
@@ -0,0 +1,57 @@
+# Tests for pre-OCR screening against the validate_ocr_result checks it stands in for
+import random
+import cv2
+import numpy as np
+from benchmarks.synthetic import make_page
+from manga_translator.ocr import validate_ocr_result
+from manga_translator.screening import region_statistics, screen_regions
+
+def varied_page(seed):
+    """
+    Synthetic page with blurred, faded and noisy parts, so boxes land on both sides of
+    every threshold.
+    """
+    page, _, _ = make_page(seed, width=800, height=1100, bubbles=10)
+    rng = np.random.default_rng(seed)
+    page[:300] = cv2.GaussianBlur(page[:300], (15, 15), 5)
+    page[300:550] = (page[300:550] * 0.1 + 200).astype(np.uint8)
+    page[550:700] = np.clip(page[550:700].astype(int) + rng.integers(-40, 40, page[550:700].shape), 0, 255)
+    return page
+
+def random_boxes(seed, shape, count=300):
+    rng = random.Random(seed)
+    height, width = shape[:2]
+    boxes = []
+    for _ in range(count):
+        w, h = rng.randint(4, 250), rng.randint(4, 250)
+        x1, y1 = rng.randint(0, width - w), rng.randint(0, height - h)
+        boxes.append((x1, y1, x1 + w, y1 + h))
+    return boxes
+
+def test_screening_never_rejects_a_crop_validation_accepts():
+    accepted = rejected = 0
+    for seed in range(3):
+        page = varied_page(seed)
+        boxes = random_boxes(seed, page.shape)
+        for (x1, y1, x2, y2), keep in zip(boxes, screen_regions(page, boxes)):
+            valid = validate_ocr_result('テキスト', page[y1:y2, x1:x2])
+            assert keep or not valid, (x1, y1, x2, y2)
+            accepted += valid
+            rejected += not keep
+    # Both outcomes are exercised
+    assert accepted > 50 and rejected > 50
+
+def test_contrast_and_density_are_exact():
+    page = varied_page(0)
+    boxes = random_boxes(1, page.shape, count=100)
+    gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+    for (x1, y1, x2, y2), stats in zip(boxes, region_statistics(page, boxes, band_height=200)):
+        crop = gray[y1:y2, x1:x2]
+        assert stats['contrast'] == float(crop.max()) - float(crop.min())
+        assert abs(stats['text_density'] - np.count_nonzero(crop < 128) / crop.size) < 1e-9
+
+def test_empty_and_out_of_page_boxes():
+    page = varied_page(0)
+    keep = screen_regions(page, [(10, 10, 10, 50), (790, 1090, 900, 1200), (-20, -20, 0, 0)])
+    assert keep[0] is False and keep[2] is False
+    assert isinstance(keep[1], bool)
@@ -0,0 +1,140 @@
+# Tests for the translation service: dynamic batching, failure isolation and the HTTP front end
+import json
+import time
+import base64
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+import cv2
+import numpy as np
+import pytest
+from benchmarks.stubs import StubModels
+from benchmarks.synthetic import SAMPLE_LINES, make_page
+from manga_translator.server import StageBatcher, TranslationRequestHandler, TranslationService
+
+class RecordingStage:
+    """
+    Stage function recording the size of every call; raises on pages whose path is 'bad'.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, pages):
+        self.calls.append([page['path'] for page in pages])
+        if any(page['path'] == 'bad' for page in pages):
+            raise RuntimeError("cannot process bad page")
+        for page in pages:
+            page['done'] = True
+        return pages
+
+def submit_concurrently(batcher, paths):
+    results = {}
+
+    def submit(path):
+        try:
+            results[path] = batcher.submit({'path': path})
+        except Exception as e:
+            results[path] = e
+    threads = [threading.Thread(target=submit, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_pages_share_one_call():
+    stage = RecordingStage()
+    batcher = StageBatcher('test', stage, max_batch_size=4, max_wait=0.5)
+    try:
+        results = submit_concurrently(batcher, ['a', 'b', 'c', 'd'])
+    finally:
+        batcher.close()
+    assert all(results[path]['done'] for path in 'abcd')
+    assert [sorted(call) for call in stage.calls] == [['a', 'b', 'c', 'd']]
+
+def test_a_lone_page_waits_at_most_max_wait():
+    stage = RecordingStage()
+    batcher = StageBatcher('test', stage, max_batch_size=8, max_wait=0.1)
+    try:
+        start = time.perf_counter()
+        batcher.submit({'path': 'a'})
+        elapsed = time.perf_counter() - start
+    finally:
+        batcher.close()
+    assert 0.09 <= elapsed < 1.0
+    assert stage.calls == [['a']]
+
+def test_a_failing_page_only_fails_its_own_request():
+    stage = RecordingStage()
+    batcher = StageBatcher('test', stage, max_batch_size=3, max_wait=0.5)
+    try:
+        results = submit_concurrently(batcher, ['a', 'bad', 'c'])
+    finally:
+        batcher.close()
+    assert isinstance(results['bad'], RuntimeError)
+    assert results['a']['done'] and results['c']['done']
+    assert len(stage.calls[0]) == 3 and sorted(stage.calls[1:]) == [['a'], ['bad'], ['c']]
+
+class FailingTranslator:
+    backend_name = 'failing'
+
+    def translate_texts(self, texts, source_lang, target_lang):
+        raise ValueError("DeepL is down")
+
+@pytest.fixture
+def serve_models():
+    servers = []
+
+    def start(models):
+        service = TranslationService(models, max_batch_size=4, max_wait=0.01)
+        httpd = ThreadingHTTPServer(('127.0.0.1', 0), TranslationRequestHandler)
+        httpd.daemon_threads = True
+        httpd.service = service
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        servers.append((httpd, service, thread))
+        return f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield start
+    for httpd, service, thread in servers:
+        httpd.shutdown()
+        thread.join()
+        httpd.server_close()
+        service.close()
+
+def request(url, data=None):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def encoded_page(seed=0):
+    page, _, _ = make_page(seed, width=600, height=850, bubbles=4)
+    return cv2.imencode('.png', page)[1].tobytes(), page.shape
+
+def test_translate_endpoint_returns_the_translated_page(serve_models):
+    url = serve_models(StubModels(SAMPLE_LINES))
+    data, shape = encoded_page()
+    status, body = request(url + '/translate', data)
+    assert status == 200
+    assert body['translation_failures'] == 0
+    assert body['regions'] and all(region['translation'] for region in body['regions'])
+    image = cv2.imdecode(np.frombuffer(base64.b64decode(body['image']), np.uint8), cv2.IMREAD_COLOR)
+    assert image.shape == shape
+    status, health = request(url + '/health')
+    assert status == 200 and health['status'] == 'ok'
+
+def test_failed_translations_are_reported_in_the_response(serve_models):
+    models = StubModels(SAMPLE_LINES)
+    models.translator = FailingTranslator()
+    url = serve_models(models)
+    status, body = request(url + '/translate', encoded_page()[0])
+    assert status == 200
+    assert body['translation_failures'] > 0
+
+def test_bad_requests_are_rejected(serve_models):
+    url = serve_models(StubModels(SAMPLE_LINES))
+    assert request(url + '/translate', b'not an image')[0] == 400
+    assert request(url + '/nowhere', b'x')[0] == 404
+    assert request(url + '/nowhere')[0] == 404
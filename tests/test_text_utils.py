@@ -0,0 +1,131 @@
+# Tests for the similarity index and the formatter against the pairwise and per-call loops they replace
+import re
+import random
+import pytest
+from difflib import SequenceMatcher
+from benchmarks.synthetic import SAMPLE_LINES
+from manga_translator.text_utils import (
+    SimilarityIndex, MangaFormatter, default_formatter, is_similar, manga_style_formatting
+)
+
+def variants(seed, count):
+    """
+    Sample lines with a few characters deleted, replaced or inserted, so some pairs are
+    near duplicates and most are not.
+    """
+    rng = random.Random(seed)
+    alphabet = ''.join(SAMPLE_LINES)
+    sentences = []
+    for _ in range(count):
+        text = list(rng.choice(SAMPLE_LINES) + rng.choice(['', rng.choice(SAMPLE_LINES)]))
+        for _ in range(rng.randint(0, 4)):
+            position = rng.randrange(len(text))
+            edit = rng.random()
+            if edit < 0.3 and len(text) > 2:
+                del text[position]
+            elif edit < 0.7:
+                text[position] = rng.choice(alphabet)
+            else:
+                text.insert(position, rng.choice(alphabet))
+        sentences.append(''.join(text))
+    return sentences
+
+def test_find_duplicate_agrees_with_the_pairwise_loop():
+    stored, queries = variants(0, 150), variants(1, 150)
+    index = SimilarityIndex()
+    for text in stored:
+        index.add(text)
+    for text in queries:
+        found = index.find_duplicate(text)
+        expected = any(is_similar(text, other) for other in stored)
+        assert (found is not None) == expected, text
+        if found is not None:
+            assert is_similar(text, found)
+
+def test_best_match_is_the_most_similar_stored_sentence():
+    stored, queries = variants(2, 150), variants(3, 150)
+    index = SimilarityIndex()
+    for text in stored:
+        index.add(text)
+    for text in queries:
+        match, score = index.best_match(text)
+        ratios = [SequenceMatcher(None, text, other).ratio() for other in stored]
+        if max(ratios) > 0.8:
+            assert score == max(ratios) and SequenceMatcher(None, text, match).ratio() == score
+        else:
+            assert match is None and score == 0.0
+
+def test_deduplicating_keeps_the_same_sentences_as_the_pairwise_loop():
+    sentences = variants(4, 200)
+    pairwise = []
+    for text in sentences:
+        if not any(is_similar(text, kept) for kept in pairwise):
+            pairwise.append(text)
+    index = SimilarityIndex()
+    indexed = []
+    for text in sentences:
+        if index.find_duplicate(text) is None:
+            indexed.append(text)
+            index.add(text)
+    assert indexed == pairwise
+
+def legacy_formatting(text):
+    """
+    The per-call dictionary loops MangaFormatter replaced, kept verbatim as the reference.
+    """
+    manga_terms = {'sama': '-sama', 'san': '-san', 'kun': '-kun', 'chan': '-chan', 'sensei': '-sensei',
+                   'senpai': '-senpai', 'kouhai': '-kouhai', 'dono': '-dono', 'shi': '-shi'}
+    character_names = {'カイドウ': 'Kaido', 'モンキー・ロ・ルフィ': 'Monkey D. Luffy', '海賊王': 'Pirate King'}
+    phrase_map = {'お前': 'you', 'おれ': 'I', '俺': 'I', 'あいつ': 'that guy', 'ばか': 'idiot', 'くそ': 'damn',
+                  'ちくしょう': 'shit', 'なに': 'what', 'なにぃ': 'whaaat', 'やった': 'hell yeah',
+                  'うるさい': 'shut up', 'やれやれ': 'good grief', 'はい': 'yeah', 'いいえ': 'nah'}
+    formatted_text = text
+    for jp, en in character_names.items():
+        formatted_text = formatted_text.replace(jp, en)
+    for jp, en in phrase_map.items():
+        formatted_text = formatted_text.replace(jp, en)
+    for key, val in manga_terms.items():
+        formatted_text = re.sub(rf'\b{key}\b', val, formatted_text, flags=re.IGNORECASE)
+    formatted_text = formatted_text.replace('...', '…')
+    formatted_text = re.sub(r'([!?]){2,}', r'\1', formatted_text)
+    formatted_text = re.sub(r'\?+!+|\!+\?+', '?!', formatted_text)
+    formatted_text = re.sub(r'(?<!\.)\.\.(?!\.)', '…', formatted_text)
+    if '!' in formatted_text:
+        formatted_text = formatted_text.upper()
+    return formatted_text
+
+FORMATTING_TEXTS = [
+    "Thank you, Sensei.",
+    "Luffy-san... wait for me!!",
+    "Is that you, Nami SAN??!",
+    "Kun, chan and sama are not names.. right?",
+    "カイドウ is the strongest creature in the world",
+    "お前 will never be 海賊王!",
+    "俺 told you, あいつ is a ばか",
+    "やれやれ... いいえ, はい.",
+    "Shinji-kun, sensei-sama, senpai",
+    "what?! no way!?",
+    "Wait.... what...",
+    "モンキー・ロ・ルフィ and the shi of it",
+    "",
+]
+
+@pytest.mark.parametrize('text', FORMATTING_TEXTS)
+def test_formatter_matches_the_old_manga_style_formatting(text):
+    assert manga_style_formatting(text) == legacy_formatting(text)
+    assert default_formatter.format_batch([text, text]) == [legacy_formatting(text)] * 2
+
+def test_longer_glossary_entries_win_over_their_prefixes():
+    # The old loops replaced 'なに' before 'なにぃ' could match; the trie takes the longest entry
+    assert legacy_formatting('なにぃ') == 'whatぃ'
+    assert manga_style_formatting('なにぃ') == 'whaaat'
+
+def test_glossary_files_extend_the_defaults(tmp_path):
+    path = tmp_path / 'glossary.tsv'
+    path.write_text("# series glossary\nゾロ\tZoro\nphrase\tおいしい\tyummy\nhonorific\tkun\t-kun (boy)\n",
+                    encoding='utf-8')
+    formatter = MangaFormatter.from_glossary(str(path))
+    assert formatter.format('ゾロ-KUN says おいしい to カイドウ') == 'Zoro--kun (boy) says yummy to Kaido'
+    path.write_text("bogus\tA\tB\n", encoding='utf-8')
+    with pytest.raises(ValueError, match="unknown glossary kind"):
+        MangaFormatter.from_glossary(str(path))
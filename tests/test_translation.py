@@ -0,0 +1,133 @@
+# Tests for bulk translation: request splitting, retries with backoff, caching and failed requests
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from manga_translator import translation
+from manga_translator.translation import (
+    DeepLHttpTransport, TransientTranslationError, _split_requests, translate_batch
+)
+from manga_translator.translation_cache import TranslationCache
+
+class FakeTransport:
+    """
+    Transport answering ``T(text)`` for every text, after raising the queued errors one per call.
+    """
+    backend_name = 'fake'
+
+    def __init__(self, errors=(), drop=0):
+        self.errors = list(errors)
+        self.drop = drop
+        self.requests = []
+
+    def translate_texts(self, texts, source_lang, target_lang):
+        self.requests.append(list(texts))
+        if self.errors:
+            raise self.errors.pop(0)
+        translations = [f"T({text})" for text in texts]
+        return translations[:len(translations) - self.drop]
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(translation.time, 'sleep', delays.append)
+    return delays
+
+def test_split_requests_honours_count_and_byte_limits():
+    texts = ['あ' * 10, 'い' * 10, 'う' * 10, 'え']
+    assert _split_requests(texts, max_texts=2, max_bytes=1000) == [texts[:2], texts[2:]]
+    # Each sentence is 30 bytes, so only two fit under 64 bytes
+    assert _split_requests(texts, max_texts=50, max_bytes=64) == [texts[:2], texts[2:]]
+    # A sentence larger than the limit is still sent, on its own
+    assert _split_requests(['x' * 100, 'y'], max_texts=50, max_bytes=10) == [['x' * 100], ['y']]
+
+def test_translate_batch_sends_each_sentence_once_in_as_few_requests_as_allowed():
+    transport = FakeTransport()
+    texts = ['一', '二', '一', '！', '三', ' 二 ', '四', '五']
+    results = translate_batch(texts, transport, max_texts=2)
+    assert transport.requests == [['一', '二'], ['三', '四'], ['五']]
+    assert results[3] == ""
+    assert results[0] == results[2] and results[1] == results[5]
+    assert all(results[i] for i in (0, 1, 4, 6, 7))
+
+def test_transient_errors_are_retried_with_exponential_backoff(sleeps):
+    transport = FakeTransport(errors=[
+        TransientTranslationError("busy", status=503),
+        TransientTranslationError("busy", status=503),
+        TransientTranslationError("slow down", status=429, retry_after=7),
+    ])
+    results = translate_batch(['一'], transport, backoff_base=0.5)
+    assert sleeps == [0.5, 1.0, 7]
+    assert len(transport.requests) == 4
+    assert results[0]
+
+def test_requests_failing_after_all_retries_return_none(sleeps):
+    transport = FakeTransport(errors=[TransientTranslationError("busy", status=503)] * 3)
+    results = translate_batch(['一', '！', '二'], transport, max_texts=1, max_retries=2)
+    # The first request exhausts its retries; the second succeeds
+    assert len(sleeps) == 2
+    assert results[0] is None and results[1] == "" and results[2]
+
+def test_non_transient_errors_are_not_retried(sleeps):
+    transport = FakeTransport(errors=[ValueError("bad key")])
+    assert translate_batch(['一'], transport) == [None]
+    assert sleeps == [] and len(transport.requests) == 1
+
+def test_too_few_translations_fail_the_request_instead_of_misaligning():
+    transport = FakeTransport(drop=1)
+    cache = TranslationCache(':memory:')
+    assert translate_batch(['一', '二'], transport, cache=cache) == [None, None]
+    assert cache.get('一', translation.SOURCE_LANG, translation.TARGET_LANG, 'fake') is None
+
+def test_cached_sentences_are_not_sent_again():
+    cache = TranslationCache(':memory:')
+    first = FakeTransport()
+    expected = translate_batch(['一', '二'], first, cache=cache)
+    second = FakeTransport()
+    results = translate_batch(['二', '三', '一'], second, cache=cache)
+    assert second.requests == [['三']]
+    assert results[0] == expected[1] and results[2] == expected[0] and results[1]
+
+class StubDeepLHandler(BaseHTTPRequestHandler):
+    """
+    Minimal DeepL endpoint: answers the queued status codes first, then translations.
+    """
+    statuses = []
+    requests = []
+
+    def do_POST(self):
+        fields = urllib.parse.parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        type(self).requests.append(fields['text'])
+        if type(self).statuses:
+            self.send_response(type(self).statuses.pop(0))
+            self.send_header('Retry-After', '2')
+            self.end_headers()
+            return
+        body = json.dumps({'translations': [{'text': f"T({text})"} for text in fields['text']]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def deepl_server():
+    StubDeepLHandler.statuses = [429, 502]
+    StubDeepLHandler.requests = []
+    server = HTTPServer(('127.0.0.1', 0), StubDeepLHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    thread.join()
+
+def test_http_transport_retries_rate_limits_from_the_server(deepl_server, sleeps):
+    transport = DeepLHttpTransport('test-key', deepl_server, timeout=5)
+    results = translate_batch(['一', '二', '三'], transport, max_texts=2)
+    # 429 and 502 on the first request, each honouring Retry-After, then both requests succeed
+    assert sleeps == [2.0, 2.0]
+    assert StubDeepLHandler.requests == [['一', '二']] * 3 + [['三']]
+    assert all(results)
@@ -0,0 +1,105 @@
+# Tests for the two-level translation cache: LRU eviction on disk, TTL expiry and normalized keys
+import sqlite3
+import pytest
+from manga_translator import translation_cache
+from manga_translator.translation_cache import TranslationCache
+
+LANGS = ('JA', 'EN-US', 'deepl')
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(translation_cache.time, 'time', clock)
+    return clock
+
+def stored_texts(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {row[0] for row in conn.execute("SELECT source_text FROM translations")}
+
+def test_entries_used_from_memory_survive_eviction(tmp_path, clock):
+    db_path = str(tmp_path / 'cache.sqlite3')
+    cache = TranslationCache(db_path, memory_size=100, max_entries=10)
+    cache.put_many([(f'line {i}', f'T{i}') for i in range(10)], *LANGS)
+    # Lines 0-4 are read again (from memory); lines 5-9 are not
+    for i in range(5):
+        assert cache.get(f'line {i}', *LANGS) == f'T{i}'
+    cache.put_many([(f'new {i}', f'N{i}') for i in range(3)], *LANGS)
+    cache.close()
+    stored = stored_texts(db_path)
+    assert {f'line {i}' for i in range(5)} | {f'new {i}' for i in range(3)} <= stored
+    assert len({f'line {i}' for i in range(5, 10)} & stored) == 2
+    assert cache.evictions == 3 and len(stored) == 10
+
+def test_eviction_keeps_memory_entries_that_stay_on_disk(tmp_path, clock):
+    cache = TranslationCache(str(tmp_path / 'cache.sqlite3'), memory_size=100, max_entries=20)
+    cache.put_many([(f'line {i}', f'T{i}') for i in range(20)], *LANGS)
+    for i in range(10, 20):
+        cache.get(f'line {i}', *LANGS)
+    cache.put('one more', 'M', *LANGS)
+    assert cache.evictions > 0
+    hits = cache.memory_hits
+    for i in range(10, 20):
+        assert cache.get(f'line {i}', *LANGS) == f'T{i}'
+    assert cache.memory_hits == hits + 10
+    # Evicted keys are gone from both levels
+    assert cache.get('line 0', *LANGS) is None
+
+def test_row_count_is_tracked_across_overwrites_and_reopening(tmp_path, clock):
+    db_path = str(tmp_path / 'cache.sqlite3')
+    cache = TranslationCache(db_path, max_entries=5)
+    for _ in range(3):
+        cache.put_many([('a', '1'), ('b', '2'), ('ａ', '3')], *LANGS)
+    assert cache.evictions == 0 and cache.get('a', *LANGS) == '3'
+    cache.close()
+    cache = TranslationCache(db_path, max_entries=5)
+    cache.put_many([('c', '4'), ('d', '5'), ('e', '6'), ('f', '7')], *LANGS)
+    cache.close()
+    assert len(stored_texts(db_path)) <= 5 and cache.evictions >= 1
+
+def test_disk_hits_refresh_last_used_in_batches(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(translation_cache, 'TOUCH_FLUSH_SIZE', 3)
+    db_path = str(tmp_path / 'cache.sqlite3')
+    TranslationCache(db_path).put_many([(f'line {i}', f'T{i}') for i in range(3)], *LANGS)
+    cache = TranslationCache(db_path, memory_size=0)
+    with sqlite3.connect(db_path) as conn:
+        before = dict(conn.execute("SELECT source_text, last_used FROM translations"))
+    cache.get('line 0', *LANGS)
+    cache.get('line 1', *LANGS)
+    with sqlite3.connect(db_path) as conn:
+        assert dict(conn.execute("SELECT source_text, last_used FROM translations")) == before
+    cache.get('line 2', *LANGS)
+    with sqlite3.connect(db_path) as conn:
+        after = dict(conn.execute("SELECT source_text, last_used FROM translations"))
+    assert all(after[text] > before[text] for text in before)
+    assert cache.stats()['disk_hits'] == 3
+
+def test_expired_entries_are_misses_and_are_purged(tmp_path, clock):
+    db_path = str(tmp_path / 'cache.sqlite3')
+    cache = TranslationCache(db_path, ttl_seconds=100)
+    cache.put('old', 'O', *LANGS)
+    clock.now += 50
+    cache.put('recent', 'R', *LANGS)
+    assert cache.get('old', *LANGS) == 'O'
+    clock.now += 60
+    assert cache.get('old', *LANGS) is None
+    assert cache.get('recent', *LANGS) == 'R'
+    assert cache.purge_expired() == 1
+    cache.close()
+    assert stored_texts(db_path) == {'recent'}
+    clock.now += 100
+    TranslationCache(db_path, ttl_seconds=100).close()
+    assert stored_texts(db_path) == set()
+
+def test_keys_are_normalized_and_separate_backends(tmp_path):
+    cache = TranslationCache(':memory:')
+    cache.put('ﾃｽﾄ  です', 'test', *LANGS)
+    assert cache.get('テスト です', *LANGS) == 'test'
+    assert cache.get('テスト です', 'JA', 'EN-US', 'placeholder') is None